@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+"""Benchmark suite: time layout, serialization, export and traversal.
+
+Usage: bench/run.py [options]
+
+Every (benchmark, shape, size) runs in its own process, so the peak RSS of
+one doesn't leak into the next. Results are written as JSON; given an older
+result file with --compare, the run fails when a benchmark got slower than
+--threshold allows.
+"""
+
+
+import json
+import math
+import multiprocessing
+import optparse
+import os
+import platform
+import Queue
+import resource
+import shutil
+import StringIO
+import sys
+import tempfile
+import time
+import timeit
+
+import pyggdrasil
+from pyggdrasil.graph import iterative, tidy, topdown
+
+import trees
+
+
+# Raster exports of larger graphs are scaled down to this many pixels; png
+# draws at 64 times the area
+MAXPIXELS = 10**6
+
+def layout(root):
+    return pyggdrasil.graph.generate(root, radius=40, padding=5,
+                                     arrow_length=5, arrow_width=5)
+
+
+def changed(root):
+    """Lay out root, move a subtree and lay it out again."""
+    before = layout(root)
+    nodes = list(root.unroll())
+    nodes[-1].parent = root
+    return (before, layout(root))
+
+
+def unroll(root):
+    return lambda: list(root.unroll())
+
+
+def generatetopdown(root):
+    return lambda: pyggdrasil.graph.generate(root, module=topdown)
+
+
+def generateiterative(root):
+    return lambda: pyggdrasil.graph.generate(root, module=iterative)
+
+
+def generatetidy(root):
+    return lambda: pyggdrasil.graph.generate(root, module=tidy)
+
+
+def scale(root):
+    graph = layout(root)
+    return lambda: graph.scale(2.5)
+
+
+def transition(root):
+    (startgraph, endgraph) = changed(root)
+    return lambda: pyggdrasil.graph.transition(startgraph, endgraph, 0.5)
+
+
+def dump(root):
+    options = pyggdrasil.model.Options()
+    return lambda: pyggdrasil.serialize.dump(StringIO.StringIO(), root, options)
+
+
+def load(root):
+    stream = StringIO.StringIO()
+    pyggdrasil.serialize.dump(stream, root, pyggdrasil.model.Options())
+    data = stream.getvalue()
+    return lambda: pyggdrasil.serialize.load(StringIO.StringIO(data))
+
+
+def dumpbinary(root):
+    options = pyggdrasil.model.Options()
+    return lambda: pyggdrasil.serialize.dumpbinary(StringIO.StringIO(), root, options)
+
+
+def loadbinary(root):
+    stream = StringIO.StringIO()
+    pyggdrasil.serialize.dumpbinary(stream, root, pyggdrasil.model.Options())
+    data = stream.getvalue()
+    return lambda: pyggdrasil.serialize.loadbinary(StringIO.StringIO(data))
+
+
+def exporter(module):
+    def setup(root):
+        graph = layout(root)
+        pixels = graph.width * graph.height
+        if pyggdrasil.export.extension(module) != 'svg' and pixels > MAXPIXELS:
+            graph = graph.scale(math.sqrt(MAXPIXELS / pixels))
+        (handle, filename) = tempfile.mkstemp(
+            suffix='.' + pyggdrasil.export.extension(module))
+        os.close(handle)
+        return lambda: pyggdrasil.export.run(module, graph, filename)
+    return setup
+
+
+BENCHMARKS = [
+    ('unroll', unroll),
+    ('generate-topdown', generatetopdown),
+    ('generate-iterative', generateiterative),
+    ('generate-tidy', generatetidy),
+    ('scale', scale),
+    ('transition', transition),
+    ('dump', dump),
+    ('load', load),
+    ('dumpbinary', dumpbinary),
+    ('loadbinary', loadbinary),
+]
+for (module, available) in pyggdrasil.export.ALL:
+    if available:
+        BENCHMARKS.append(('export-' + pyggdrasil.export.key(module),
+                           exporter(module)))
+
+
+def measure(name, shape, size, repeat, seed, maxpixels=MAXPIXELS):
+    """Run one benchmark in this process and return its result."""
+    result = dict(name=name, shape=shape, size=size)
+    # Exports go to temporary files, removed along with their directory
+    tempdir = tempfile.tempdir
+    tempfile.tempdir = tempfile.mkdtemp()
+    global MAXPIXELS
+    MAXPIXELS = maxpixels
+    try:
+        root = trees.generate(shape, size, seed)
+        func = dict(BENCHMARKS)[name](root)
+        result['setuprss'] = _maxrss()
+
+        times = timeit.repeat(func, number=1, repeat=repeat)
+        result['time'] = min(times)
+        result['times'] = times
+        result['rss'] = _maxrss()
+    except Exception as e:
+        result['error'] = '%s: %s' % (type(e).__name__, e)
+    finally:
+        shutil.rmtree(tempfile.tempdir)
+        tempfile.tempdir = tempdir
+    return result
+
+
+def _maxrss():
+    # Kilobytes on Linux, bytes on OS X
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss //= 1024
+    return rss
+
+
+def _measurein(queue, args):
+    queue.put(measure(*args))
+
+
+def measureprocess(args):
+    """Run measure(*args) in a process of its own and return its result.
+
+    Pool workers are daemonic and may not start processes, so exporters
+    that use a process pool would only be measured in their fallback.
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_measurein, args=(queue, args))
+    process.start()
+    try:
+        while True:
+            try:
+                return queue.get(timeout=1)
+            except Queue.Empty:
+                if not process.is_alive() and queue.empty():
+                    (name, shape, size) = args[:3]
+                    return dict(name=name, shape=shape, size=size,
+                                error='exited with %s' % process.exitcode)
+    finally:
+        process.join()
+
+
+def compare(results, baseline, threshold):
+    """Return the (result, old) pairs that are slower than threshold allows."""
+    old = dict(((result['name'], result['shape'], result['size']), result)
+               for result in baseline['results'] if 'time' in result)
+
+    regressions = []
+    for result in results:
+        key = (result['name'], result['shape'], result['size'])
+        if 'time' in result and key in old and \
+           result['time'] > old[key]['time'] * (1 + threshold):
+            regressions.append((result, old[key]))
+    return regressions
+
+
+def main(args=None):
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('-b', '--benchmarks', default=','.join(name for (name, setup) in BENCHMARKS),
+                      help='comma separated benchmarks [default: all]')
+    parser.add_option('-s', '--shapes', default=','.join(sorted(trees.SHAPES)),
+                      help='comma separated tree shapes [default: %default]')
+    parser.add_option('-n', '--sizes', default='1000,10000',
+                      help='comma separated tree sizes [default: %default]')
+    parser.add_option('-r', '--repeat', type='int', default=3,
+                      help='runs per benchmark, the best is kept [default: %default]')
+    parser.add_option('--max-pixels', dest='maxpixels', type='int', default=MAXPIXELS,
+                      help='scale raster exports down to this many pixels [default: %default]')
+    parser.add_option('--seed', type='int', default=0,
+                      help='seed of the random trees [default: %default]')
+    parser.add_option('-o', '--output', metavar='FILE',
+                      help='write the results as JSON to FILE')
+    parser.add_option('-c', '--compare', metavar='FILE',
+                      help='fail on regressions against the results in FILE')
+    parser.add_option('-t', '--threshold', type='float', default=0.2,
+                      help='allowed slowdown against --compare [default: %default]')
+    (options, args) = parser.parse_args(args)
+
+    names = options.benchmarks.split(',')
+    unknown = set(names) - set(dict(BENCHMARKS))
+    if unknown:
+        parser.error('unknown benchmarks: %s' % ', '.join(sorted(unknown)))
+    shapes = options.shapes.split(',')
+    unknown = set(shapes) - set(trees.SHAPES)
+    if unknown:
+        parser.error('unknown shapes: %s' % ', '.join(sorted(unknown)))
+    sizes = [int(size) for size in options.sizes.split(',')]
+
+    tasks = [(name, shape, size, options.repeat, options.seed, options.maxpixels)
+             for size in sizes for shape in shapes for name in names]
+
+    # One process per benchmark keeps the peak RSS separate
+    results = []
+    print '%-20s %-8s %8s %10s %10s' % (
+        'benchmark', 'shape', 'nodes', 'time', 'peak rss')
+    for task in tasks:
+        result = measureprocess(task)
+        results.append(result)
+        if 'error' in result:
+            print '%-20s %-8s %8d  %s' % (
+                result['name'], result['shape'], result['size'], result['error'])
+        else:
+            print '%-20s %-8s %8d %9.1fms %8dkB' % (
+                result['name'], result['shape'], result['size'],
+                1000 * result['time'], result['rss'])
+        sys.stdout.flush()
+
+    run = dict(
+        date=time.strftime('%Y-%m-%dT%H:%M:%S'),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        repeat=options.repeat,
+        seed=options.seed,
+        results=results,
+    )
+    if options.output:
+        with open(options.output, 'w') as file:
+            json.dump(run, file, indent=1, sort_keys=True)
+
+    if options.compare:
+        with open(options.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, options.threshold)
+        for (result, old) in regressions:
+            print 'regression: %s %s %d: %.3fms -> %.3fms' % (
+                result['name'], result['shape'], result['size'],
+                1000 * old['time'], 1000 * result['time'])
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
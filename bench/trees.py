@@ -0,0 +1,47 @@
+"""Synthetic trees of a given shape and size, the same on every run."""
+
+
+import random
+
+import pyggdrasil
+
+
+def wide(size, seed=0):
+    """The root with size - 1 leaves."""
+    root = pyggdrasil.model.Node('root', None)
+    for num in xrange(size - 1):
+        pyggdrasil.model.Node(str(num), None, root)
+    return root
+
+
+def deep(size, seed=0):
+    """A single chain of size nodes."""
+    root = node = pyggdrasil.model.Node('root', None)
+    for num in xrange(size - 1):
+        node = pyggdrasil.model.Node(str(num), None, node)
+    return root
+
+
+def balanced(size, seed=0, branching=4):
+    """Complete tree, filled level by level."""
+    nodes = [pyggdrasil.model.Node('root', None)]
+    for num in xrange(size - 1):
+        parent = nodes[num // branching]
+        nodes.append(pyggdrasil.model.Node(str(num), None, parent))
+    return nodes[0]
+
+
+def randomtree(size, seed=0):
+    """Every node is added under a uniformly chosen earlier one."""
+    generator = random.Random(seed)
+    nodes = [pyggdrasil.model.Node('root', None)]
+    for num in xrange(size - 1):
+        nodes.append(pyggdrasil.model.Node(str(num), None, generator.choice(nodes)))
+    return nodes[0]
+
+
+SHAPES = dict(wide=wide, deep=deep, balanced=balanced, random=randomtree)
+
+
+def generate(shape, size, seed=0):
+    return SHAPES[shape](size, seed)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""Compare Node.unroll with the old generator-per-node implementation.
+
+Usage: bench/unroll.py [nodes]
+"""
+
+
+import sys
+import timeit
+
+from trees import wide, deep, randomtree
+
+
+def oldunroll(node):
+    yield node
+
+    childreniters = [oldunroll(child) for child in node.children]
+
+    for iter in childreniters:
+        yield iter.next()
+
+    for iter in childreniters:
+        for item in iter:
+            yield item
+
+
+def best(func, repeat=5):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main(size):
+    # The old implementation recurses once per level
+    deepsize = min(size, sys.getrecursionlimit() // 2)
+
+    trees = [
+        ('wide', size, wide(size)),
+        ('deep', deepsize, deep(deepsize)),
+        ('random', size, randomtree(size)),
+    ]
+
+    print '%-8s %8s %10s %10s %10s %10s %10s' % (
+        'tree', 'nodes', 'old', 'unroll', 'bfs', 'preorder', 'postorder')
+    for (name, count, root) in trees:
+        assert list(oldunroll(root)) == list(root.unroll())
+        print '%-8s %8d %9.1fms %9.1fms %9.1fms %9.1fms %9.1fms' % (
+            name, count,
+            1000 * best(lambda: list(oldunroll(root))),
+            1000 * best(lambda: list(root.unroll())),
+            1000 * best(lambda: list(root.breadthfirst())),
+            1000 * best(lambda: list(root.preorder())),
+            1000 * best(lambda: list(root.postorder())),
+        )
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main(100000)
@@ -1,8 +1,11 @@
 #!/usr/bin/env python
 
 
-import pyggdrasil
+import multiprocessing
 
+import pyggdrasil.ui
 
+
+multiprocessing.freeze_support()
 app = pyggdrasil.ui.App()
 app.MainLoop()
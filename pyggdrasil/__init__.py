@@ -1 +1 @@
-from . import model, serialize, graph, export, ui
+from . import trace, model, store, serialize, textcache, graph, layout, export
@@ -0,0 +1,214 @@
+"""Render tree files from the command line, without the GUI.
+
+    pygg-batch [options] FILE|GLOB...
+
+Every input is loaded, laid out and exported in a pool of worker processes.
+Inputs whose output is up to date are skipped: by default when the output is
+newer than the input, or with --check=hash when the input has the same
+content as when the output was rendered. The hashes are kept in MANIFEST in
+the output directory.
+"""
+
+
+import glob
+import hashlib
+import json
+import multiprocessing
+import multiprocessing.dummy
+import optparse
+import os
+import sys
+import time
+
+import pyggdrasil
+
+try:
+    from pyggdrasil.graph.vector import VectorGraph as GraphClass
+except ImportError:
+    GraphClass = pyggdrasil.graph.Graph
+
+
+MANIFEST = '.pygg-batch.json'
+CHECKS = ('mtime', 'hash', 'none')
+
+
+class BatchException(Exception): pass
+
+
+def formats():
+    """Return {name: module} of the available export formats."""
+    return dict((pyggdrasil.export.key(module), module)
+                for (module, available) in pyggdrasil.export.ALL if available)
+
+
+def expand(patterns):
+    """Return the files matching any of patterns, in order and once each."""
+    filenames = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            raise BatchException('no files match %s' % pattern)
+        for filename in matches:
+            if filename not in seen:
+                seen.add(filename)
+                filenames.append(filename)
+    return filenames
+
+
+def outputname(filename, format, outputdir=None):
+    module = formats()[format]
+    base = os.path.splitext(os.path.basename(filename))[0]
+    directory = os.path.dirname(filename) if outputdir is None else outputdir
+    return os.path.join(directory, '%s.%s' % (base, pyggdrasil.export.extension(module)))
+
+
+def digest(filename, format):
+    hash = hashlib.sha1(format)
+    with open(filename, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 16), ''):
+            hash.update(block)
+    return hash.hexdigest()
+
+
+def render(filenames, format, outputdir=None, jobs=None, check='mtime'):
+    """Render every file to format, jobs at a time.
+
+    Yields (filename, output, timings, error) as the files finish, in any
+    order. timings is a dict of seconds per step, None if the file was up to
+    date; error is the message if it failed.
+    """
+    if format not in formats():
+        raise BatchException('unknown format %s' % format)
+    if check not in CHECKS:
+        raise BatchException('unknown check %s' % check)
+
+    outputs = {}
+    for filename in filenames:
+        output = outputname(filename, format, outputdir)
+        if output in outputs:
+            raise BatchException('%s and %s would both be rendered to %s' %
+                                 (outputs[output], filename, output))
+        outputs[output] = filename
+
+    manifests = {}
+    tasks = []
+    for filename in filenames:
+        output = outputname(filename, format, outputdir)
+        manifest = _manifest(manifests, os.path.dirname(output))
+        hash = digest(filename, format) if check == 'hash' else None
+
+        if os.path.exists(output) and (
+           (check == 'mtime' and os.path.getmtime(output) >= os.path.getmtime(filename)) or
+           (check == 'hash' and manifest.get(os.path.basename(output)) == hash)):
+            yield (filename, output, None, None)
+        else:
+            tasks.append((filename, output, format, hash))
+
+    if jobs == 1:
+        pool = multiprocessing.dummy.Pool(1)
+    else:
+        pool = multiprocessing.Pool(jobs)
+
+    try:
+        for (filename, output, hash, timings, error) in pool.imap_unordered(_render, tasks):
+            if hash and not error:
+                manifest = _manifest(manifests, os.path.dirname(output))
+                manifest[os.path.basename(output)] = hash
+            yield (filename, output, timings, error)
+    finally:
+        pool.terminate()
+        for (directory, manifest) in manifests.items():
+            if manifest:
+                with open(os.path.join(directory, MANIFEST), 'w') as file:
+                    json.dump(manifest, file, indent=1, sort_keys=True)
+
+
+def _manifest(manifests, directory):
+    if directory not in manifests:
+        try:
+            with open(os.path.join(directory, MANIFEST)) as file:
+                manifests[directory] = json.load(file)
+        except (IOError, ValueError):
+            manifests[directory] = {}
+    return manifests[directory]
+
+
+def _render(task):
+    (filename, output, format, hash) = task
+    timings = {}
+    try:
+        start = time.time()
+        if pyggdrasil.serialize.isbinary(filename):
+            with open(filename, 'rb') as file:
+                (root, options) = pyggdrasil.serialize.loadbinary(file)
+        else:
+            with open(filename) as file:
+                (root, options) = pyggdrasil.serialize.load(file)
+        timings['load'] = time.time() - start
+
+        start = time.time()
+        graph = pyggdrasil.graph.generate(root, graphclass=GraphClass,
+                                          **options['graph'].dict)
+        timings['layout'] = time.time() - start
+
+        start = time.time()
+        try:
+            pyggdrasil.export.run(formats()[format], graph, output)
+        except:
+            # A partly written output would look up to date on the next run
+            if os.path.exists(output):
+                os.remove(output)
+            raise
+        timings['export'] = time.time() - start
+    except Exception as e:
+        return (filename, output, hash, timings, '%s: %s' % (type(e).__name__, e))
+    return (filename, output, hash, timings, None)
+
+
+def main(args=None, out=sys.stdout):
+    parser = optparse.OptionParser(usage='%prog [options] FILE|GLOB...')
+    parser.add_option('-f', '--format', default='svg',
+                      help='export format: %s [default: %%default]' %
+                           ', '.join(sorted(formats())))
+    parser.add_option('-o', '--output-dir', dest='outputdir', metavar='DIR',
+                      help='write outputs to DIR instead of next to the inputs; '
+                           'inputs must then have different names')
+    parser.add_option('-j', '--jobs', type='int', default=None,
+                      help='worker processes [default: one per CPU]')
+    parser.add_option('-c', '--check', choices=CHECKS, default='mtime',
+                      help='skip inputs whose output is up to date by %s '
+                           '[default: %%default]' % ', '.join(CHECKS))
+    (options, args) = parser.parse_args(args)
+    if not args:
+        parser.error('no input files')
+    pyggdrasil.trace.fromenvironment()
+
+    if options.outputdir and not os.path.isdir(options.outputdir):
+        os.makedirs(options.outputdir)
+
+    try:
+        filenames = expand(args)
+        results = render(filenames, options.format, options.outputdir,
+                         options.jobs, options.check)
+
+        start = time.time()
+        counts = dict(rendered=0, skipped=0, failed=0)
+        for (filename, output, timings, error) in results:
+            if error:
+                counts['failed'] += 1
+                out.write('failed   %s: %s\n' % (filename, error))
+            elif timings is None:
+                counts['skipped'] += 1
+                out.write('skipped  %s\n' % filename)
+            else:
+                counts['rendered'] += 1
+                out.write('%7.3fs  %s -> %s (load %.3fs, layout %.3fs, export %.3fs)\n' %
+                          (sum(timings.values()), filename, output,
+                           timings['load'], timings['layout'], timings['export']))
+    except BatchException as e:
+        parser.error(str(e))
+
+    out.write('%(rendered)d rendered, %(skipped)d skipped, %(failed)d failed' % counts +
+              ' in %.3fs\n' % (time.time() - start))
+    return 1 if counts['failed'] else 0
@@ -1,3 +1,6 @@
+from pyggdrasil import trace
+
+
 ALL = []
 
 
@@ -13,12 +16,43 @@ try:
 except ImportError:
     ALL.append(('png', False))
 
+try:
+    import pngtiled
+    ALL.append((pngtiled, True))
+except ImportError:
+    ALL.append(('pngtiled', False))
+
+try:
+    import pngaa
+    ALL.append((pngaa, True))
+except ImportError:
+    ALL.append(('pngaa', False))
+
 
 def run(module, graph, filename, progresscallback=None):
     if not progresscallback:
-        def updatefunc(value):
+        def progresscallback(value):
             pass
-    module.export(graph, filename, progresscallback)
+    with trace.span('export.' + key(module), nodes=len(graph)):
+        module.export(graph, filename, progresscallback)
+
+
+def prepare(module):
+    """Set module up to be run from another thread; call it from the main
+    thread first.
+    """
+    if hasattr(module, 'prepare'):
+        module.prepare()
+
+
+def key(module):
+    """Return the name that tells module apart from the other exporters;
+    several of them can write the same file type.
+    """
+    if hasattr(module, '__name__'):
+        return module.__name__.rpartition('.')[2]
+    else:
+        return str(module)
 
 
 def name(module):
@@ -31,7 +65,10 @@ def name(module):
 def extension(module):
     if hasattr(module, 'EXTENSION'):
         return module.EXTENSION
-    elif hasattr(module, '__name__'):
-        return module.__name__.rpartition('.')[2]
     else:
-        return str(module)
+        return key(module)
+
+
+def wildcard(module):
+    """Return a file dialog wildcard labelled with the exporter's name."""
+    return '%s (*.%s)|*.%s' % (name(module), extension(module), extension(module))
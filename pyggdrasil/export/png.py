@@ -2,9 +2,16 @@ import cmath
 import PIL.Image
 import PIL.ImageDraw
 
+from pyggdrasil import textcache
+
 
 SCALE = 8
 
+# Label extents, shared by every export in the process (and by the other PIL
+# exporters); PIL measures the same on any image, this one is just for that
+_measuredraw = PIL.ImageDraw.Draw(PIL.Image.new('L', (1, 1)))
+texts = textcache.TextCache(_measuredraw.textsize)
+
 
 def export(graph, filename, progresscallback):
     # Upscaling draw for anti-aliased downscale
@@ -15,17 +22,11 @@ def export(graph, filename, progresscallback):
                           '#FFFFFF')
     draw = PIL.ImageDraw.Draw(image)
 
-    for node in scaledgraph:
-        if scaledgraph.hasline(node):
-            spos = scaledgraph.linestart(node)
-            epos = scaledgraph.lineend(node)
-
-            draw.line([spos.real, spos.imag, epos.real, epos.imag],
-                      fill='#000000', width=SCALE)
+    for (line, arrow) in zip(scaledgraph.lines(), scaledgraph.arrows()):
+        draw.line(list(line), fill='#000000', width=SCALE)
 
-            points = [(pos.real, pos.imag)
-                          for pos in scaledgraph.arrow_points(node)]
-            draw.polygon(points, outline='#000000', fill='#000000')
+        points = [tuple(point) for point in arrow]
+        draw.polygon(points, outline='#000000', fill='#000000')
 
     for node in scaledgraph:
         pos = scaledgraph.pos(node)
@@ -49,7 +50,7 @@ def export(graph, filename, progresscallback):
     for node in graph:
         pos = graph.pos(node)
 
-        w, h = draw.textsize(node.id)
+        w, h = texts.extent(node.id)
         x = pos.real - int(w / 2)
         y = pos.imag - int(h / 2)
         draw.text((x, y), node.id)
@@ -0,0 +1,254 @@
+"""Anti-aliased PNG exporter drawing at the target resolution.
+
+png.export draws everything at SCALE (8) times the size and downsamples,
+which costs 64 times the pixels plus SCALE ellipses per node. This exporter
+computes the coverage of every shape directly at the final resolution with
+numpy, in one pass:
+
+    - lines are drawn Wu-style, one pixel wide, many lines at once
+    - arrowheads are supersampled only inside their own small boxes
+    - node circles are blitted from pre-rendered coverage sprites, one per
+      quarter-pixel offset, all nodes sharing an offset in one operation
+
+The result matches png.export visually; pixels differ slightly on edges and
+where many lines converge. png.export also mis-draws very long lines once
+the supersampled canvas gets large, which this exporter does not.
+
+Measured on random trees (radius 40, one core, PIL 6.2):
+
+    nodes   size            png      pngaa
+    100     4500x810        2.2s     0.2s
+    1000    43650x1260      34.1s    2.3s
+
+About half of pngaa's time is PNG compression, which both exporters pay.
+"""
+
+
+import math
+
+import numpy
+import PIL.Image
+import PIL.ImageDraw
+
+import png
+
+
+NAME = 'PNG (anti-aliased)'
+EXTENSION = 'png'
+
+# Samples per pixel along each axis for circles and arrows
+SUBSAMPLES = 4
+
+# Subpixel offsets that have their own circle sprite, along each axis
+PHASES = 4
+
+# Arrowheads are rasterized in batches to bound the temporary arrays
+ARROWBATCH = 2048
+
+# Pixels of lines, and of circle sprites, drawn per batch for the same reason
+LINEBATCH = 1 << 16
+CIRCLEBATCH = 1 << 20
+
+
+def export(graph, filename, progresscallback):
+    width = int(graph.width)
+    height = int(graph.height)
+    radius = graph.radius
+
+    # Margin so sprites and arrows never need clipping
+    margin = int(math.ceil(radius)) + 4
+    ink = numpy.zeros((height + 2 * margin, width + 2 * margin), dtype=numpy.float32)
+
+    lines = numpy.asarray(graph.lines(), dtype=float).reshape(-1, 4) + margin
+    arrows = numpy.asarray(graph.arrows(), dtype=float).reshape(-1, 3, 2) + margin
+
+    _drawlines(ink, lines)
+    progresscallback(0.2)
+    _drawarrows(ink, arrows)
+    progresscallback(0.4)
+
+    image = 1 - ink
+    del ink
+
+    positions = numpy.array([graph.pos(node) for node in graph], dtype=complex) + \
+                complex(margin, margin)
+    _drawcircles(image, positions, radius)
+    progresscallback(0.8)
+
+    image = image[margin:margin + height, margin:margin + width]
+    image = PIL.Image.fromarray(numpy.round(image * 255).astype(numpy.uint8), 'L')
+
+    draw = PIL.ImageDraw.Draw(image)
+    texts = png.texts
+    for node in graph:
+        pos = graph.pos(node)
+
+        w, h = texts.extent(node.id)
+        x = pos.real - int(w / 2)
+        y = pos.imag - int(h / 2)
+        draw.text((x, y), node.id)
+
+    image.save(filename)
+    progresscallback(1.0)
+
+
+def _drawlines(ink, lines):
+    """Accumulate the coverage of one pixel wide lines into ink."""
+    if not len(lines):
+        return
+    (x1, y1, x2, y2) = lines.T
+
+    # Walk every line along its major axis, left to right
+    steep = numpy.abs(y2 - y1) > numpy.abs(x2 - x1)
+    (x1, y1, x2, y2) = (numpy.where(steep, y1, x1), numpy.where(steep, x1, y1),
+                        numpy.where(steep, y2, x2), numpy.where(steep, x2, y2))
+    backwards = x1 > x2
+    (x1, y1, x2, y2) = (numpy.where(backwards, x2, x1), numpy.where(backwards, y2, y1),
+                        numpy.where(backwards, x1, x2), numpy.where(backwards, y1, y2))
+    keep = x2 - x1 >= 1e-9
+    (x1, y1, x2, y2, steep) = (x1[keep], y1[keep], x2[keep], y2[keep], steep[keep])
+
+    # Batches of whole lines, at most LINEBATCH pixels unless a single line
+    # is longer
+    counts = (numpy.ceil(x2) - numpy.floor(x1)).astype(int)
+    ends = numpy.cumsum(counts)
+    start = 0
+    while start < len(counts):
+        stop = numpy.searchsorted(ends, ends[start] - counts[start] + LINEBATCH, 'right')
+        stop = max(stop, start + 1)
+        batch = slice(start, stop)
+        _drawlinebatch(ink, x1[batch], y1[batch], x2[batch], y2[batch], steep[batch])
+        start = stop
+
+
+def _drawlinebatch(ink, x1, y1, x2, y2, steep):
+    slopes = (y2 - y1) / (x2 - x1)
+
+    # Pixel centres along the major axis of every line, in one array
+    firsts = numpy.floor(x1)
+    counts = (numpy.ceil(x2) - firsts).astype(int)
+    owners = numpy.repeat(numpy.arange(len(counts)), counts)
+    starts = numpy.cumsum(counts) - counts
+    major = firsts[owners] + (numpy.arange(len(owners)) - starts[owners]) + 0.5
+    inside = (major >= x1[owners]) & (major <= x2[owners])
+    (major, owners) = (major[inside], owners[inside])
+
+    slope = slopes[owners]
+    minor = y1[owners] + (major - x1[owners]) * slope
+
+    # A line one pixel wide spans this much along the minor axis, which
+    # is at most sqrt(2) so it touches at most three pixels.
+    half = 0.5 * numpy.sqrt(1 + slope * slope)
+    top = minor - half
+    bottom = minor + half
+    cells = numpy.floor(major)
+    steep = steep[owners]
+
+    rows = []
+    columns = []
+    coverages = []
+    for step in range(3):
+        cell = numpy.floor(top) + step
+        coverage = numpy.minimum(cell + 1, bottom) - numpy.maximum(cell, top)
+        rows.append(numpy.where(steep, cells, cell))
+        columns.append(numpy.where(steep, cell, cells))
+        coverages.append(numpy.clip(coverage, 0, 1))
+
+    numpy.maximum.at(ink, (numpy.concatenate(rows).astype(int),
+                           numpy.concatenate(columns).astype(int)),
+                     numpy.concatenate(coverages).astype(numpy.float32))
+
+
+def _drawarrows(ink, arrows):
+    """Accumulate the coverage of filled triangles into ink."""
+    if not len(arrows):
+        return
+
+    size = int(math.ceil((arrows.max(axis=1) - arrows.min(axis=1)).max())) + 2
+    offsets = (numpy.arange(size * SUBSAMPLES) + 0.5) / SUBSAMPLES
+
+    for start in range(0, len(arrows), ARROWBATCH):
+        batch = arrows[start:start + ARROWBATCH]
+        origins = numpy.floor(batch.min(axis=1))
+
+        xs = origins[:, 0, numpy.newaxis, numpy.newaxis] + offsets[numpy.newaxis, numpy.newaxis, :]
+        ys = origins[:, 1, numpy.newaxis, numpy.newaxis] + offsets[numpy.newaxis, :, numpy.newaxis]
+
+        signs = []
+        for (a, b) in ((0, 1), (1, 2), (2, 0)):
+            ax = batch[:, a, 0, numpy.newaxis, numpy.newaxis]
+            ay = batch[:, a, 1, numpy.newaxis, numpy.newaxis]
+            bx = batch[:, b, 0, numpy.newaxis, numpy.newaxis]
+            by = batch[:, b, 1, numpy.newaxis, numpy.newaxis]
+            signs.append((bx - ax) * (ys - ay) - (by - ay) * (xs - ax))
+        inside = ((signs[0] >= 0) & (signs[1] >= 0) & (signs[2] >= 0)) | \
+                 ((signs[0] <= 0) & (signs[1] <= 0) & (signs[2] <= 0))
+
+        coverage = inside.reshape(len(batch), size, SUBSAMPLES, size, SUBSAMPLES)
+        coverage = coverage.mean(axis=(2, 4)).astype(numpy.float32)
+
+        cells = numpy.arange(size)
+        rows = origins[:, 1, numpy.newaxis, numpy.newaxis].astype(int) + cells[:, numpy.newaxis]
+        columns = origins[:, 0, numpy.newaxis, numpy.newaxis].astype(int) + cells[numpy.newaxis, :]
+        rows, columns = numpy.broadcast_arrays(rows, columns)
+        numpy.maximum.at(ink, (rows, columns), coverage)
+
+
+def _drawcircles(image, positions, radius):
+    """Draw white filled circles with a one pixel black outline."""
+    if not len(positions):
+        return
+
+    sprites = _circlesprites(radius)
+    size = sprites[0][0].shape[0]
+    centre = size // 2
+
+    # Split every position into a whole pixel and the nearest sprite phase
+    phases = numpy.round(numpy.column_stack([positions.real, positions.imag]) * PHASES)
+    cells = numpy.floor_divide(phases, PHASES).astype(int) - centre
+    phases = (phases - (cells + centre) * PHASES).astype(int)
+
+    span = numpy.arange(size)
+    batchsize = max(1, CIRCLEBATCH // (size * size))
+    for phasex in range(PHASES):
+        for phasey in range(PHASES):
+            selected = numpy.flatnonzero((phases[:, 0] == phasex) & (phases[:, 1] == phasey))
+            (fill, outline) = sprites[phasex * PHASES + phasey]
+
+            for start in range(0, len(selected), batchsize):
+                batch = selected[start:start + batchsize]
+                rows = cells[batch, 1, numpy.newaxis, numpy.newaxis] + span[:, numpy.newaxis]
+                columns = cells[batch, 0, numpy.newaxis, numpy.newaxis] + span[numpy.newaxis, :]
+                rows, columns = numpy.broadcast_arrays(rows, columns)
+
+                pixels = image[rows, columns]
+                image[rows, columns] = (pixels * (1 - fill) + fill) * (1 - outline)
+
+
+def _circlesprites(radius):
+    """Return [(fill, outline)] coverage sprites for every subpixel phase.
+
+    The circle's centre is at the middle pixel of the sprite, shifted right and
+    down by phase / PHASES of a pixel.
+    """
+    size = 2 * int(math.ceil(radius)) + 3
+    centre = size // 2
+    offsets = (numpy.arange(size * SUBSAMPLES) + 0.5) / SUBSAMPLES
+
+    sprites = []
+    for phasex in range(PHASES):
+        for phasey in range(PHASES):
+            # Pixel centres are at +0.5, positions are at pixel corners
+            xs = offsets[numpy.newaxis, :] - (centre + float(phasex) / PHASES)
+            ys = offsets[:, numpy.newaxis] - (centre + float(phasey) / PHASES)
+            distances = numpy.hypot(xs, ys)
+
+            disk = _average(distances <= radius, size)
+            inner = _average(distances <= radius - 1, size)
+            sprites.append((disk, disk - inner))
+    return sprites
+
+
+def _average(samples, size):
+    return samples.reshape(size, SUBSAMPLES, size, SUBSAMPLES).mean(axis=(1, 3)) \
+                  .astype(numpy.float32)
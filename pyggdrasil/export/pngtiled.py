@@ -0,0 +1,216 @@
+"""Tiled PNG exporter.
+
+Renders the image in fixed-size tiles instead of one supersampled canvas.
+Each tile is drawn at SCALE times its size, downsampled and handed back
+independently, so tiles are spread over a process pool. Tiles are culled with
+a spatial index and stitched a row at a time into the PNG stream, so memory
+is bounded by one row of tiles (image width * TILESIZE pixels) plus the
+supersampled tiles in flight, not by the image size.
+"""
+
+
+import math
+import multiprocessing
+import multiprocessing.dummy
+import struct
+import sys
+import threading
+import zlib
+
+import PIL.Image
+import PIL.ImageDraw
+
+from pyggdrasil.graph import spatial
+
+import png
+
+
+NAME = 'PNG (tiled)'
+EXTENSION = 'png'
+
+SCALE = png.SCALE
+TILESIZE = 256
+
+# Tiles are drawn with a border so the downsampling filter sees the same
+# neighbouring pixels as it would on a single canvas.
+BORDER = 4
+
+
+def export(graph, filename, progresscallback, tilesize=TILESIZE, processes=None):
+    width = int(graph.width)
+    height = int(graph.height)
+    columns = int(math.ceil(width / float(tilesize)))
+    rows = int(math.ceil(height / float(tilesize)))
+
+    index = spatial.SpatialIndex(graph)
+    labelmargin = _labelmargin(graph)
+
+    def tasks(row):
+        for column in range(columns):
+            x = column * tilesize
+            y = row * tilesize
+            yield _task(graph, index, labelmargin, x, y,
+                        min(tilesize, width - x), min(tilesize, height - y))
+
+    if _pool is not None and processes is None:
+        pool = _pool
+    elif processes != 1 and _canfork():
+        pool = multiprocessing.Pool(processes)
+    else:
+        # PIL and zlib let go of the GIL for the heavy parts
+        pool = multiprocessing.dummy.Pool(processes or multiprocessing.cpu_count())
+
+    file = open(filename, 'wb')
+    try:
+        writer = _PngWriter(file, width, height)
+
+        # Keep the next row rendering while the current one is written
+        pending = pool.map_async(_rendertile, list(tasks(0)))
+        for row in range(rows):
+            tiles = pending.get()
+            if row + 1 < rows:
+                pending = pool.map_async(_rendertile, list(tasks(row + 1)))
+
+            for y in range(len(tiles[0][1]) // tiles[0][0]):
+                writer.write(''.join(data[y*tilewidth:(y + 1)*tilewidth]
+                                     for (tilewidth, data) in tiles))
+            progresscallback(float(row + 1) / rows)
+
+        writer.close()
+    finally:
+        file.close()
+        if pool is not _pool:
+            pool.terminate()
+
+
+# Worker processes started by prepare, shared by every export after it
+_pool = None
+
+
+def prepare():
+    """Start the worker processes, so that exports run from other threads can
+    use them. Call it from the main thread; it does nothing where workers
+    cannot be started.
+    """
+    global _pool
+    if _pool is None and _canfork():
+        _pool = multiprocessing.Pool()
+
+
+def _canfork():
+    # Frozen builds can only start workers after freeze_support(), daemonic
+    # processes (e.g. batch workers) may not have children, and forking from
+    # another thread (e.g. the GUI's export thread) copies a process whose
+    # other threads are halfway through something. Without prepare, tiles
+    # are drawn in threads instead.
+    if getattr(sys, 'frozen', False) or multiprocessing.current_process().daemon:
+        return False
+    return threading.current_thread().name == 'MainThread'
+
+
+def _labelmargin(graph):
+    margin = 0
+    for node in graph:
+        w, h = png.texts.extent(node.id)
+        margin = max(margin, w, h)
+    return margin / 2.0
+
+
+def _task(graph, index, labelmargin, x, y, width, height):
+    """Collect everything drawn on the tile at (x, y), relative to the tile."""
+    x1 = x - BORDER
+    y1 = y - BORDER
+    x2 = x + width + BORDER
+    y2 = y + height + BORDER
+    origin = complex(x1, y1)
+
+    lines = []
+    arrows = []
+    for (node, line, arrow) in index.edges((x1, y1, x2, y2)):
+        lines.append((line[0] - x1, line[1] - y1, line[2] - x1, line[3] - y1))
+        arrows.append([(px - x1, py - y1) for (px, py) in arrow])
+
+    circles = [graph.pos(node) - origin for node in index.nodes((x1, y1, x2, y2))]
+
+    labels = []
+    for node in index.nodes((x1 - labelmargin, y1 - labelmargin,
+                             x2 + labelmargin, y2 + labelmargin)):
+        labels.append((graph.pos(node) - origin, node.id))
+
+    return (width, height, graph.radius, lines, arrows, circles, labels)
+
+
+def _rendertile(task):
+    """Render a tile the same way png.export renders the whole image.
+
+    Returns (width, data) where data is the tile's rows of 8-bit grey pixels.
+    """
+    (width, height, radius, lines, arrows, circles, labels) = task
+    if not (lines or circles or labels):
+        return (width, '\xff' * (width * height))
+
+    fullwidth = width + 2 * BORDER
+    fullheight = height + 2 * BORDER
+
+    image = PIL.Image.new('L', (fullwidth * SCALE, fullheight * SCALE), '#FFFFFF')
+    draw = PIL.ImageDraw.Draw(image)
+
+    for (line, arrow) in zip(lines, arrows):
+        draw.line([_floor(value * SCALE) for value in line],
+                  fill='#000000', width=SCALE)
+        draw.polygon([(_floor(x * SCALE), _floor(y * SCALE)) for (x, y) in arrow],
+                     outline='#000000', fill='#000000')
+
+    scaledradius = radius * SCALE
+    for pos in circles:
+        pos = pos * SCALE
+        # Draw concentric circles to emulate a wide brush
+        for offset in range(SCALE):
+            draw.ellipse((_floor(pos.real - scaledradius + offset),
+                          _floor(pos.imag - scaledradius + offset),
+                          _floor(pos.real + scaledradius - offset),
+                          _floor(pos.imag + scaledradius - offset)),
+                         outline='#000000', fill='#FFFFFF')
+
+    image = image.resize((fullwidth, fullheight), PIL.Image.ANTIALIAS)
+
+    draw = PIL.ImageDraw.Draw(image)
+    for (pos, text) in labels:
+        w, h = png.texts.extent(text)
+        draw.text((_floor(pos.real - int(w / 2)), _floor(pos.imag - int(h / 2))), text)
+
+    image = image.crop((BORDER, BORDER, BORDER + width, BORDER + height))
+    return (width, image.tobytes())
+
+
+def _floor(value):
+    # PIL truncates coordinates, which only matches floor on the full canvas
+    # where nothing is negative. Tiles are offset by whole pixels, so flooring
+    # here gives the same pixels as the single canvas.
+    return int(math.floor(value))
+
+
+class _PngWriter(object):
+    """Writes an 8-bit greyscale PNG one row at a time."""
+    def __init__(self, file, width, height):
+        self._file = file
+        self._compressor = zlib.compressobj()
+
+        file.write('\x89PNG\r\n\x1a\n')
+        self._chunk('IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0))
+
+    def write(self, row):
+        # Every row starts with its filter type, 0 (none)
+        data = self._compressor.compress('\x00' + row)
+        if data:
+            self._chunk('IDAT', data)
+
+    def close(self):
+        self._chunk('IDAT', self._compressor.flush())
+        self._chunk('IEND', '')
+
+    def _chunk(self, kind, data):
+        self._file.write(struct.pack('>I', len(data)))
+        self._file.write(kind)
+        self._file.write(data)
+        self._file.write(struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
@@ -1,61 +1,114 @@
-try:
-    # 2.5 built-in
-    import xml.etree.ElementTree as et
-except ImportError:
-    # External library
-    import elementtree.ElementTree as et
+"""Streaming SVG exporter.
+
+Elements are written to the file as the graph is walked instead of building
+a DOM first, so memory use does not grow with the number of nodes.
+"""
+
+
+from xml.sax.saxutils import escape, quoteattr
+
+
+BUFFERSIZE = 1 << 16
+
+# Report progress about this many times over the whole export
+PROGRESSSTEPS = 100
 
 
 def export(graph, filename, progresscallback):
-    root = et.Element('svg', {
+    file = open(filename, 'w', BUFFERSIZE)
+    try:
+        write(file, graph, progresscallback)
+    finally:
+        file.close()
+    progresscallback(1.0)
+
+
+def write(file, graph, progresscallback):
+    file.write(_start('svg', {
         'xmlns': 'http://www.w3.org/2000/svg',
         'width': str(graph.width), 'height': str(graph.height),
-    })
+    }))
 
-    defs = et.SubElement(root, 'defs')
     # Base arrowhead is horizontal (looks like >)
-    arrow = et.SubElement(defs, 'marker', {
-        'id': 'arrowhead', 
+    file.write('<defs>')
+    file.write(_start('marker', {
+        'id': 'arrowhead',
         'viewBox': '0 0 %s %s' % (graph.arrow_length, graph.arrow_width),
         'refX': str(graph.arrow_length), 'refY': str(graph.arrow_width / 2.0),
         'markerUnits': 'strokeWidth',
         'markerWidth': str(graph.arrow_length), 'markerHeight': str(graph.arrow_width),
         'orient': 'auto',
-    })
-    et.SubElement(arrow, 'polygon', {
+    }))
+    file.write(_empty('polygon', {
         'points': '0,0 %s,%s 0,%s' % (graph.arrow_length, graph.arrow_width / 2.0, graph.arrow_width),
         'fill': 'black', 'stroke': 'black',
-    })
+    }))
+    file.write('</marker></defs>')
 
-    for node in graph:
-        if graph.hasline(node):
-            spos = graph.linestart(node)
-            epos = graph.lineend(node)
-            et.SubElement(root, 'line', {
-                'x1': str(spos.real), 'y1': str(spos.imag),
-                'x2': str(epos.real), 'y2': str(epos.imag),
-                'stroke': 'black',
-                'marker-end': 'url(#%s)' % arrow.get('id'),
-            })
+    progress = _Progress(progresscallback, 2 * len(graph))
+
+    for (x1, y1, x2, y2) in graph.lines():
+        file.write(_empty('line', {
+            'x1': _number(x1), 'y1': _number(y1),
+            'x2': _number(x2), 'y2': _number(y2),
+            'stroke': 'black',
+            'marker-end': 'url(#arrowhead)',
+        }))
+        progress.step()
 
     for node in graph:
         pos = graph.pos(node)
+        x = _number(pos.real)
+        y = _number(pos.imag)
 
-        group = et.SubElement(root, 'g')
-
-        et.SubElement(group, 'circle', {
-            'cx': str(pos.real), 'cy': str(pos.imag), 'r': str(graph.radius),
+        file.write('<g>')
+        file.write(_empty('circle', {
+            'cx': x, 'cy': y, 'r': str(graph.radius),
             'stroke': 'black', 'fill': 'white',
-        })
-        text = et.SubElement(group, 'text', {
-            'x': str(pos.real), 'y': str(pos.imag),
+        }))
+        file.write(_start('text', {
+            'x': x, 'y': y,
             'text-anchor': 'middle', 'alignment-baseline': 'mathematical',
-        })
-        text.text = node.id
+        }))
+        file.write(_text(node.id))
+        file.write('</text></g>')
+        progress.step()
 
-    file = open(filename, 'w')
-    try:
-        file.write(et.tostring(root))
-        progresscallback(1.0)
-    finally:
-        file.close()
+    file.write('</svg>')
+
+
+class _Progress(object):
+    """Calls progresscallback with the completed fraction every few steps."""
+    def __init__(self, progresscallback, total):
+        self._callback = progresscallback
+        self._total = max(total, 1)
+        self._interval = max(self._total // PROGRESSSTEPS, 1)
+        self._done = 0
+
+    def step(self):
+        self._done += 1
+        if self._done % self._interval == 0:
+            self._callback(float(self._done) / self._total)
+
+
+def _start(tag, attributes):
+    return '<%s%s>' % (tag, _attributes(attributes))
+
+
+def _empty(tag, attributes):
+    return '<%s%s />' % (tag, _attributes(attributes))
+
+
+def _attributes(attributes):
+    return ''.join(' %s=%s' % (key, quoteattr(attributes[key]))
+                   for key in sorted(attributes))
+
+
+def _text(text):
+    if isinstance(text, unicode):
+        text = text.encode('utf-8')
+    return escape(text)
+
+
+def _number(value):
+    return str(float(value))
@@ -8,20 +8,28 @@ RawGraph - any iterable with the following requirements:
 """
 
 
+import copy
 import math
 import cmath
 
-from . import topdown
+from .. import trace
+from . import topdown, iterative
 
 
-def generate(root, module=topdown, *args, **kwargs):
+@trace.traced('graph.generate', nodes=len)
+def generate(root, module=iterative, *args, **kwargs):
     """Convert a tree node into a graph using the given module.
 
     The module must implement the following:
 
     def generate(root) -> RawGraph
+
+    The graphclass keyword defaults to Graph; vector.VectorGraph may be used
+    instead. Other arguments are passed on to the graph class.
     """
-    return Graph(module.generate(root), *args, **kwargs)
+    # Keyword only, so positional graph options keep their meaning
+    graphclass = kwargs.pop('graphclass', None) or Graph
+    return graphclass(module.generate(root), *args, **kwargs)
 
 
 class Graph(object):
@@ -63,29 +71,37 @@ class Graph(object):
 
         cached = [(node, _round(pos*self._scalar(), 10)) for (node, pos) in rawgraph]
 
-        xmin = min(pos.real for (node, pos) in cached) - 0.5*self._scalar()
-        xmax = max(pos.real for (node, pos) in cached) + 0.5*self._scalar()
-        ymin = min(pos.imag for (node, pos) in cached) - 0.5*self._scalar()
-        ymax = max(pos.imag for (node, pos) in cached) + 0.5*self._scalar()
+        with trace.span('graph.normalize', nodes=len(cached)):
+            xmin = min(pos.real for (node, pos) in cached) - 0.5*self._scalar()
+            xmax = max(pos.real for (node, pos) in cached) + 0.5*self._scalar()
+            ymin = min(pos.imag for (node, pos) in cached) - 0.5*self._scalar()
+            ymax = max(pos.imag for (node, pos) in cached) + 0.5*self._scalar()
+
+            self.width = xmax - xmin
+            self.height = ymax - ymin
 
-        self.width = xmax - xmin
-        self.height = ymax - ymin
+            if normalize:
+                offset = complex(xmin, ymin)
+                self._nodespos = dict((node, pos - offset) for (node, pos) in cached)
+            else:
+                self._nodespos = dict(cached)
 
-        if normalize:
-            offset = complex(xmin, ymin)
-            self._nodespos = dict((node, pos - offset) for (node, pos) in cached)
-        else:
-            self._nodespos = dict(cached)
+        # Parents as they were when laid out, so that a Transition can follow
+        # nodes that have been removed from the tree since
+        self._parents = dict((node, getattr(node, 'parent', None)) for (node, pos) in cached)
 
     def _scalar(self):
         return 2.0 * (self.radius + self.padding)
 
-    def __in__(self, key):
+    def __contains__(self, key):
         return key in self._nodespos
 
     def __iter__(self):
         return iter(self._nodespos)
 
+    def __len__(self):
+        return len(self._nodespos)
+
     def raw(self):
         """Return RawGraph equivalent of the Graph.
         """
@@ -96,15 +112,21 @@ class Graph(object):
         """Return the draw position of the node."""
         return self._nodespos[node]
 
+    def parent(self, node):
+        """Return the parent node had when laid out, if it is in the graph."""
+        parent = self._parents[node]
+        return parent if parent in self._nodespos else None
+
     def hasline(self, node):
-        return node.parent is not None and \
-           self.pos(node) is not None and self.pos(node.parent) is not None
+        parent = self.parent(node)
+        return parent is not None and \
+           self.pos(node) is not None and self.pos(parent) is not None
 
     def linedir(self, node):
         """Return the angle (in radians) of the connecting line."""
         try:
             cpos = self.pos(node)
-            ppos = self.pos(node.parent)
+            ppos = self.pos(self.parent(node))
             vector = ppos - cpos
             return math.atan2(vector.imag, vector.real)
         except TypeError:
@@ -120,7 +142,7 @@ class Graph(object):
     def lineend(self, node):
         """Return the end position of the connecting line to the parent."""
         try:
-            return self.pos(node.parent) - self._lineoffset(node)
+            return self.pos(self.parent(node)) - self._lineoffset(node)
         except TypeError:
             return None
 
@@ -134,38 +156,94 @@ class Graph(object):
     def _lineoffset(self, node):
         return self.radius * cmath.exp(self.linedir(node) * 1j)
 
+    def lines(self):
+        """Return (x1, y1, x2, y2) of every connecting line."""
+        lines = []
+        for node in self:
+            if self.hasline(node):
+                spos = self.linestart(node)
+                epos = self.lineend(node)
+                lines.append((spos.real, spos.imag, epos.real, epos.imag))
+        return lines
+
+    def arrows(self):
+        """Return the [(x, y)] polygon of every arrow, same order as lines()."""
+        return [[(pos.real, pos.imag) for pos in self.arrow_points(node)]
+                    for node in self if self.hasline(node)]
+
     def scale(self, value):
         """Multiply each position by value.
         Also scales radius, padding, width, and height.
         """
-        return Graph(self.raw(),
+        scaled = self.__class__(self.raw(),
                      radius=self.radius*value, padding=self.padding*value,
                      arrow_width=self.arrow_width*value, arrow_length=self.arrow_length*value)
+        scaled._parents = self._parents
+        return scaled
 
+    def relabel(self, func):
+        """Return the same layout with every node replaced by func(node)."""
+        relabeled = copy.copy(self)
+        relabeled._nodespos = dict((func(node), pos) for (node, pos) in self._nodespos.items())
+        relabeled._parents = dict(
+            (func(node), func(parent) if parent in self._nodespos else None)
+            for (node, parent) in self._parents.items())
+        return relabeled
 
-def transition(startgraph, endgraph, endweight):
-    startraw = dict(startgraph.raw())
-    endraw = dict(endgraph.raw())
-    startweight = 1 - endweight
-
-    nodespos = []
-    nodes = set(startraw) | set(endraw)
-    for node in nodes:
-        startpos = _ancestorpos(startraw, node)
-        endpos = _ancestorpos(endraw, node)
-        pos = startpos*startweight + endpos*endweight
 
-        nodespos.append((node, pos))
+def transition(startgraph, endgraph, endweight):
+    return Transition(startgraph, endgraph).frame(endweight)
 
-    return Graph(nodespos,
-                 radius=endgraph.radius, padding=endgraph.padding,
-                 arrow_width=endgraph.arrow_width, arrow_length=endgraph.arrow_length)
 
+class Transition(object):
+    """Animation between two graphs of the same tree.
 
-def _ancestorpos(d, node):
-    while node not in d:
-        node = node.parent
-    return d[node]
+    Nodes that are only in one of the graphs move from, or to, the position
+    of their nearest ancestor in the other. Ancestors are those of the graph
+    the node is in, so nodes removed from the tree follow their old parent.
+    Positions are matched up once, so every frame is a single interpolation.
+    """
+    @trace.traced('graph.transition.setup')
+    def __init__(self, startgraph, endgraph):
+        self.startgraph = startgraph
+        self.endgraph = endgraph
+
+        startraw = dict(startgraph.raw())
+        endraw = dict(endgraph.raw())
+
+        self.nodes = list(endraw)
+        self.nodes.extend(node for node in startraw if node not in endraw)
+
+        self._parents = dict((node, startgraph.parent(node)) for node in startgraph)
+        self._parents.update((node, endgraph.parent(node)) for node in endgraph)
+
+        self._starts = []
+        self._ends = []
+        for node in self.nodes:
+            startpos = _ancestorpos(startraw, self._parents, node)
+            endpos = _ancestorpos(endraw, self._parents, node)
+            # Detached nodes have no ancestors left and stay in place
+            self._starts.append(endpos if startpos is None else startpos)
+            self._ends.append(startpos if endpos is None else endpos)
+
+    @trace.traced('graph.transition.frame', nodes=len)
+    def frame(self, endweight):
+        startweight = 1 - endweight
+        endgraph = self.endgraph
+        nodespos = [(node, startpos*startweight + endpos*endweight)
+                    for (node, startpos, endpos) in zip(self.nodes, self._starts, self._ends)]
+
+        frame = Graph(nodespos,
+                      radius=endgraph.radius, padding=endgraph.padding,
+                      arrow_width=endgraph.arrow_width, arrow_length=endgraph.arrow_length)
+        frame._parents = self._parents
+        return frame
+
+
+def _ancestorpos(d, parents, node):
+    while node is not None and node not in d:
+        node = parents.get(node)
+    return d.get(node)
 
 
 def _round(c, precision):
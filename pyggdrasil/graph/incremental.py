@@ -0,0 +1,298 @@
+"""Incremental relayout for the topdown (and iterative) layout.
+
+Instead of laying out the whole tree again after an edit, relayout takes the
+previous Graph and a list of changes and only lays out the subtrees that were
+added or reordered. In topdown every subtree occupies a contiguous horizontal
+span, so the rest of the tree is updated by shifting:
+
+    - nodes to the right of the changed span move by the change in width
+    - ancestors of the change move by half of it (they stay centred)
+
+The result is identical to generating the layout from scratch. The changes
+must describe the tree as it is now, in the order they happened.
+"""
+
+
+import itertools
+
+from . import iterative
+
+try:
+    import numpy
+    from .vector import VectorGraph
+except ImportError:
+    VectorGraph = None
+
+
+class Added(object):
+    """node (and its subtree) was attached to node.parent."""
+    def __init__(self, node):
+        self.node = node
+
+
+class Removed(object):
+    """node (and its subtree) was detached from parent."""
+    def __init__(self, node, parent):
+        self.node = node
+        self.parent = parent
+
+
+class Moved(object):
+    """node was reparented from oldparent to node.parent."""
+    def __init__(self, node, oldparent):
+        self.node = node
+        self.oldparent = oldparent
+
+
+class Sorted(object):
+    """node's descendants were reordered, e.g. by Node.sort."""
+    def __init__(self, node):
+        self.node = node
+
+
+class Renamed(object):
+    """node.id changed from oldid. Does not affect the layout."""
+    def __init__(self, node, oldid):
+        self.node = node
+        self.oldid = oldid
+
+
+def relayout(graph, changes):
+    """Return a new Graph (same class and options as graph) with changes
+    applied to its layout.
+    """
+    if VectorGraph is not None and isinstance(graph, VectorGraph):
+        positions = _VectorPositions(graph)
+    else:
+        positions = _Positions(graph)
+
+    for change in changes:
+        if isinstance(change, Added):
+            _insert(positions, change.node)
+        elif isinstance(change, Removed):
+            _remove(positions, change.node, change.parent)
+        elif isinstance(change, Moved):
+            _remove(positions, change.node, change.oldparent)
+            _insert(positions, change.node)
+        elif isinstance(change, Sorted):
+            _relayout(positions, change.node)
+
+    return positions.graph()
+
+
+def _insert(positions, node):
+    parent = node.parent
+    local = iterative.generate(node)
+    width = node.leaves
+
+    # Only siblings that were already laid out define the slot
+    previous = None
+    haschildren = False
+    for child in parent.children:
+        if child is node:
+            break
+        if child in positions:
+            previous = child
+    for child in parent.children:
+        if child is not node and child in positions:
+            haschildren = True
+            break
+
+    if not haschildren:
+        # Parent was a leaf, which already occupied one unit of width
+        left = positions[parent].real - 0.5
+        delta = width - 1
+    elif previous is None:
+        left = _leftedge(positions, parent)
+        delta = width
+    else:
+        left = _rightedge(positions, previous)
+        delta = width
+
+    _shift(positions, parent, left, delta)
+
+    offset = complex(left, positions[parent].imag + 1)
+    for (child, pos) in local:
+        positions[child] = pos + offset
+
+
+def _remove(positions, node, parent):
+    left = _leftedge(positions, node)
+    width = _rightedge(positions, node) - left
+
+    stack = [node]
+    while stack:
+        child = stack.pop()
+        if child in positions:
+            del positions[child]
+            stack.extend(child.children)
+
+    haschildren = False
+    for child in parent.children:
+        if child in positions:
+            haschildren = True
+            break
+
+    if haschildren:
+        delta = -width
+    else:
+        delta = -(width - 1)
+
+    _shift(positions, parent, left, delta)
+
+
+def _relayout(positions, node):
+    local = iterative.generate(node)
+
+    # The span does not change, but the children may have been reordered so
+    # it cannot be found by following them.
+    offset = positions[node] - local[0][1]
+    for (child, pos) in local:
+        positions[child] = pos + offset
+
+
+def _shift(positions, parent, left, delta):
+    """Widen the span starting at left (a slot below parent) by delta."""
+    if not delta:
+        return
+
+    ancestors = []
+    while parent is not None:
+        ancestors.append(parent)
+        parent = parent.parent
+
+    positions.shift(ancestors, left, delta)
+
+
+def _leftedge(positions, node):
+    """Left edge of node's span, following the leftmost laid out descendants."""
+    while True:
+        for child in node.children:
+            if child in positions:
+                node = child
+                break
+        else:
+            return positions[node].real - 0.5
+
+
+def _rightedge(positions, node):
+    """Right edge of node's span, following the rightmost laid out descendants."""
+    while True:
+        for child in reversed(node.children):
+            if child in positions:
+                node = child
+                break
+        else:
+            return positions[node].real + 0.5
+
+
+class _Positions(dict):
+    """Unit positions of a Graph, keyed by node."""
+    def __init__(self, graph):
+        dict.__init__(self, ((node, complex(pos)) for (node, pos) in graph.raw()))
+        self._graph = graph
+
+    def shift(self, ancestors, left, delta):
+        ancestors = set(ancestors)
+        for (node, pos) in self.items():
+            if node in ancestors:
+                self[node] = pos + delta / 2.0
+            elif pos.real > left:
+                self[node] = pos + delta
+
+    def graph(self):
+        graph = self._graph
+        return graph.__class__(self.items(), normalize=graph.normalized,
+                               radius=graph.radius, padding=graph.padding,
+                               arrow_length=graph.arrow_length,
+                               arrow_width=graph.arrow_width)
+
+
+class _VectorPositions(object):
+    """Unit positions of a VectorGraph, shifted in bulk on its arrays.
+
+    Nodes added by the changes are kept in a list until the new graph is built.
+    """
+    def __init__(self, graph):
+        self._graph = graph
+        self._nodes = graph.nodes
+        self._index = dict(graph._index)
+        self._raw = graph.positions / graph._scalar()
+        self._alive = numpy.ones(len(self._nodes), dtype=bool)
+        self._added = []
+        self._placed = set()
+
+    def _offset(self, node):
+        return self._index[node] - len(self._nodes)
+
+    def __contains__(self, node):
+        return node in self._index
+
+    def __getitem__(self, node):
+        offset = self._offset(node)
+        if offset < 0:
+            return complex(self._raw[offset])
+        return self._added[offset][1]
+
+    def __setitem__(self, node, pos):
+        self._placed.add(node)
+        if node not in self._index:
+            self._index[node] = len(self._nodes) + len(self._added)
+            self._added.append([node, pos])
+        else:
+            offset = self._offset(node)
+            if offset < 0:
+                self._raw[offset] = pos
+            else:
+                self._added[offset][1] = pos
+
+    def __delitem__(self, node):
+        offset = self._offset(node)
+        del self._index[node]
+        if offset < 0:
+            self._alive[offset] = False
+        else:
+            self._added[offset][0] = None
+
+    def shift(self, ancestors, left, delta):
+        right = self._alive & (self._raw.real > left)
+        for node in ancestors:
+            offset = self._offset(node)
+            if offset < 0:
+                right[offset] = False
+        self._raw[right] += delta
+
+        for item in self._added:
+            if item[0] is not None and item[0] not in ancestors and \
+               item[1].real > left:
+                item[1] += delta
+
+        # Ancestors were excluded above, so they only move by half
+        for node in ancestors:
+            self[node] = self[node] + delta / 2.0
+
+    def graph(self):
+        graph = self._graph
+        added = [item for item in self._added if item[0] is not None]
+        addedraw = numpy.array([pos for (node, pos) in added], dtype=complex)
+
+        result = VectorGraph.__new__(VectorGraph)
+        result._setoptions(graph.normalized, graph.radius, graph.padding,
+                           graph.arrow_length, graph.arrow_width)
+
+        if self._alive.all() and len(added) == len(self._added):
+            # Nothing was deleted so indices are unchanged; only the nodes
+            # that were placed again can have a different parent.
+            result.nodes = self._nodes + [node for (node, pos) in added]
+            result._index = self._index
+            result.parents = numpy.concatenate([graph.parents,
+                                                numpy.empty(len(added), dtype=int)])
+            for node in self._placed:
+                result.parents[self._index[node]] = self._index.get(node.parent, -1)
+            result._setpositions(numpy.concatenate([self._raw, addedraw]))
+        else:
+            nodes = list(itertools.compress(self._nodes, self._alive.tolist()))
+            nodes.extend(node for (node, pos) in added)
+            result._setnodes(nodes)
+            result._setpositions(numpy.concatenate([self._raw[self._alive], addedraw]))
+        return result
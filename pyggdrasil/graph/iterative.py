@@ -0,0 +1,25 @@
+"""Iterative equivalent of topdown.
+
+Produces exactly the same RawGraph as topdown (same positions, same order) but
+walks the tree with an explicit stack, so it runs in O(n) and is not limited
+by the recursion limit on deep trees.
+"""
+
+
+def generate(root):
+    # A subtree is as wide as its number of leaves. Each node's subtree
+    # starts at offset, which is pushed right by every preceding sibling's
+    # width. Parents always come before their children in pre-order.
+    offsets = {root: (0j, root.leaves)}
+    rawgraph = []
+    for node in root.preorder():
+        (offset, width) = offsets[node]
+        rawgraph.append((node, offset + width / 2.0))
+
+        childoffset = offset + complex(0, 1)
+        for child in node.children:
+            width = child.leaves
+            offsets[child] = (childoffset, width)
+            childoffset = childoffset + width
+
+    return rawgraph
@@ -0,0 +1,109 @@
+"""Level of detail for drawing a Graph that is zoomed out.
+
+Sizes are in graph units, which are pixels once the graph has been scaled to
+the zoom factor.
+"""
+
+
+# Node diameter below which labels are not drawn
+LABEL_SIZE = 8
+# Arrowhead length below which arrowheads are not drawn
+ARROW_SIZE = 1
+# Subtrees smaller than this, or with less than this many pixels per node,
+# are drawn as a single box
+CLUSTER_SIZE = 4
+
+
+class Detail(object):
+    """What to draw of a graph at its current scale.
+
+    Fields:
+        labels      whether node labels are drawn
+        arrows      whether arrowheads are drawn
+        clustered   whether visible() collapses subtrees
+    """
+    def __init__(self, graph, cluster=True):
+        self.graph = graph
+        self.labels = 2 * graph.radius >= LABEL_SIZE
+        self.arrows = graph.arrow_length >= ARROW_SIZE
+        self.clustered = cluster and graph._scalar() < CLUSTER_SIZE
+
+        if self.clustered:
+            self._summarize()
+
+    def _summarize(self):
+        """Find the bounding box and node count of every subtree."""
+        graph = self.graph
+        radius = graph.radius
+
+        self._children = children = dict((node, []) for node in graph)
+        self._roots = []
+        # The tree as it was laid out, which may have changed since
+        for node in graph:
+            parent = graph.parent(node)
+            if parent is not None:
+                children[parent].append(node)
+            else:
+                self._roots.append(node)
+
+        self._boxes = boxes = {}
+        self._counts = counts = {}
+        stack = [(root, False) for root in self._roots]
+        while stack:
+            (node, visited) = stack.pop()
+            if not visited:
+                stack.append((node, True))
+                stack.extend((child, False) for child in children[node])
+                continue
+
+            pos = graph.pos(node)
+            (x1, y1, x2, y2) = (pos.real - radius, pos.imag - radius,
+                                pos.real + radius, pos.imag + radius)
+            count = 1
+            for child in children[node]:
+                (cx1, cy1, cx2, cy2) = boxes[child]
+                x1 = min(x1, cx1)
+                y1 = min(y1, cy1)
+                x2 = max(x2, cx2)
+                y2 = max(y2, cy2)
+                count += counts[child]
+            boxes[node] = (x1, y1, x2, y2)
+            counts[node] = count
+
+    def collapsed(self, node):
+        """Whether the subtree under node is drawn as one box."""
+        count = self._counts[node]
+        if count == 1:
+            return False
+        (x1, y1, x2, y2) = self._boxes[node]
+        (width, height) = (x2 - x1, y2 - y1)
+        return (width <= CLUSTER_SIZE and height <= CLUSTER_SIZE) or \
+               count * CLUSTER_SIZE > width * height
+
+    def visible(self, box):
+        """Return (nodes, clusters) to draw in box.
+
+        clusters is a list of (node, (x1, y1, x2, y2)) of the collapsed
+        subtrees, by their root. Only what intersects box is walked, so the
+        work is bounded by the area of box rather than the size of the graph.
+        """
+        if not self.clustered:
+            return (list(self.graph), [])
+
+        (x1, y1, x2, y2) = box
+        nodes = []
+        clusters = []
+        stack = list(self._roots)
+        while stack:
+            node = stack.pop()
+            nodebox = self._boxes[node]
+            if not (nodebox[0] <= x2 and x1 <= nodebox[2] and
+                    nodebox[1] <= y2 and y1 <= nodebox[3]):
+                continue
+
+            if self.collapsed(node):
+                clusters.append((node, nodebox))
+            else:
+                nodes.append(node)
+                stack.extend(self._children[node])
+        return (nodes, clusters)
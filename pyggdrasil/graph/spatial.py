@@ -0,0 +1,238 @@
+"""Spatial index over the nodes and connecting lines of a Graph.
+
+Boxes are given as (x1, y1, x2, y2) with x1 <= x2 and y1 <= y2.
+"""
+
+
+import math
+
+try:
+    from .vector import VectorGraph
+except ImportError:
+    VectorGraph = None
+
+
+class RTree(object):
+    """Static R-tree, bulk loaded with Sort-Tile-Recursive packing.
+
+    Every entry is a (box, value) pair. Queries return the values of the
+    entries whose box intersects the query box.
+    """
+    def __init__(self, entries, capacity=16):
+        self.capacity = capacity
+
+        # A tree node is (isleaf, [(box, child)]); leaf children are values
+        level = self._pack(list(entries), True)
+        while len(level) > 1:
+            level = self._pack(level, False)
+
+        if level:
+            self._root = level[0][1]
+        else:
+            self._root = (True, [])
+
+    def _pack(self, entries, isleaf):
+        if not entries:
+            return []
+        capacity = self.capacity
+        pages = int(math.ceil(len(entries) / float(capacity)))
+        slices = int(math.ceil(math.sqrt(pages)))
+        slicesize = slices * capacity
+
+        entries.sort(key=_centerx)
+        packed = []
+        for start in range(0, len(entries), slicesize):
+            tile = entries[start:start + slicesize]
+            tile.sort(key=_centery)
+            for pagestart in range(0, len(tile), capacity):
+                page = tile[pagestart:pagestart + capacity]
+                packed.append((_union(box for (box, child) in page), (isleaf, page)))
+        return packed
+
+    def search(self, box):
+        """Iterate over the values whose box intersects box."""
+        (x1, y1, x2, y2) = box
+        stack = [self._root]
+        while stack:
+            (isleaf, children) = stack.pop()
+            for (childbox, child) in children:
+                if childbox[0] <= x2 and x1 <= childbox[2] and \
+                   childbox[1] <= y2 and y1 <= childbox[3]:
+                    if isleaf:
+                        yield child
+                    else:
+                        stack.append(child)
+
+
+# Share of the nodes that may have moved before the R-trees are rebuilt
+REBUILD = 0.25
+
+
+class SpatialIndex(object):
+    """Index of a Graph's node boxes and line segments.
+
+    Lines are identified by their child node, and returned together with their
+    coordinates so they can be drawn without going back to the graph:
+
+        (node, (x1, y1, x2, y2), [(x, y), (x, y), (x, y)])
+
+    The R-trees are built on the first query. update() makes the index of a
+    new layout of the same tree that keeps using them: only the nodes that
+    moved, or whose parent did, are indexed again, in a small R-tree of their
+    own. Once more than REBUILD of the nodes moved, everything is rebuilt.
+    """
+    def __init__(self, graph):
+        self.graph = graph
+        # (positions, node tree, edge tree) as of the last full build
+        self._base = None
+        # (moved nodes, node tree, edge tree) of the nodes moved since
+        self._moved = None
+
+    def update(self, graph):
+        """Return the index of graph, a new layout of the same tree."""
+        index = SpatialIndex(graph)
+        old = self.graph
+        if (graph.radius, graph.arrow_length, graph.arrow_width) == \
+           (old.radius, old.arrow_length, old.arrow_width):
+            index._base = self._base
+        return index
+
+    def _trees(self):
+        if self._moved is None:
+            graph = self.graph
+            positions = _positions(graph)
+            moved = self._base and _diff(self._base[0], positions)
+            if moved is None:
+                self._base = (positions, RTree(_nodeentries(graph, graph)),
+                              RTree(_edgeentries(graph)))
+                moved = set()
+
+            nodes = [node for node in moved if node in positions]
+            self._moved = (moved, RTree(_nodeentries(graph, nodes)),
+                           RTree(_edgeentries(graph, nodes)))
+        return self._moved
+
+    def _search(self, tree, key, box):
+        # tree is 1 for the nodes, 2 for the edges
+        moved = self._trees()
+        stale = moved[0]
+        for value in self._base[tree].search(box):
+            if key(value) not in stale:
+                yield value
+        for value in moved[tree].search(box):
+            yield value
+
+    def nodeat(self, x, y):
+        """Return a node whose box contains (x, y), or None."""
+        for node in self.nodes((x, y, x, y)):
+            return node
+        return None
+
+    def nodes(self, box):
+        """Iterate over the nodes whose box intersects box."""
+        return self._search(1, _nodekey, box)
+
+    def edges(self, box):
+        """Iterate over the lines (see class doc) whose box intersects box."""
+        return self._search(2, _edgekey, box)
+
+
+def _positions(graph):
+    """Return {node: (position, parent position)}, without a parent position
+    for nodes without a line.
+    """
+    if VectorGraph is not None and isinstance(graph, VectorGraph):
+        positions = graph.positions.tolist()
+        return dict((node, (pos, positions[parent] if parent >= 0 else None))
+                    for (node, pos, parent)
+                    in zip(graph.nodes, positions, graph.parents.tolist()))
+
+    return dict((node, (graph.pos(node),
+                        graph.pos(graph.parent(node)) if graph.hasline(node) else None))
+                for node in graph)
+
+
+def _diff(old, new):
+    """Return the nodes added, removed or moved between the positions old and
+    new, or None if that is more than REBUILD of them.
+    """
+    limit = REBUILD * len(new)
+    moved = set(node for node in old if node not in new)
+    for (node, pos) in new.iteritems():
+        if old.get(node) != pos:
+            moved.add(node)
+            if len(moved) > limit:
+                return None
+    if len(moved) > limit:
+        return None
+    return moved
+
+
+def _nodekey(value):
+    return value
+
+
+def _edgekey(value):
+    return value[0]
+
+
+def _nodeentries(graph, nodes):
+    radius = graph.radius
+    entries = []
+    for node in nodes:
+        pos = graph.pos(node)
+        entries.append(((pos.real - radius, pos.imag - radius,
+                         pos.real + radius, pos.imag + radius), node))
+    return entries
+
+
+def _edgeentries(graph, nodes=None):
+    """Return the entries of the lines to the parents of nodes, or of every
+    line in graph.
+    """
+    if nodes is None:
+        linenodes = [node for node in graph if graph.hasline(node)]
+        lines = _floats(graph.lines())
+        arrows = _floats(graph.arrows())
+    else:
+        linenodes = [node for node in nodes if graph.hasline(node)]
+        lines = [_coords(graph.linestart(node)) + _coords(graph.lineend(node))
+                 for node in linenodes]
+        arrows = [[_coords(pos) for pos in graph.arrow_points(node)]
+                  for node in linenodes]
+
+    entries = []
+    for (node, line, arrow) in zip(linenodes, lines, arrows):
+        (x1, y1, x2, y2) = line = tuple(line)
+        arrow = [tuple(point) for point in arrow]
+        xs = [x1, x2] + [x for (x, y) in arrow]
+        ys = [y1, y2] + [y for (x, y) in arrow]
+        entries.append(((min(xs), min(ys), max(xs), max(ys)), (node, line, arrow)))
+    return entries
+
+
+def _coords(pos):
+    return (float(pos.real), float(pos.imag))
+
+
+def _floats(values):
+    # Arrays from VectorGraph convert to nested lists of floats in one go
+    if hasattr(values, 'tolist'):
+        return values.tolist()
+    return values
+
+
+def _centerx(entry):
+    box = entry[0]
+    return box[0] + box[2]
+
+
+def _centery(entry):
+    box = entry[0]
+    return box[1] + box[3]
+
+
+def _union(boxes):
+    boxes = list(boxes)
+    return (min(box[0] for box in boxes), min(box[1] for box in boxes),
+            max(box[2] for box in boxes), max(box[3] for box in boxes))
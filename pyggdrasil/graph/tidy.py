@@ -0,0 +1,161 @@
+"""Compact layout: Buchheim and Walker's improvement of Walker's tidy trees.
+
+Instead of giving every leaf its own column, as topdown and iterative do,
+each subtree is pushed against its left siblings until their contours are one
+unit apart, and parents are centred over their first and last child. Wide,
+unbalanced trees come out much narrower. The contours are followed through
+threads, so it runs in O(n); both walks use explicit stacks and are not
+limited by the recursion limit.
+
+Positions are in the same units as iterative and in the same order (preorder).
+"""
+
+
+DISTANCE = 1.0
+
+
+class _Tree(object):
+    __slots__ = ('node', 'children', 'parent', 'number', 'prelim', 'mod',
+                 'thread', 'ancestor', 'change', 'shift')
+
+    def __init__(self, node, parent, number):
+        self.node = node
+        self.children = []
+        self.parent = parent
+        self.number = number
+        self.prelim = 0.0
+        self.mod = 0.0
+        self.thread = None
+        self.ancestor = self
+        self.change = 0.0
+        self.shift = 0.0
+
+    def nextleft(self):
+        return self.children[0] if self.children else self.thread
+
+    def nextright(self):
+        return self.children[-1] if self.children else self.thread
+
+    def leftsibling(self):
+        if self.number:
+            return self.parent.children[self.number - 1]
+        return None
+
+
+def generate(root):
+    tree = _Tree(root, None, 0)
+    stack = [tree]
+    while stack:
+        parent = stack.pop()
+        for (number, child) in enumerate(parent.node.children):
+            subtree = _Tree(child, parent, number)
+            parent.children.append(subtree)
+            stack.append(subtree)
+
+    _firstwalk(tree)
+
+    # Second walk: every node is offset by the mods of its ancestors
+    rawgraph = []
+    stack = [(tree, 0.0, 0)]
+    while stack:
+        (v, mod, depth) = stack.pop()
+        rawgraph.append((v.node, complex(v.prelim + mod, depth)))
+        mod += v.mod
+        for w in reversed(v.children):
+            stack.append((w, mod, depth + 1))
+
+    return rawgraph
+
+
+def _firstwalk(tree):
+    # Post-order, siblings left to right: a node is placed only after its
+    # children and its left siblings are
+    defaults = {}
+    stack = [(tree, iter(tree.children))]
+    while stack:
+        for w in stack[-1][1]:
+            stack.append((w, iter(w.children)))
+            break
+        else:
+            v = stack.pop()[0]
+            left = v.leftsibling()
+            if v.children:
+                _executeshifts(v)
+                midpoint = (v.children[0].prelim + v.children[-1].prelim) / 2
+                if left is not None:
+                    v.prelim = left.prelim + DISTANCE
+                    v.mod = v.prelim - midpoint
+                else:
+                    v.prelim = midpoint
+            elif left is not None:
+                v.prelim = left.prelim + DISTANCE
+
+            parent = v.parent
+            if parent is not None:
+                default = defaults.get(parent, parent.children[0])
+                defaults[parent] = _apportion(v, default)
+
+
+def _apportion(v, default):
+    """Push the subtree of v right until it clears its left siblings."""
+    w = v.leftsibling()
+    if w is None:
+        return default
+
+    # i: inner, o: outer contour; r: v's side, l: the left siblings'
+    vir = vor = v
+    vil = w
+    vol = v.parent.children[0]
+    sir = sor = v.mod
+    sil = vil.mod
+    sol = vol.mod
+    while vil.nextright() is not None and vir.nextleft() is not None:
+        vil = vil.nextright()
+        vir = vir.nextleft()
+        vol = vol.nextleft()
+        vor = vor.nextright()
+        vor.ancestor = v
+        shift = (vil.prelim + sil) - (vir.prelim + sir) + DISTANCE
+        if shift > 0:
+            _movesubtree(_ancestor(vil, v, default), v, shift)
+            sir += shift
+            sor += shift
+        sil += vil.mod
+        sir += vir.mod
+        sol += vol.mod
+        sor += vor.mod
+
+    if vil.nextright() is not None and vor.nextright() is None:
+        vor.thread = vil.nextright()
+        vor.mod += sil - sor
+    if vir.nextleft() is not None and vol.nextleft() is None:
+        vol.thread = vir.nextleft()
+        vol.mod += sir - sol
+        default = v
+    return default
+
+
+def _ancestor(vil, v, default):
+    if vil.ancestor.parent is v.parent:
+        return vil.ancestor
+    return default
+
+
+def _movesubtree(wl, wr, shift):
+    # The siblings in between are spaced out evenly by _executeshifts
+    subtrees = float(wr.number - wl.number)
+    wr.change -= shift / subtrees
+    wr.shift += shift
+    wl.change += shift / subtrees
+    wr.prelim += shift
+    wr.mod += shift
+
+
+def _executeshifts(v):
+    shift = 0.0
+    change = 0.0
+    for w in reversed(v.children):
+        w.prelim += shift
+        w.mod += shift
+        change += w.change
+        shift += w.shift + change
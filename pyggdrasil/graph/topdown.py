@@ -7,16 +7,9 @@ class RawGraph(object):
         self.node = node
         self.children = [RawGraph(child) for child in node.children]
 
-        self._width = None
-
     @property
     def width(self):
-        if not self._width:
-            if self.children:
-                self._width = sum(child.width for child in self.children)
-            else:
-                self._width = 1
-        return self._width
+        return self.node.leaves
 
     def __iter__(self):
         x = self.width / 2.0
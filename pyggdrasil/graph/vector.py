@@ -0,0 +1,268 @@
+"""Graph implementation backed by NumPy arrays.
+
+Positions and parent indices are kept in contiguous arrays so the geometry of
+every connecting line and arrow is computed for the whole graph at once.
+Requires numpy; import errors should be handled by the caller.
+"""
+
+
+import copy
+
+import numpy
+
+from .. import trace
+from . import Graph
+from . import Transition as _Transition
+
+
+class VectorGraph(Graph):
+    """Graph with columnar storage.
+
+    Behaves like Graph; the per-node methods are views over the arrays
+    computed by the batched geometry pass. Nodes are identified by their
+    index in iteration order.
+
+    Additional fields:
+        nodes       list of nodes, in iteration order
+        positions   complex array of draw positions
+        parents     int array of the parent index, -1 if there is no line
+    """
+    def __init__(self, rawgraph, normalize=True,
+                 radius=0.5, padding=0.0,
+                 arrow_length=None, arrow_width=None):
+        self._setoptions(normalize, radius, padding, arrow_length, arrow_width)
+
+        nodes = []
+        rawpositions = []
+        for (node, pos) in rawgraph:
+            nodes.append(node)
+            rawpositions.append(pos)
+
+        self._setnodes(nodes)
+        self._setpositions(numpy.array(rawpositions, dtype=complex))
+
+    def _setoptions(self, normalize, radius, padding, arrow_length, arrow_width):
+        self.normalized = normalize
+        self.radius = radius
+        self.padding = padding
+        self.arrow_length = arrow_length or padding
+        self.arrow_width = arrow_width or padding
+
+        self._basearrow_points = numpy.array([
+            0j,
+            -self.arrow_length + 1j*self.arrow_width/2.0,
+            -self.arrow_length - 1j*self.arrow_width/2.0,
+        ])
+
+    def _setnodes(self, nodes):
+        self.nodes = nodes
+        self._index = dict((node, i) for (i, node) in enumerate(nodes))
+
+        index = self._index
+        self.parents = numpy.array([index.get(node.parent, -1) for node in nodes],
+                                   dtype=int)
+
+    def _setpositions(self, rawpositions):
+        with trace.span('graph.normalize', nodes=len(rawpositions)):
+            scalar = self._scalar()
+            cached = numpy.round(rawpositions * scalar, 10)
+
+            xmin = cached.real.min() - 0.5*scalar
+            xmax = cached.real.max() + 0.5*scalar
+            ymin = cached.imag.min() - 0.5*scalar
+            ymax = cached.imag.max() + 0.5*scalar
+
+            self.width = xmax - xmin
+            self.height = ymax - ymin
+
+            if self.normalized:
+                cached = cached - complex(xmin, ymin)
+
+            self.positions = cached
+            self._geometry = None
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def raw(self):
+        return zip(self.nodes, self.positions / self._scalar())
+
+    def pos(self, node):
+        return complex(self.positions[self._index[node]])
+
+    def parent(self, node):
+        parent = self.parents[self._index[node]]
+        return self.nodes[parent] if parent >= 0 else None
+
+    def hasline(self, node):
+        return self.parents[self._index[node]] >= 0
+
+    def geometry(self):
+        """Compute the lines and arrows of the whole graph in one pass.
+
+        Returns (haslines, linedirs, linestarts, lineends, arrowpoints) where
+        every array is indexed by node index. Entries for nodes without a line
+        are NaN.
+        """
+        if self._geometry is None:
+            haslines = self.parents >= 0
+
+            parentpositions = numpy.empty_like(self.positions)
+            parentpositions.fill(complex(numpy.nan, numpy.nan))
+            parentpositions[haslines] = self.positions[self.parents[haslines]]
+
+            vectors = parentpositions - self.positions
+            linedirs = numpy.arctan2(vectors.imag, vectors.real)
+            rotations = numpy.exp(1j * linedirs)
+            offsets = self.radius * rotations
+
+            linestarts = self.positions + offsets
+            lineends = parentpositions - offsets
+            arrowpoints = (rotations[:, numpy.newaxis] * self._basearrow_points +
+                           lineends[:, numpy.newaxis])
+
+            self._geometry = (haslines, linedirs, linestarts, lineends, arrowpoints)
+        return self._geometry
+
+    def _lookup(self, node, field):
+        i = self._index[node]
+        if self.parents[i] < 0:
+            return None
+        return self.geometry()[field][i]
+
+    def linedir(self, node):
+        linedir = self._lookup(node, 1)
+        return None if linedir is None else float(linedir)
+
+    def linestart(self, node):
+        linestart = self._lookup(node, 2)
+        return None if linestart is None else complex(linestart)
+
+    def lineend(self, node):
+        lineend = self._lookup(node, 3)
+        return None if lineend is None else complex(lineend)
+
+    def arrow_points(self, node):
+        return [complex(pos) for pos in self._lookup(node, 4)]
+
+    def lines(self):
+        """Return an (n, 4) array of x1, y1, x2, y2 for every line."""
+        (haslines, linedirs, linestarts, lineends, arrowpoints) = self.geometry()
+        starts = linestarts[haslines]
+        ends = lineends[haslines]
+        return numpy.column_stack([starts.real, starts.imag, ends.real, ends.imag])
+
+    def arrows(self):
+        """Return an (n, 3, 2) array of arrow polygons, same order as lines()."""
+        (haslines, linedirs, linestarts, lineends, arrowpoints) = self.geometry()
+        points = arrowpoints[haslines]
+        return numpy.dstack([points.real, points.imag])
+
+    def scale(self, value):
+        # Same layout, so the node index is shared instead of rebuilt
+        scaled = VectorGraph.__new__(VectorGraph)
+        scaled._setoptions(True, self.radius*value, self.padding*value,
+                           self.arrow_length*value, self.arrow_width*value)
+        scaled.nodes = self.nodes
+        scaled._index = self._index
+        scaled.parents = self.parents
+        scaled._setpositions(self.positions / self._scalar())
+        return scaled
+
+    def relabel(self, func):
+        # Parent indices and positions stay valid, only the nodes change
+        relabeled = copy.copy(self)
+        relabeled.nodes = [func(node) for node in self.nodes]
+        relabeled._index = dict((node, i) for (i, node) in enumerate(relabeled.nodes))
+        return relabeled
+
+
+class Transition(_Transition):
+    """Transition between two VectorGraphs that produces VectorGraph frames.
+
+    Besides the positions, the parent indices and the bounding boxes are
+    matched up once. A frame is then one array interpolation: its bounding box
+    is interpolated too instead of rescanned, which always contains every
+    node. Nodes removed from the tree keep the parent they had in startgraph.
+    """
+    @trace.traced('graph.transition.setup')
+    def __init__(self, startgraph, endgraph):
+        self.startgraph = startgraph
+        self.endgraph = endgraph
+
+        endcount = len(endgraph.nodes)
+        self.nodes = list(endgraph.nodes)
+        self.nodes.extend(node for node in startgraph.nodes if node not in endgraph)
+        self._index = dict(endgraph._index)
+        for (i, node) in enumerate(self.nodes[endcount:]):
+            self._index[node] = endcount + i
+
+        self.parents = numpy.empty(len(self.nodes), dtype=int)
+        self.parents[:endcount] = endgraph.parents
+        for node in self.nodes[endcount:]:
+            parent = startgraph.parents[startgraph._index[node]]
+            if parent >= 0:
+                parent = self._index[startgraph.nodes[parent]]
+            self.parents[self._index[node]] = parent
+
+        # Unit positions in the combined order, NaN where a graph lacks a node
+        starts = self._aligned(startgraph)
+        ends = self._aligned(endgraph)
+        self._starts = self._fillancestors(starts, ends)
+        self._ends = self._fillancestors(ends, starts)
+
+        self._startbox = _box(self._starts)
+        self._endbox = _box(self._ends)
+
+    def _aligned(self, graph):
+        positions = numpy.empty(len(self.nodes), dtype=complex)
+        positions.fill(complex(numpy.nan, numpy.nan))
+        indices = [self._index[node] for node in graph.nodes]
+        positions[indices] = graph.positions / graph._scalar()
+        return positions
+
+    def _fillancestors(self, positions, fallbacks):
+        missing = numpy.flatnonzero(numpy.isnan(positions.real))
+        filled = positions.copy()
+        for i in missing:
+            ancestor = self.parents[i]
+            while ancestor >= 0 and numpy.isnan(positions[ancestor].real):
+                ancestor = self.parents[ancestor]
+            if ancestor >= 0:
+                filled[i] = positions[ancestor]
+            else:
+                # Detached nodes have no ancestors left and stay in place
+                filled[i] = fallbacks[i]
+        return filled
+
+    @trace.traced('graph.transition.frame', nodes=len)
+    def frame(self, endweight):
+        endgraph = self.endgraph
+        frame = VectorGraph.__new__(VectorGraph)
+        frame._setoptions(True, endgraph.radius, endgraph.padding,
+                          endgraph.arrow_length, endgraph.arrow_width)
+        frame.nodes = self.nodes
+        frame._index = self._index
+        frame.parents = self.parents
+
+        scalar = frame._scalar()
+        raw = self._starts + (self._ends - self._starts) * endweight
+        (xmin, ymin, xmax, ymax) = \
+            (self._startbox + (self._endbox - self._startbox) * endweight) * scalar
+
+        frame.width = xmax - xmin + scalar
+        frame.height = ymax - ymin + scalar
+        frame.positions = raw * scalar - complex(xmin - 0.5*scalar, ymin - 0.5*scalar)
+        frame._geometry = None
+        return frame
+
+
+def _box(positions):
+    return numpy.array([positions.real.min(), positions.imag.min(),
+                        positions.real.max(), positions.imag.max()])
@@ -0,0 +1,122 @@
+"""Lay out trees off the calling thread.
+
+The tree is frozen on the calling thread, so it can be edited again right
+away, and the frozen version is laid out by a worker thread. The graph
+handed back is in terms of the original nodes.
+
+    service = layout.LayoutService(callback)
+    service.request(root, radius=40, padding=5)
+    ...
+    callback(graph, generation)     # from the worker thread
+"""
+
+
+import logging
+import operator
+import threading
+
+from . import trace, model, graph
+from .graph import iterative
+
+
+_original = operator.attrgetter('data')
+
+
+@trace.traced('layout.snapshot', nodes=operator.attrgetter('size'))
+def snapshot(root):
+    """Return the tree under root as a model.Frozen tree."""
+    return root.freeze()
+
+
+def _copy(tree):
+    # Graphs need parents, which frozen nodes don't have; the data of every
+    # copy is the original node
+    copyroot = model.Node(tree.id, tree.node)
+    stack = [(tree, copyroot)]
+    while stack:
+        (frozen, copy) = stack.pop()
+        for child in frozen.children:
+            stack.append((child, model.Node(child.id, child.node, copy)))
+    return copyroot
+
+
+def detach(graph):
+    """Return graph over copies of its nodes, so that another thread can read
+    it while the tree is being edited.
+    """
+    copies = dict((node, model.Node(node.id, node)) for node in graph)
+    for (node, copy) in copies.items():
+        if node.parent in copies:
+            copy.parent = copies[node.parent]
+    return graph.relabel(copies.__getitem__)
+
+
+def layout(tree, module=iterative, graphclass=None, **options):
+    """Lay out a snapshot and return the graph of the original nodes."""
+    return graph.generate(_copy(tree), module, graphclass=graphclass,
+                          **options).relabel(_original)
+
+
+class LayoutService(object):
+    """Worker thread that lays out the latest requested tree.
+
+    request() returns at once with the generation of the request;
+    callback(graph, generation) is called from the worker thread when the
+    layout is done. A request replaces any that is still waiting, and the
+    result of one that was superseded while running is dropped, so a burst of
+    edits costs at most one layout more than the last one.
+    """
+    def __init__(self, callback, module=iterative, graphclass=None):
+        self.callback = callback
+        self.module = module
+        self.graphclass = graphclass
+        self.generation = 0
+
+        self._waiting = None
+        self._closed = False
+        self._condition = threading.Condition()
+
+        self._thread = threading.Thread(target=self._run, name='pyggdrasil.layout')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def request(self, root, **options):
+        """Lay out the tree under root with the graph options given."""
+        tree = snapshot(root)
+        with self._condition:
+            self.generation += 1
+            self._waiting = (self.generation, tree, options)
+            self._condition.notify()
+            return self.generation
+
+    def cancel(self):
+        """Drop the waiting request and the result of the running one."""
+        with self._condition:
+            self.generation += 1
+            self._waiting = None
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._waiting = None
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._waiting is None and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                (generation, tree, options) = self._waiting
+                self._waiting = None
+
+            try:
+                result = layout(tree, self.module, self.graphclass, **options)
+            except Exception:
+                logging.getLogger('pyggdrasil.layout').exception(
+                    'layout %d failed', generation)
+                continue
+
+            if generation == self.generation:
+                self.callback(result, generation)
@@ -1,3 +1,4 @@
+import collections
 import operator
 
 from . import validate
@@ -10,66 +11,352 @@ def chain(func1, func2):
     return lambda x: func1(func2(x))
 
 
-class Node(object):
+class Traversals(object):
+    """Iteration over a subtree, for any node class with children.
+
+    Shared by Node, Frozen and store.StoreNode; only children is used.
+    """
+    __slots__ = ()
+
+    def unroll(self):
+        """Unroll tree node and return an iterator of all the represented nodes.
+        Order is defined as current node, then children, then children's
+        children, etc., with children having same order as the data structure.
+
+        In other words: the node, then the children of every node in
+        pre-order.
+        """
+        yield self
+
+        # Stack of children lists; leaves never get pushed
+        stack = [self.children]
+        push = stack.append
+        while stack:
+            children = stack.pop()
+            for child in children:
+                yield child
+            for child in reversed(children):
+                if child.children:
+                    push(child.children)
+
+    def breadthfirst(self):
+        """Iterate over the subtree level by level."""
+        queue = collections.deque([self])
+        while queue:
+            node = queue.popleft()
+            yield node
+            queue.extend(node.children)
+
+    def preorder(self):
+        """Iterate over the subtree, every node before its descendants."""
+        yield self
+
+        # Stack of iterators over children lists that are partly done
+        stack = [iter(self.children)]
+        while stack:
+            for node in stack[-1]:
+                yield node
+                if node.children:
+                    stack.append(iter(node.children))
+                    break
+            else:
+                stack.pop()
+
+    def postorder(self):
+        """Iterate over the subtree, every node after its descendants."""
+        stack = [(self, iter(self.children))]
+        while stack:
+            for node in stack[-1][1]:
+                if node.children:
+                    stack.append((node, iter(node.children)))
+                    break
+                yield node
+            else:
+                yield stack.pop()[0]
+
+
+class Node(Traversals):
     """A single node of a tree. The tree is bidirectional: having a reference to
     both the parent and the children.
 
     When setting parent, the class will automatically set the corresponding
     children. (This does not happen when operating on children).
+
+    Every node also keeps its depth and jump pointers to its 1st, 2nd, 4th, ...
+    ancestor, so ancestor checks take O(log depth) instead of walking up the
+    whole parent chain.
+
+    size, leaves and height of the subtree are cached. Setting parent marks
+    the caches of the old and new ancestors stale, and sort does not affect
+    them. Anything that adds or removes children directly must call
+    invalidate.
+
+    The last frozen version of the subtree is cached as well, and dropped
+    along with the stats, or by changing id, data or the order of children.
     """
+    __slots__ = ('_parent', '_depth', '_jumps', '_stats', '_frozen',
+                 '_id', '_data', 'children')
+
     def __init__(self, id, data, parent=None):
         # Needed to prevent self.parent=  from exploding
         self._parent = None
+        self._depth = 0
+        self._jumps = []
+        self._stats = None
+        self._frozen = None
 
-        self.id = id
-        self.data = data
+        self._id = id
+        self._data = data
         self.children = []
-        self.parent = parent
+
+        # A new node has no descendants so it can never create a cycle. This
+        # makes building a tree top-down skip the cycle checks entirely.
+        self._attach(parent)
 
     def getparent(self):
         return self._parent
 
     def setparent(self, value):
-        if value and value.hasancestor(self):
+        if value is self or (value and value.hasancestor(self)):
             raise CircularTreeException
         if self.parent:
             self.parent.children.remove(self)
-        if value:
-            value.children.append(self)
-        self._parent = value
+            self.parent.invalidate()
+        self._attach(value)
     parent = property(getparent, setparent)
 
-    def unroll(self):
-        """Unroll tree node and return an iterator of all the represented nodes.
-        Order is defined as current node, then children, then children's
-        children, etc., with children having same order as the data structure.
+    def getid(self):
+        return self._id
+    def setid(self, value):
+        self._id = value
+        self._unfreeze()
+    id = property(getid, setid)
+
+    def getdata(self):
+        return self._data
+    def setdata(self, value):
+        self._data = value
+        self._unfreeze()
+    data = property(getdata, setdata)
+
+    @property
+    def depth(self):
+        return self._depth
+
+    @property
+    def size(self):
+        """Number of nodes in the subtree."""
+        return (self._stats or self._getstats())[0]
+
+    @property
+    def leaves(self):
+        """Number of leaves in the subtree; a leaf counts itself."""
+        return (self._stats or self._getstats())[1]
+
+    @property
+    def height(self):
+        """Number of levels below the node."""
+        return (self._stats or self._getstats())[2]
+
+    def invalidate(self):
+        """Mark the cached subtree statistics of this node and its ancestors
+        stale.
         """
-        yield self
+        # Ancestors of a stale node are always stale too
+        node = self
+        while node is not None and (node._stats is not None or
+                                    node._frozen is not None):
+            node._stats = None
+            node._frozen = None
+            node = node._parent
+
+    def _unfreeze(self):
+        node = self
+        while node is not None and node._frozen is not None:
+            node._frozen = None
+            node = node._parent
+
+    def freeze(self):
+        """Return the subtree as it is now, as a Frozen tree.
+
+        Subtrees that did not change since the last freeze are reused. Every
+        changed node gets a new version, which takes a new tuple of all its
+        children, so after an edit a freeze costs as much as the children of
+        the nodes on the path to the root.
+        """
+        if self._frozen is None:
+            # Same order as _getstats: only stale subtrees, children last
+            order = []
+            stack = [self]
+            while stack:
+                node = stack.pop()
+                order.append(node)
+                stack.extend(child for child in node.children if child._frozen is None)
+
+            for node in reversed(order):
+                node._frozen = Frozen(node._id, node._data,
+                                      [child._frozen for child in node.children], node)
+        return self._frozen
+
+    def _getstats(self):
+        if self._stats is None:
+            # Only stale subtrees are visited; children come last in order
+            order = []
+            stack = [self]
+            while stack:
+                node = stack.pop()
+                order.append(node)
+                stack.extend(child for child in node.children if child._stats is None)
 
-        childreniters = [child.unroll() for child in self.children]
+            for node in reversed(order):
+                size = 1
+                leaves = 0
+                height = 0
+                for child in node.children:
+                    (childsize, childleaves, childheight) = child._stats
+                    size += childsize
+                    leaves += childleaves
+                    height = max(height, childheight + 1)
+                node._stats = (size, leaves or 1, height)
+        return self._stats
 
-        # Grab children manually
-        for iter in childreniters:
-            yield iter.next()
+    def _attach(self, parent):
+        if parent:
+            parent.children.append(self)
+            parent.invalidate()
+        self._parent = parent
 
-        # Iterators should only contain non-children descendents now
-        for iter in childreniters:
-            for item in iter:
-                yield item
+        # Ancestry of the whole subtree changes; parents are updated first.
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            node._setancestry()
+            stack.extend(node._loadedchildren())
+
+    def _loadedchildren(self):
+        return self.children
+
+    def _setancestry(self):
+        parent = self._parent
+        if not parent:
+            self._depth = 0
+            self._jumps = []
+            return
+
+        self._depth = parent._depth + 1
+
+        # The 2**(k+1)th ancestor is the 2**k-th ancestor of the 2**k-th ancestor
+        jumps = [parent]
+        while len(jumps[-1]._jumps) >= len(jumps):
+            jumps.append(jumps[-1]._jumps[len(jumps) - 1])
+        self._jumps = jumps
 
     def sort(self, key=None):
+        before = self.children[:]
         if key:
             self.children.sort(key=chain(key, operator.attrgetter('id')))
         else:
             self.children.sort(key=operator.attrgetter('id'))
+        if self.children != before:
+            self._unfreeze()
 
     def hasancestor(self, node):
-        if not self.parent:
+        distance = self._depth - node._depth
+        if distance <= 0:
             return False
-        if node == self.parent:
-            return True
 
-        return self.parent.hasancestor(node)
+        ancestor = self
+        level = 0
+        while distance:
+            if distance & 1:
+                ancestor = ancestor._jumps[level]
+            distance >>= 1
+            level += 1
+        return ancestor is node
+
+
+class LazyNode(Node):
+    """Node whose children are created on first access.
+
+    loader(node) is called once, when node.children is first read, and must
+    create node's children with node as their parent. Assigning children
+    replaces the loader and, like any other change to children, marks the
+    cached stats stale.
+    """
+    __slots__ = ('_children', '_loader')
+
+    def __init__(self, id, data, parent=None, loader=None):
+        Node.__init__(self, id, data, parent)
+        if loader:
+            self._children = None
+            self._loader = loader
+
+    def getchildren(self):
+        if self._children is None:
+            loader = self._loader
+            self._loader = None
+            self._children = []
+            loader(self)
+        return self._children
+    def setchildren(self, value):
+        self._children = value
+        self._loader = None
+        self.invalidate()
+    children = property(getchildren, setchildren)
+
+    @property
+    def loaded(self):
+        return self._children is not None
+
+    def _loadedchildren(self):
+        # Children created later get their ancestry from the parent then
+        return self._children or []
+
+
+class Frozen(Traversals):
+    """Immutable version of a subtree, made by Node.freeze.
+
+    Versions of a tree share the subtrees that are the same in both, so a
+    Frozen node has no parent. node is the Node it was frozen from. children
+    is a tuple; size, leaves and height are worked out once, when frozen.
+    Setting or deleting any of the fields raises AttributeError.
+    """
+    __slots__ = ('id', 'data', 'children', 'node', 'size', 'leaves', 'height')
+
+    def __init__(self, id, data, children=(), node=None):
+        children = tuple(children)
+        size = 1
+        leaves = 0
+        height = 0
+        for child in children:
+            size += child.size
+            leaves += child.leaves
+            height = max(height, child.height + 1)
+
+        setfield = object.__setattr__
+        setfield(self, 'id', id)
+        setfield(self, 'data', data)
+        setfield(self, 'children', children)
+        setfield(self, 'node', node)
+        setfield(self, 'size', size)
+        setfield(self, 'leaves', leaves or 1)
+        setfield(self, 'height', height)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Frozen nodes cannot be changed')
+
+    def __delattr__(self, name):
+        raise AttributeError('Frozen nodes cannot be changed')
+
+    def thaw(self):
+        """Return a new Node tree with the ids and data of this version."""
+        root = Node(self.id, self.data)
+        stack = [(self, root)]
+        while stack:
+            (frozen, node) = stack.pop()
+            for child in frozen.children:
+                stack.append((child, Node(child.id, child.data, node)))
+        return root
 
 
 class EqualsDict(object):
@@ -114,6 +401,60 @@ class EqualsDict(object):
         raise KeyError(value)
 
 
+class ItemDict(object):
+    """Bidirectional mapping with the same interface as EqualsDict.
+
+    Keys do not need to be hashable: they are stored under keyfunc(key), which
+    must be hashable and equal for equal keys (e.g. a wx tree item's GetID).
+    Values are looked up by identity, so getkey is O(1) as well.
+    """
+    def __init__(self, keyfunc=None):
+        self._keyfunc = keyfunc or (lambda key: key)
+        self._items = {}
+        # id(value) -> [hashed keys], in insertion order
+        self._keys = {}
+
+    def __getitem__(self, key):
+        return self._items[self._keyfunc(key)][1]
+
+    def __setitem__(self, key, value):
+        hashed = self._keyfunc(key)
+        if hashed in self._items:
+            self._unlink(hashed)
+        self._items[hashed] = (key, value)
+        self._keys.setdefault(id(value), []).append(hashed)
+
+    def __delitem__(self, key):
+        self.pop(key)
+
+    def __contains__(self, key):
+        return self._keyfunc(key) in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def pop(self, key):
+        hashed = self._keyfunc(key)
+        value = self._items[hashed][1]
+        self._unlink(hashed)
+        del self._items[hashed]
+        return value
+
+    def getkey(self, value):
+        try:
+            hashed = self._keys[id(value)][0]
+        except KeyError:
+            raise KeyError(value)
+        return self._items[hashed][0]
+
+    def _unlink(self, hashed):
+        value = self._items[hashed][1]
+        keys = self._keys[id(value)]
+        keys.remove(hashed)
+        if not keys:
+            del self._keys[id(value)]
+
+
 def Options(values={}):
     options = validate.ValidationDict([
         ('tree', [
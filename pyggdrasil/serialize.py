@@ -1,43 +1,209 @@
+import cPickle
+import functools
+import json
 import re
+import shutil
+import struct
+import tempfile
 import yaml
+from yaml.events import (DocumentEndEvent, DocumentStartEvent,
+                         MappingEndEvent, MappingStartEvent, ScalarEvent,
+                         SequenceEndEvent, SequenceStartEvent,
+                         StreamEndEvent, StreamStartEvent)
+from yaml.nodes import ScalarNode
 import pyggdrasil
+from . import trace
 
 
 class NodeParseException(Exception): pass
 
 
+# libyaml is many times faster; fall back to the pure Python classes without it
+try:
+    _BaseLoader = yaml.CSafeLoader
+    _BaseDumper = yaml.CSafeDumper
+except AttributeError:
+    _BaseLoader = yaml.SafeLoader
+    _BaseDumper = yaml.SafeDumper
+
+
+class _Loader(_BaseLoader):
+    pass
+
+# Files written with the default Dumper tag the Python types YAML has no
+# type of its own for. Only plain values are read back, never objects.
+_PYTHONTAGS = {
+    'none': lambda loader, node: loader.construct_yaml_null(node),
+    'bool': lambda loader, node: loader.construct_yaml_bool(node),
+    'str': lambda loader, node: loader.construct_scalar(node).encode('utf-8'),
+    'unicode': lambda loader, node: loader.construct_scalar(node),
+    'int': lambda loader, node: loader.construct_yaml_int(node),
+    'long': lambda loader, node: long(loader.construct_yaml_int(node)),
+    'float': lambda loader, node: loader.construct_yaml_float(node),
+    'complex': lambda loader, node: complex(loader.construct_scalar(node)),
+    'list': lambda loader, node: loader.construct_sequence(node, deep=True),
+    'tuple': lambda loader, node: tuple(loader.construct_sequence(node, deep=True)),
+    'dict': lambda loader, node: loader.construct_mapping(node, deep=True),
+}
+for (_tag, _constructor) in _PYTHONTAGS.items():
+    _Loader.add_constructor(u'tag:yaml.org,2002:python/' + _tag, _constructor)
+
+
+
+class _Dumper(_BaseDumper):
+    pass
+
+# The safe dumper has no tags for these; use the ones the default Dumper
+# wrote, which _Loader reads back
+_Dumper.add_representer(tuple, lambda dumper, data: dumper.represent_sequence(
+    u'tag:yaml.org,2002:python/tuple', data))
+_Dumper.add_representer(complex, lambda dumper, data: dumper.represent_scalar(
+    u'tag:yaml.org,2002:python/complex', unicode(repr(data)).strip(u'()')))
+_Dumper.add_representer(long, lambda dumper, data: dumper.represent_scalar(
+    u'tag:yaml.org,2002:python/long', unicode(data)))
+
+
+_SUFFIX = re.compile(r'^(.*) \{\{\{\d*\}\}\}$')
+
+
+@trace.traced('serialize.load', nodes=lambda result: result[0].size)
 def load(stream):
-    raw = yaml.load(stream)
+    raw = yaml.load(stream, Loader=_Loader)
     return fromraw(raw)
 
 
-def dump(stream, *args, **kwargs):
-    raw = toraw(*args, **kwargs)
-    yaml.dump(raw, stream=stream)
+def dump(stream, root, options):
+    """Write the tree as YAML, event by event.
 
+    The tree is walked once, in pre-order and without recursion. The
+    structure is emitted as it is walked, while the data is spooled to a
+    temporary file and emitted after it. Memory use grows with the depth of
+    the tree and the number of distinct ids, not with the number of nodes.
+    """
+    spool = tempfile.TemporaryFile()
+    try:
+        yaml.emit(_events(root, options, spool), stream, Dumper=_Dumper)
+    finally:
+        spool.close()
 
-def toraw(root, options):
-    ids = {}
-    usedids = set()
-    for node in root.unroll():
-        id = node.id
-        num = 0
 
-        while id in usedids:
-            id = '%s {{{%d}}}' % (node.id, num)
-            num += 1
+def _events(root, options, spool):
+    yield StreamStartEvent()
+    yield DocumentStartEvent()
+    yield MappingStartEvent(None, None, True, flow_style=False)
+
+    for event in _valueevents('options'):
+        yield event
+    for event in _valueevents(options.dict):
+        yield event
+
+    for event in _valueevents('structure'):
+        yield event
+    ids = _Ids()
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            yield SequenceEndEvent()
+            yield MappingEndEvent()
+            continue
+
+        id = ids.unique(node.id)
+        cPickle.dump((id, node.data), spool, cPickle.HIGHEST_PROTOCOL)
+
+        yield MappingStartEvent(None, None, True, flow_style=False)
+        for event in _valueevents(id):
+            yield event
+        yield SequenceStartEvent(None, None, True, flow_style=False)
+        stack.append(None)
+        stack.extend(reversed(node.children))
+
+    for event in _valueevents('data'):
+        yield event
+    yield MappingStartEvent(None, None, True, flow_style=False)
+    spool.seek(0)
+    while True:
+        try:
+            (id, data) = cPickle.load(spool)
+        except EOFError:
+            break
+        for event in _valueevents(id):
+            yield event
+        for event in _valueevents(data):
+            yield event
+    yield MappingEndEvent()
 
-        ids[node] = id
-        usedids.add(id)
+    yield MappingEndEvent()
+    yield DocumentEndEvent()
+    yield StreamEndEvent()
+
+
+class _ValueDumper(_Dumper):
+    # Values are emitted one at a time into one document, where anchors of
+    # different values could clash
+    def ignore_aliases(self, data):
+        return True
+
+
+_STR = u'tag:yaml.org,2002:str'
+_NULL = u'tag:yaml.org,2002:null'
+_resolver = yaml.resolver.Resolver()
+
+
+def _valueevents(value):
+    """Return the events of value on its own."""
+    # Ids and most data are strings or None, which are quick to do by hand
+    if value is None:
+        return [ScalarEvent(None, _NULL, (True, False), u'null')]
+    if isinstance(value, str):
+        try:
+            value = value.decode('utf-8')
+        except UnicodeDecodeError:
+            pass
+    if isinstance(value, unicode):
+        # Quoted if it would be read back as something else, e.g. a number
+        plain = _resolver.resolve(ScalarNode, value, (True, False)) == _STR
+        return [ScalarEvent(None, _STR, (plain, True), value)]
+
+    text = yaml.dump(value, Dumper=_ValueDumper, default_flow_style=False)
+    # Without the stream and document events around it
+    return list(yaml.parse(text, Loader=_Loader))[2:-2]
+
+
+def toraw(root, options):
+    ids = _Ids()
+    data = {}
+    children = {}
+    for node in root.unroll():
+        id = ids.unique(node.id)
+        data[id] = node.data
+        children[node] = []
+        if node is root:
+            structure = {id: children[node]}
+        else:
+            children[node.parent].append({id: children[node]})
 
     return {
-        'data': dict((ids[node], node.data) for node in root.unroll()),
-        'structure': _tostructure(root, ids),
+        'data': data,
+        'structure': structure,
         'options': options.dict,
     }
 
-def _tostructure(node, ids):
-    return {ids[node]: [_tostructure(child, ids) for child in node.children]}
+
+class _Ids(object):
+    """Makes ids unique by appending {{{n}}} to repeated ones."""
+    def __init__(self):
+        self._used = set()
+
+    def unique(self, id):
+        original = id
+        num = 0
+        while id in self._used:
+            id = '%s {{{%d}}}' % (original, num)
+            num += 1
+
+        self._used.add(id)
+        return id
 
 
 def fromraw(raw):
@@ -45,18 +211,260 @@ def fromraw(raw):
     return root, pyggdrasil.model.Options(raw['options'])
 
 
-def _fromstructure(structure, data, parent=None):
-    if len(structure) != 1:
+@trace.traced('serialize.fromstructure', nodes=lambda root: root.size)
+def _fromstructure(structure, data):
+    root = None
+    stack = [(structure, None)]
+    while stack:
+        (structure, parent) = stack.pop()
+        if len(structure) != 1:
+            raise NodeParseException()
+
+        for (rawid, children) in structure.items():
+            id = rawid
+            if rawid.endswith('}}}'):
+                match = _SUFFIX.match(rawid)
+                if match:
+                    id = match.group(1)
+
+            node = pyggdrasil.model.Node(id, data[rawid], parent)
+            if root is None:
+                root = node
+            stack.extend((child, node) for child in reversed(children))
+    return root
+
+
+# Binary format, all integers little-endian:
+#
+#   header   magic, version, node count, string count, options length
+#   options  options as JSON
+#   nodes    (parent, id, data, size) for every node in pre-order
+#   strings  end offset of every string, then the strings themselves
+#
+# parent is the index of the parent node (-1 for the root), so it always
+# precedes its children. id and data index the string table: ids are UTF-8,
+# data is JSON. size is the number of nodes in the subtree, so a reader can
+# skip a subtree without looking at it.
+
+BINARY_EXTENSION = 'pygb'
+
+_MAGIC = 'PYGB'
+_VERSION = 1
+_HEADER = struct.Struct('<4sHIII')
+_NODE = struct.Struct('<iIII')
+_OFFSET = struct.Struct('<I')
+
+_MISSING = object()
+
+
+@trace.traced('serialize.loadbinary', nodes=lambda result: result[0].size)
+def loadbinary(stream, store=None):
+    """Load a binary file, into store (a store.TreeStore) if it is given."""
+    buffer = stream.read()
+    (nodecount, stringcount, options, nodesoffset, stringsoffset) = \
+        _readheader(buffer)
+
+    ends = struct.unpack_from('<%dI' % stringcount, buffer, stringsoffset)
+    offset = stringsoffset + stringcount * _OFFSET.size
+    strings = []
+    start = offset
+    for end in ends:
+        strings.append(buffer[start:offset + end])
+        start = offset + end
+
+    ids = {}
+    datas = {}
+    nodes = []
+    for index in xrange(nodecount):
+        (parent, id, data, size) = _NODE.unpack_from(buffer, nodesoffset + index * _NODE.size)
+        if id not in ids:
+            ids[id] = strings[id].decode('utf-8')
+        value = datas.get(data, _MISSING)
+        if value is _MISSING:
+            value = json.loads(strings[data])
+            # Lists and dicts are mutable, so every node gets its own
+            if not isinstance(value, (list, dict)):
+                datas[data] = value
+
+        if parent < 0:
+            parent = None
+        else:
+            parent = nodes[parent]
+        if store is None:
+            node = pyggdrasil.model.Node(ids[id], value, parent)
+        else:
+            node = store.add(ids[id], value, parent)
+        nodes.append(node)
+
+    return nodes[0], options
+
+
+def loadlazy(stream, depth=1):
+    """Load a binary file as LazyNodes, reading children only when needed.
+
+    The first depth levels below the root are read right away. stream must
+    be seekable and stay open (and unchanged) while nodes may still load.
+    Every node costs a few seeks and reads, so this only pays off when most
+    of the tree is never visited; loadbinary is faster for the whole tree.
+    """
+    header = stream.read(_HEADER.size)
+    if len(header) != _HEADER.size:
+        raise NodeParseException()
+    optionslength = _HEADER.unpack(header)[4]
+    (nodecount, stringcount, options, nodesoffset, stringsoffset) = \
+        _readheader(header + stream.read(optionslength))
+
+    source = _LazySource(stream, nodesoffset, stringsoffset, stringcount)
+    root = source.node(0, None)
+
+    level = [root]
+    for num in range(depth):
+        level = [child for node in level for child in node.children]
+    return root, options
+
+
+def _readheader(buffer):
+    (magic, version, nodecount, stringcount, optionslength) = \
+        _HEADER.unpack_from(buffer, 0)
+    if magic != _MAGIC or version != _VERSION or not nodecount:
         raise NodeParseException()
 
-    for (rawid, children) in structure.items():
-        match = re.match(r'^(.*) \{\{\{\d*\}\}\}$', rawid)
-        if match:
-            id = match.group(1)
+    offset = _HEADER.size
+    options = pyggdrasil.model.Options(json.loads(buffer[offset:offset + optionslength]))
+
+    nodesoffset = offset + optionslength
+    stringsoffset = nodesoffset + nodecount * _NODE.size
+    return (nodecount, stringcount, options, nodesoffset, stringsoffset)
+
+
+class _LazySource(object):
+    """Reads the records of a binary file on demand, for LazyNode loaders."""
+    def __init__(self, stream, nodesoffset, stringsoffset, stringcount):
+        self._stream = stream
+        self._nodesoffset = nodesoffset
+        self._stringsoffset = stringsoffset
+        self._bloboffset = stringsoffset + stringcount * _OFFSET.size
+
+    def node(self, index, parent):
+        return self._create(index, self._record(index), parent)
+
+    def _create(self, index, record, parent):
+        (parentindex, id, data, size) = record
+        if size > 1:
+            loader = functools.partial(self._loadchildren, index, size)
         else:
-            id = rawid
+            loader = None
+        return pyggdrasil.model.LazyNode(self._string(id).decode('utf-8'),
+                                         json.loads(self._string(data)),
+                                         parent, loader)
+
+    def _loadchildren(self, index, size, node):
+        # Children follow their parent in pre-order; skip over their subtrees
+        child = index + 1
+        while child < index + size:
+            record = self._record(child)
+            self._create(child, record, node)
+            child += record[3]
+
+    def _record(self, index):
+        return _NODE.unpack(self._read(self._nodesoffset + index * _NODE.size, _NODE.size))
+
+    def _string(self, index):
+        if index:
+            (start, end) = struct.unpack('<II', self._read(
+                self._stringsoffset + (index - 1) * _OFFSET.size, 2 * _OFFSET.size))
+        else:
+            start = 0
+            (end,) = _OFFSET.unpack(self._read(self._stringsoffset, _OFFSET.size))
+        return self._read(self._bloboffset + start, end - start)
+
+    def _read(self, offset, size):
+        self._stream.seek(offset)
+        data = self._stream.read(size)
+        if len(data) != size:
+            raise NodeParseException()
+        return data
+
+
+def dumpbinary(stream, root, options):
+    """Write the tree in the binary format.
+
+    The tree is walked once, in pre-order and without recursion. Records,
+    string offsets and strings are spooled to temporary files as they are
+    made and copied to stream at the end, so memory use grows with the depth
+    of the tree and the number of distinct strings, not with the number of
+    nodes. size comes from node.size, which is cached on the nodes.
+
+    Data is stored as JSON; ValueError is raised, before anything is
+    written, for data that JSON would not give back unchanged.
+    """
+    records = tempfile.TemporaryFile()
+    offsets = tempfile.TemporaryFile()
+    strings = tempfile.TemporaryFile()
+    try:
+        stringindex = {}
+        ends = [0]
+        def intern(string):
+            index = stringindex.get(string)
+            if index is None:
+                index = stringindex[string] = len(stringindex)
+                strings.write(string)
+                ends[0] += len(string)
+                offsets.write(_OFFSET.pack(ends[0]))
+            return index
+
+        count = 0
+        stack = [(root, -1)]
+        while stack:
+            (node, parent) = stack.pop()
+            id = node.id
+            if isinstance(id, unicode):
+                id = id.encode('utf-8')
+            records.write(_NODE.pack(parent, intern(id), intern(_tojson(node.data)),
+                                     node.size))
+
+            stack.extend((child, count) for child in reversed(node.children))
+            count += 1
+
+        optionsjson = json.dumps(options.dict, sort_keys=True)
+        stream.write(_HEADER.pack(_MAGIC, _VERSION, count, len(stringindex),
+                                  len(optionsjson)))
+        stream.write(optionsjson)
+        for spool in (records, offsets, strings):
+            spool.seek(0)
+            shutil.copyfileobj(spool, stream)
+    finally:
+        records.close()
+        offsets.close()
+        strings.close()
+
+
+def _tojson(data):
+    """Return data as JSON; raise ValueError if it would not read back the
+    same, e.g. tuples (which come back as lists) or complex numbers.
+    """
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, str):
+            try:
+                value.decode('utf-8')
+            except UnicodeDecodeError:
+                raise ValueError('%r is not UTF-8 and cannot be stored in a '
+                                 'binary file' % value)
+        elif isinstance(value, list):
+            stack.extend(value)
+        elif isinstance(value, dict):
+            for key in value:
+                if not isinstance(key, basestring):
+                    raise ValueError('%r is not a string and cannot be a key '
+                                     'in a binary file' % (key,))
+            stack.extend(value)
+            stack.extend(value.itervalues())
+        elif not (value is None or isinstance(value, (unicode, bool, int, long, float))):
+            raise ValueError('%r cannot be stored in a binary file' % (value,))
+    return json.dumps(data)
+
 
-        node = pyggdrasil.model.Node(id, data[rawid], parent)
-        for child in children:
-            childnode = _fromstructure(child, data, node)
-        return node
+def isbinary(filename):
+    return filename.lower().endswith('.' + BINARY_EXTENSION)
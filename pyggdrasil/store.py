@@ -0,0 +1,325 @@
+"""Compact tree storage.
+
+A TreeStore keeps a whole forest in a few flat arrays instead of one object
+(with its own list of children) per node:
+
+    parents, firstchild, lastchild, nextsibling   node indices, -1 for none
+    depths                                        distance from the root
+    jumps                                         one array per power of two:
+                                                  the 1st, 2nd, 4th, ... ancestor
+    sizes, leafcounts, heights                    cached subtree statistics
+    ids                                           index into an interned table
+    data                                          one list entry per node
+
+As with model.Node, the jumps make ancestor checks O(log depth), and moving
+a subtree costs O(size * log depth). Interned ids are counted and dropped
+once no node uses them.
+
+Nodes are handed out as StoreNode proxies with the same interface as
+model.Node, so layouts, serializers and exporters work on either. A proxy
+is created on first use and cached, so the same node is always the same
+object and can be used as a dict key or compared with `is`.
+"""
+
+
+import array
+import operator
+
+from . import model
+
+
+class TreeStore(object):
+    def __init__(self):
+        self._parents = array.array('i')
+        self._firstchild = array.array('i')
+        self._lastchild = array.array('i')
+        self._nextsibling = array.array('i')
+        self._depths = array.array('i')
+        self._jumps = []
+        # A size of 0 marks stale statistics
+        self._sizes = array.array('i')
+        self._leafcounts = array.array('i')
+        self._heights = array.array('i')
+        self._ids = array.array('i')
+        self._data = []
+
+        self._strings = []
+        self._stringindex = {}
+        self._stringrefs = array.array('i')
+        self._freestrings = []
+        self._proxies = []
+
+    def __len__(self):
+        return len(self._parents)
+
+    def add(self, id, data, parent=None):
+        """Append a new node as the last child of parent, and return it."""
+        index = len(self._parents)
+        self._parents.append(-1)
+        self._firstchild.append(-1)
+        self._lastchild.append(-1)
+        self._nextsibling.append(-1)
+        self._depths.append(0)
+        for jumps in self._jumps:
+            jumps.append(-1)
+        self._sizes.append(0)
+        self._leafcounts.append(0)
+        self._heights.append(0)
+        self._ids.append(self._intern(id))
+        self._data.append(data)
+        self._proxies.append(None)
+
+        if parent is not None:
+            self._link(index, parent._index)
+        return self.node(index)
+
+    def node(self, index):
+        proxy = self._proxies[index]
+        if proxy is None:
+            proxy = self._proxies[index] = StoreNode(self, index)
+        return proxy
+
+    def _intern(self, string):
+        index = self._stringindex.get(string)
+        if index is None:
+            if self._freestrings:
+                index = self._freestrings.pop()
+                self._strings[index] = string
+            else:
+                index = len(self._strings)
+                self._strings.append(string)
+                self._stringrefs.append(0)
+            self._stringindex[string] = index
+        self._stringrefs[index] += 1
+        return index
+
+    def _release(self, index):
+        self._stringrefs[index] -= 1
+        if not self._stringrefs[index]:
+            del self._stringindex[self._strings[index]]
+            self._strings[index] = None
+            self._freestrings.append(index)
+
+    def _children(self, index):
+        child = self._firstchild[index]
+        while child >= 0:
+            yield child
+            child = self._nextsibling[child]
+
+    def _link(self, index, parent):
+        """Attach the detached node index as the last child of parent."""
+        self._parents[index] = parent
+        last = self._lastchild[parent]
+        if last < 0:
+            self._firstchild[parent] = index
+        else:
+            self._nextsibling[last] = index
+        self._lastchild[parent] = index
+
+        self._setancestry(index)
+        self._invalidate(parent)
+
+    def _unlink(self, index):
+        parent = self._parents[index]
+        if parent < 0:
+            return
+
+        previous = -1
+        for child in self._children(parent):
+            if child == index:
+                break
+            previous = child
+
+        next = self._nextsibling[index]
+        if previous < 0:
+            self._firstchild[parent] = next
+        else:
+            self._nextsibling[previous] = next
+        if self._lastchild[parent] == index:
+            self._lastchild[parent] = previous
+
+        self._parents[index] = -1
+        self._nextsibling[index] = -1
+        self._setancestry(index)
+        self._invalidate(parent)
+
+    def _setancestry(self, index):
+        """Set the depths and jumps of the subtree under index from its parent."""
+        parents = self._parents
+        depths = self._depths
+        jumps = self._jumps
+        # Parents are done before their children
+        stack = [index]
+        while stack:
+            node = stack.pop()
+            parent = parents[node]
+            depth = depths[parent] + 1 if parent >= 0 else 0
+            depths[node] = depth
+            while 1 << len(jumps) <= depth:
+                jumps.append(array.array('i', [-1]) * len(parents))
+
+            # The 2**(k+1)th ancestor is the 2**k-th ancestor of the 2**k-th ancestor
+            ancestor = parent
+            for level in jumps:
+                level[node] = ancestor
+                if ancestor >= 0:
+                    ancestor = level[ancestor]
+            stack.extend(self._children(node))
+
+    def _invalidate(self, index):
+        sizes = self._sizes
+        while index >= 0 and sizes[index]:
+            sizes[index] = 0
+            index = self._parents[index]
+
+    def _stats(self, index):
+        sizes = self._sizes
+        if not sizes[index]:
+            order = []
+            stack = [index]
+            while stack:
+                node = stack.pop()
+                order.append(node)
+                stack.extend(child for child in self._children(node) if not sizes[child])
+
+            leafcounts = self._leafcounts
+            heights = self._heights
+            for node in reversed(order):
+                size = 1
+                leaves = 0
+                height = 0
+                for child in self._children(node):
+                    size += sizes[child]
+                    leaves += leafcounts[child]
+                    height = max(height, heights[child] + 1)
+                sizes[node] = size
+                leafcounts[node] = leaves or 1
+                heights[node] = height
+        return (sizes[index], self._leafcounts[index], self._heights[index])
+
+    def _reorder(self, parent, children):
+        previous = -1
+        for child in children:
+            if previous < 0:
+                self._firstchild[parent] = child
+            else:
+                self._nextsibling[previous] = child
+            previous = child
+        self._nextsibling[previous] = -1
+        self._lastchild[parent] = previous
+
+
+class StoreNode(model.Traversals):
+    """Proxy for one node of a TreeStore, with the interface of model.Node.
+
+    children is a new tuple on every access, so that editing it fails instead
+    of silently doing nothing; change the tree through parent and sort.
+    """
+    __slots__ = ('_store', '_index')
+
+    def __init__(self, store, index):
+        self._store = store
+        self._index = index
+
+    def getid(self):
+        return self._store._strings[self._store._ids[self._index]]
+    def setid(self, value):
+        store = self._store
+        old = store._ids[self._index]
+        store._ids[self._index] = store._intern(value)
+        store._release(old)
+    id = property(getid, setid)
+
+    def getdata(self):
+        return self._store._data[self._index]
+    def setdata(self, value):
+        self._store._data[self._index] = value
+    data = property(getdata, setdata)
+
+    def getparent(self):
+        parent = self._store._parents[self._index]
+        if parent < 0:
+            return None
+        return self._store.node(parent)
+
+    def setparent(self, value):
+        if value is self or (value and value.hasancestor(self)):
+            raise model.CircularTreeException
+        if value and value._store is not self._store:
+            raise ValueError('parent is in a different TreeStore')
+
+        self._store._unlink(self._index)
+        if value:
+            self._store._link(self._index, value._index)
+    parent = property(getparent, setparent)
+
+    @property
+    def children(self):
+        store = self._store
+        return tuple(store.node(child) for child in store._children(self._index))
+
+    @property
+    def depth(self):
+        return self._store._depths[self._index]
+
+    @property
+    def size(self):
+        return self._store._stats(self._index)[0]
+
+    @property
+    def leaves(self):
+        return self._store._stats(self._index)[1]
+
+    @property
+    def height(self):
+        return self._store._stats(self._index)[2]
+
+    def invalidate(self):
+        # Every change goes through the store, which keeps them up to date
+        pass
+
+    def sort(self, key=None):
+        if key:
+            key = model.chain(key, operator.attrgetter('id'))
+        else:
+            key = operator.attrgetter('id')
+
+        children = sorted(self.children, key=key)
+        if children:
+            self._store._reorder(self._index, [child._index for child in children])
+
+    def freeze(self):
+        # There is no node object to keep versions on, so nothing is shared
+        frozen = {}
+        for node in self.postorder():
+            frozen[node] = model.Frozen(node.id, node.data,
+                                        [frozen.pop(child) for child in node.children], node)
+        return frozen[self]
+
+    def hasancestor(self, node):
+        store = self._store
+        distance = store._depths[self._index] - store._depths[node._index]
+        if distance <= 0 or node._store is not store:
+            return False
+
+        ancestor = self._index
+        level = 0
+        while distance:
+            if distance & 1:
+                ancestor = store._jumps[level][ancestor]
+            distance >>= 1
+            level += 1
+        return ancestor == node._index
+
+
+def fromnode(root):
+    """Copy the tree under root into a new TreeStore and return its root."""
+    store = TreeStore()
+    storeroot = store.add(root.id, root.data)
+
+    stack = [(child, storeroot) for child in reversed(root.children)]
+    while stack:
+        (node, parent) = stack.pop()
+        storenode = store.add(node.id, node.data, parent)
+        stack.extend((child, storenode) for child in reversed(node.children))
+    return storeroot
@@ -0,0 +1,95 @@
+"""Caches for drawing the same labels over and over.
+
+Node ids repeat a lot and rarely change, so their extents, and optionally
+their rendered images, are kept keyed by (text, font) instead of asking the
+toolkit again on every draw.
+"""
+
+
+import collections
+
+
+SIZE = 4096
+
+
+class LRUCache(object):
+    """Mapping that keeps at most size entries, dropping the least recently
+    used ones first.
+    """
+    def __init__(self, size=SIZE):
+        self.size = size
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __getitem__(self, key):
+        value = self._entries.pop(key)
+        self._entries[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._entries.pop(key, None)
+        self._entries[key] = value
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def __delitem__(self, key):
+        del self._entries[key]
+
+    def keys(self):
+        return self._entries.keys()
+
+
+class TextCache(object):
+    """Extents and rendered labels of text.
+
+    measure(text, font) returns the (width, height) of text and
+    render(text, font) an image of it for the toolkit to blit. Without render
+    only extents are cached. fontkey turns a font into something hashable.
+    """
+    def __init__(self, measure, render=None, size=SIZE, fontkey=None):
+        self._measure = measure
+        self._render = render
+        self._fontkey = fontkey
+        self._font = self._fontid = None
+        self._extents = LRUCache(size)
+        self._labels = LRUCache(size)
+
+    def _key(self, text, font):
+        if self._fontkey:
+            # The same font object is usually passed for a whole redraw
+            if font is not self._font:
+                (self._font, self._fontid) = (font, self._fontkey(font))
+            font = self._fontid
+        return (text, font)
+
+    def extent(self, text, font=None):
+        key = self._key(text, font)
+        try:
+            return self._extents[key]
+        except KeyError:
+            extent = self._extents[key] = self._measure(text, font)
+            return extent
+
+    def label(self, text, font=None):
+        """Return the rendered text, or None without a render function."""
+        if self._render is None:
+            return None
+
+        key = self._key(text, font)
+        try:
+            return self._labels[key]
+        except KeyError:
+            label = self._labels[key] = self._render(text, font)
+            return label
+
+    def discard(self, text):
+        """Forget text in every font, for when it is not drawn anymore."""
+        for cache in (self._extents, self._labels):
+            for key in cache.keys():
+                if key[0] == text:
+                    del cache[key]
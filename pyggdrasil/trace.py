@@ -0,0 +1,160 @@
+"""Opt-in timing of the load, layout, draw and export pipeline.
+
+Phases are wrapped in spans, either with the span() context manager or the
+traced() decorator. Finished spans are passed to every enabled sink as a
+dict of name, start, duration (in seconds) and any fields given, such as
+nodes. Until a sink is enabled, span() returns a shared do-nothing span and
+traced functions are called straight through.
+
+    collector = trace.Collector()
+    trace.enable(collector)
+    ...
+    trace.disable(collector)
+
+Setting the PYGG_TRACE environment variable to a file name and calling
+fromenvironment() writes every span to that file as JSON lines; '-' logs
+them instead.
+"""
+
+
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+
+_sinks = []
+
+
+def enable(sink):
+    _sinks.append(sink)
+
+
+def disable(sink=None):
+    """Remove sink, or every sink if none is given."""
+    if sink is None:
+        del _sinks[:]
+    else:
+        _sinks.remove(sink)
+
+
+def enabled():
+    return bool(_sinks)
+
+
+def fromenvironment(environ=os.environ):
+    """Enable the sink named by PYGG_TRACE, if it is set."""
+    target = environ.get('PYGG_TRACE')
+    if not target:
+        return None
+    if target == '-':
+        sink = LogSink()
+    else:
+        sink = JsonSink(open(target, 'a'))
+    enable(sink)
+    return sink
+
+
+class Span(object):
+    __slots__ = ('name', 'fields', 'start')
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+
+    def set(self, **fields):
+        """Add fields only known once the phase is done."""
+        self.fields.update(fields)
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        record = dict(self.fields, name=self.name, start=self.start,
+                      duration=time.time() - self.start)
+        if type is not None:
+            record['error'] = type.__name__
+        for sink in list(_sinks):
+            sink(record)
+        return False
+
+
+class _NullSpan(object):
+    def set(self, **fields):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        return False
+
+_NULLSPAN = _NullSpan()
+
+
+def span(name, **fields):
+    if not _sinks:
+        return _NULLSPAN
+    return Span(name, fields)
+
+
+def traced(name, nodes=None):
+    """Decorate a function to run in a span called name.
+
+    nodes(result) is the number of nodes handled, for the nodes field.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _sinks:
+                return func(*args, **kwargs)
+            with Span(name, {}) as current:
+                result = func(*args, **kwargs)
+                if nodes:
+                    current.set(nodes=nodes(result))
+                return result
+        return wrapper
+    return decorator
+
+
+class Collector(object):
+    """Keep the records in memory."""
+    def __init__(self):
+        self.records = []
+
+    def __call__(self, record):
+        self.records.append(record)
+
+    def durations(self, name):
+        return [record['duration'] for record in self.records
+                if record['name'] == name]
+
+
+class LogSink(object):
+    def __init__(self, logger=None, level=logging.DEBUG):
+        self.logger = logger or logging.getLogger('pyggdrasil.trace')
+        self.level = level
+
+    def __call__(self, record):
+        fields = ' '.join('%s=%s' % (key, value) for (key, value)
+                          in sorted(record.items())
+                          if key not in ('name', 'start', 'duration'))
+        self.logger.log(self.level, '%s %.3fms %s', record['name'],
+                        1000 * record['duration'], fields)
+
+
+class JsonSink(object):
+    """Write every record as one line of JSON to stream."""
+    def __init__(self, stream):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        line = json.dumps(record, sort_keys=True) + '\n'
+        with self._lock:
+            # One write per line, so processes sharing the file don't mix
+            self.stream.write(line)
+            self.stream.flush()
@@ -1,12 +1,34 @@
 import functools
+import math
+import shutil
+import tempfile
 
 import wx
 import wx.lib.newevent
 
 import pyggdrasil
+from pyggdrasil import layout, textcache
+from pyggdrasil.graph import incremental, lod, spatial
 
 from threading import Thread
 
+try:
+    from pyggdrasil.graph.vector import VectorGraph as GraphClass
+    from pyggdrasil.graph.vector import Transition
+except ImportError:
+    GraphClass = pyggdrasil.graph.Graph
+    Transition = pyggdrasil.graph.Transition
+
+
+WILDCARD = '|'.join([
+    'Pyggdrasil (*.pyg)', '*.pyg',
+    'Pyggdrasil binary (*.%s)' % pyggdrasil.serialize.BINARY_EXTENSION,
+    '*.' + pyggdrasil.serialize.BINARY_EXTENSION,
+])
+
+ZOOMSTEP = 1.25
+ZOOMRANGE = (0.001, 8.0)
+
 
 def createmenuitems(parent, menu, notebook):
     menuitems = []
@@ -97,6 +119,13 @@ class Main(wx.Frame):
         menubar.Append(edit, '&Edit')
 
         view = wx.Menu()
+        zoomin = view.Append(wx.ID_ZOOM_IN, 'Zoom &In\tCtrl-+')
+        self.Bind(wx.EVT_MENU, self.OnZoomIn, zoomin)
+        zoomout = view.Append(wx.ID_ZOOM_OUT, 'Zoom &Out\tCtrl--')
+        self.Bind(wx.EVT_MENU, self.OnZoomOut, zoomout)
+        zoom100 = view.Append(wx.ID_ZOOM_100, '&Actual Size\tCtrl-0')
+        self.Bind(wx.EVT_MENU, self.OnZoom100, zoom100)
+        view.AppendSeparator()
         createmenuitems(self, view, self._notebook)
         menubar.Append(view, '&View')
 
@@ -136,11 +165,20 @@ class Main(wx.Frame):
         frame.Show(True)
 
     def OnOpen(self, event):
-        filename = wx.LoadFileSelector('Pyggdrasil', extension='pyg', parent=self)
+        filename = wx.FileSelector('Open', wildcard=WILDCARD,
+                                   flags=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST,
+                                   parent=self)
         if filename:
-            file = open(filename)
+            # Not loadlazy: the whole tree is laid out right after opening,
+            # which would load every node one seek at a time
+            if pyggdrasil.serialize.isbinary(filename):
+                file = open(filename, 'rb')
+                load = pyggdrasil.serialize.loadbinary
+            else:
+                file = open(filename)
+                load = pyggdrasil.serialize.load
             try:
-                root, options = pyggdrasil.serialize.load(file)
+                root, options = load(file)
                 frame = Main(root, options, filename,
                              self.GetParent(), wx.ID_ANY)
                 frame.Show(True)
@@ -154,7 +192,9 @@ class Main(wx.Frame):
             self.OnSaveAs(event)
 
     def OnSaveAs(self, event):
-        filename = wx.SaveFileSelector('Pyggdrasil', extension='pyg', parent=self)
+        filename = wx.FileSelector('Save', default_extension='pyg', wildcard=WILDCARD,
+                                   flags=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT,
+                                   parent=self)
         if filename:
             if '.' not in filename:
                 filename += '.pyg'
@@ -162,23 +202,41 @@ class Main(wx.Frame):
             self._save()
 
     def _save(self):
-        file = open(self.filename, 'w')
+        if pyggdrasil.serialize.isbinary(self.filename):
+            mode = 'wb'
+            dump = pyggdrasil.serialize.dumpbinary
+        else:
+            mode = 'w'
+            dump = pyggdrasil.serialize.dump
+
+        # A dump that fails must not leave the file truncated, so it is only
+        # opened once the whole tree has been written somewhere else
+        spool = tempfile.TemporaryFile()
         try:
-            pyggdrasil.serialize.dump(file, self.root, self._config.options)
+            dump(spool, self.root, self._config.options)
+            spool.seek(0)
+            with open(self.filename, mode) as file:
+                shutil.copyfileobj(spool, file)
         finally:
-            file.close()
+            spool.close()
 
     def OnExport(self, event):
         module = self._exports[event.GetId()]
         name = pyggdrasil.export.name(module)
         extension = pyggdrasil.export.extension(module)
 
-        filename = wx.SaveFileSelector(name, extension=extension, parent=self)
+        # Several exporters write PNG, so the wildcard carries the name
+        filename = wx.FileSelector('Export ' + name, default_extension=extension,
+                                   wildcard=pyggdrasil.export.wildcard(module),
+                                   flags=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT,
+                                   parent=self)
         if filename:
             if '.' not in filename:
                 filename += '.' + extension
-            func = functools.partial(pyggdrasil.export.run,
-                                     module, self._graph.graph, filename)
+            # The export thread gets its own copy of the nodes to read
+            graph = layout.detach(self._graph.target)
+            pyggdrasil.export.prepare(module)
+            func = functools.partial(pyggdrasil.export.run, module, graph, filename)
             progress = Progress(func, parent=self, title='Export',
                                 message=''.join(['Exporting ', name, '...']))
 
@@ -186,7 +244,7 @@ class Main(wx.Frame):
         self.Close()
 
     def OnTreeChange(self, event):
-        self._graph.Reload()
+        self._graph.Reload(event.changes)
 
     def OnConfigChange(self, event):
         self._tree.ReloadOptions()
@@ -198,6 +256,15 @@ class Main(wx.Frame):
     def OnGraphSelected(self, event):
         self._tree.selected = event.target
 
+    def OnZoomIn(self, event):
+        self._graph.zoom *= ZOOMSTEP
+
+    def OnZoomOut(self, event):
+        self._graph.zoom /= ZOOMSTEP
+
+    def OnZoom100(self, event):
+        self._graph.zoom = 1.0
+
     def OnAdd(self, event):
         self._tree.AddChild()
 
@@ -229,21 +296,39 @@ class Progress(wx.EvtHandler):
 
 
 GraphSelectedEvent, GRAPH_SELECTED_EVENT = wx.lib.newevent.NewEvent()
+LayoutDoneEvent, LAYOUT_DONE_EVENT = wx.lib.newevent.NewEvent()
 
 class Graph(wx.ScrolledWindow):
     def __init__(self, root, options, *args, **kwargs):
         wx.ScrolledWindow.__init__(self, *args, **kwargs)
 
         self.options = options
-        self.selected = root
+        self._selected = root
+        self._hovered = None
+        self._buffer = None
 
         self._drawtimer = wx.Timer(self, wx.ID_ANY)
         self.Bind(wx.EVT_TIMER, self.OnTimer)
 
+        self._layouts = layout.LayoutService(self._layoutdone, graphclass=GraphClass)
+        self._pending = None
+        self.Bind(LAYOUT_DONE_EVENT, self.OnLayoutDone)
+        self.Bind(wx.EVT_WINDOW_DESTROY, self.OnDestroy)
+
+        self._index = None
+        self._detail = None
+        self._view = None
+        self._zoom = 1.0
+        self._texts = textcache.TextCache(self._measure, self._render,
+                                          fontkey=wx.Font.GetNativeFontInfoDesc)
+
         self.root = root
         self.Reload()
         self.Bind(wx.EVT_PAINT, self.OnPaint)
         self.Bind(wx.EVT_LEFT_DOWN, self.OnMouseClick)
+        self.Bind(wx.EVT_MOUSEWHEEL, self.OnMouseWheel)
+        self.Bind(wx.EVT_MOTION, self.OnMouseMotion)
+        self.Bind(wx.EVT_LEAVE_WINDOW, self.OnMouseLeave)
 
         self.SetBackgroundStyle(wx.BG_STYLE_CUSTOM)
         self.SetScrollRate(1, 1)
@@ -251,21 +336,107 @@ class Graph(wx.ScrolledWindow):
     def getselected(self):
         return self._selected
     def setselected(self, value):
+        old = self._selected
         self._selected = value
-        self.Refresh()
+        self._refreshnode(old)
+        self._refreshnode(value)
     selected = property(getselected, setselected)
 
-    def Reload(self):
+    def gethovered(self):
+        return self._hovered
+    def sethovered(self, value):
+        old = self._hovered
+        self._hovered = value
+        self._refreshnode(old)
+        self._refreshnode(value)
+    hovered = property(gethovered, sethovered)
+
+    def getzoom(self):
+        return self._zoom
+    def setzoom(self, value):
+        self._zoom = min(max(value, ZOOMRANGE[0]), ZOOMRANGE[1])
+        self.SetVirtualSize((self.view.width, self.view.height))
+        self.Refresh()
+    zoom = property(getzoom, setzoom)
+
+    def getview(self):
+        """The current graph scaled to the zoom factor."""
+        if self._zoom == 1.0:
+            return self.graph
+        if self._view is None or self._view[:2] != (self.graph, self._zoom):
+            self._view = (self.graph, self._zoom, self.graph.scale(self._zoom))
+        return self._view[2]
+    view = property(getview)
+
+    def getindex(self):
+        """Spatial index of the current view, built when first needed."""
+        if self._index is None:
+            self._index = spatial.SpatialIndex(self.view)
+        elif self._index.graph is not self.view:
+            # Relayouts mostly move a few nodes; the rest stays indexed
+            self._index = self._index.update(self.view)
+        return self._index
+    index = property(getindex)
+
+    def getdetail(self):
+        """Level of detail of the current view, built when first needed."""
+        if self._detail is None or self._detail.graph is not self.view:
+            self._detail = lod.Detail(self.view)
+        return self._detail
+    detail = property(getdetail)
+
+    def gettarget(self):
+        """The layout the graph is animating towards."""
+        return self._target
+    target = property(gettarget)
+
+    def Reload(self, changes=None):
+        """Lay out the tree again. If the tree changes since the last layout
+        are given, only the affected part of the layout is recalculated.
+
+        Full layouts run in the background and the graph moves to the new
+        layout once it is done. The first one is done right away, so there is
+        always a graph to draw.
+        """
+        for change in changes or []:
+            if isinstance(change, incremental.Renamed):
+                self._texts.discard(change.oldid)
+
+        if not hasattr(self, 'graph'):
+            self._settarget(pyggdrasil.graph.generate(
+                self.root, graphclass=GraphClass, **self.options['graph'].dict))
+        elif changes is None or self._pending is not None:
+            # A pending layout would miss the changes, so it is redone instead
+            self._pending = self._layouts.request(self.root, **self.options['graph'].dict)
+        else:
+            self._settarget(incremental.relayout(self._target, changes))
+
+    def _layoutdone(self, graph, generation):
+        # Called from the layout thread
+        wx.PostEvent(self, LayoutDoneEvent(graph=graph, generation=generation))
+
+    def OnLayoutDone(self, event):
+        if event.generation == self._pending:
+            self._pending = None
+            self._settarget(event.graph)
+
+    def OnDestroy(self, event):
+        if event.GetEventObject() is self:
+            self._drawtimer.Stop()
+            self._layouts.close()
+        event.Skip()
+
+    def _settarget(self, target):
         try:
             self._oldgraph = self.graph
         except AttributeError:
-            self.graph = pyggdrasil.graph.generate(self.root, **self.options['graph'].dict)
-            self.SetVirtualSize((self.graph.width, self.graph.height))
+            self.graph = target
+            self.SetVirtualSize((self.view.width, self.view.height))
         else:
-            self._target = pyggdrasil.graph.generate(self.root, **self.options['graph'].dict)
-
+            self._transition = Transition(self._oldgraph, target)
             self._drawtimer.Start(15)
             self._timeramount = 0
+        self._target = target
 
         if self.selected not in self.graph:
             self.selected = None
@@ -276,13 +447,12 @@ class Graph(wx.ScrolledWindow):
         # TODO: Remove hardcode
         self._timeramount += 1
         if self._timeramount < 20:
-            self.graph = pyggdrasil.graph.transition(self._oldgraph, self._target,
-                                                     self._timeramount / 20.0)
+            self.graph = self._transition.frame(self._timeramount / 20.0)
         else:
             self._drawtimer.Stop()
             self.graph = self._target
 
-        self.SetVirtualSize((self.graph.width, self.graph.height))
+        self.SetVirtualSize((self.view.width, self.view.height))
         self.Refresh()
 
     def OnPaint(self, event):
@@ -294,57 +464,202 @@ class Graph(wx.ScrolledWindow):
             dc.SetBackground(wx.Brush(self.GetBackgroundColour()))
         dc.Clear()
 
-        lines = []
-        polygons = []
-        for node in self.graph:
-            if self.graph.hasline(node):
-                spos = self.graph.linestart(node)
-                epos = self.graph.lineend(node)
+        view = self.view
+        with pyggdrasil.trace.span('ui.paint') as current:
+            if self._buffer is None or self._buffer[0] is not view or \
+               not _contains(self._buffer[1], self._visiblebox()):
+                with pyggdrasil.trace.span('ui.render', nodes=len(view)):
+                    self._renderbuffer()
+            (graph, (x, y, x2, y2), bitmap, font) = self._buffer
+            dc.DrawBitmap(bitmap, x, y)
+
+            # Highlights are drawn over the buffer, so changing them only
+            # needs their own rectangles repainted
+            for (node, colour) in ((self.hovered, '#E0E0FF'), (self.selected, '#FFFF80')):
+                if node is not None and node in view:
+                    dc.SetBrush(wx.Brush(colour))
+                    self._drawnode(node, dc, font)
 
-                # Relational line
-                lines.append((spos.real, spos.imag, epos.real, epos.imag))
+            current.set(animating=self._drawtimer.IsRunning())
 
-                # Little arrow at the end
-                polygons.append([(pos.real, pos.imag)
-                                     for pos in self.graph.arrow_points(node)])
+        dc.EndDrawing()
 
-        if lines:
+    def _renderbuffer(self):
+        """Draw the current view around the visible part into the buffer."""
+        # A screen of margin on every side, so short scrolls reuse it
+        (x1, y1, x2, y2) = self._visiblebox()
+        (w, h) = self.GetClientSize()
+        (width, height) = self._size()
+        box = (max(x1 - w, 0), max(y1 - h, 0),
+               max(min(x2 + w, width), 1), max(min(y2 + h, height), 1))
+
+        bitmap = wx.EmptyBitmap(box[2] - box[0], box[3] - box[1])
+        dc = wx.MemoryDC(bitmap)
+        dc.SetDeviceOrigin(-box[0], -box[1])
+        dc.SetBackground(wx.Brush(self.GetBackgroundColour()))
+        dc.Clear()
+        font = self._drawgraph(dc, box)
+        dc.SelectObject(wx.NullBitmap)
+
+        self._buffer = (self.view, box, bitmap, font)
+
+    def _drawgraph(self, dc, box):
+        """Draw the lines, nodes and collapsed subtrees of the current view
+        in box. Returns the label font, None if labels are not drawn.
+        """
+        view = self.view
+        clusters = []
+        if self._drawtimer.IsRunning():
+            # Transition frames are only shown once, not worth indexing
+            detail = lod.Detail(view, cluster=False)
+            nodes = view
+            lines = view.lines()
+            polygons = view.arrows() if detail.arrows else []
+        elif self.detail.clustered:
+            detail = self.detail
+            (nodes, clusters) = detail.visible(box)
+            linenodes = [node for node in nodes if view.hasline(node)]
+            linenodes.extend(node for (node, nodebox) in clusters if view.hasline(node))
+            lines = [_coords(view.linestart(node)) + _coords(view.lineend(node))
+                     for node in linenodes]
+            polygons = []
+            if detail.arrows:
+                polygons = [[_coords(pos) for pos in view.arrow_points(node)]
+                            for node in linenodes]
+        else:
+            detail = self.detail
+            nodes = self.index.nodes(box)
+            edges = list(self.index.edges(box))
+            lines = [line for (node, line, arrow) in edges]
+            polygons = []
+            if detail.arrows:
+                polygons = [arrow for (node, line, arrow) in edges]
+
+        # Relational lines with a little arrow at the end
+        if len(lines):
             dc.DrawLineList(lines)
+        if len(polygons):
             dc.SetBrush(wx.Brush('#000000'))
             dc.DrawPolygonList(polygons)
 
-        dc.SetBrush(wx.Brush('#FFFFFF'))
-        for node in self.graph:
-            self._drawnode(node, dc)
+        # Collapsed subtrees
+        if clusters:
+            dc.SetBrush(wx.Brush('#C0C0C0'))
+            dc.DrawRectangleList([(x1, y1, x2 - x1, y2 - y1)
+                                  for (node, (x1, y1, x2, y2)) in clusters])
 
-        if self.selected:
-            dc.SetBrush(wx.Brush('#FFFF80'))
-            self._drawnode(self.selected, dc)
+        font = None
+        if detail.labels:
+            font = self.GetFont()
 
-        dc.EndDrawing()
+        dc.SetBrush(wx.Brush('#FFFFFF'))
+        for node in nodes:
+            self._drawnode(node, dc, font)
+        return font
+
+    def _refreshnode(self, node):
+        """Repaint just the area of node and its label."""
+        if node is None or self._buffer is None or node not in self.view:
+            return
 
-    def _drawnode(self, node, dc):
-        pos = self.graph.pos(node)
-        dc.DrawCircle(pos.real, pos.imag, self.graph.radius)
+        pos = self.view.pos(node)
+        w = h = 2 * self.view.radius
+        font = self._buffer[3]
+        if font:
+            (textw, texth) = self._texts.extent(node.id, font)
+            (w, h) = (max(w, textw), max(h, texth))
+
+        x, y = self.CalcScrolledPosition(int(pos.real - w/2.0), int(pos.imag - h/2.0))
+        self.RefreshRect(wx.Rect(x - 2, y - 2, int(math.ceil(w)) + 4, int(math.ceil(h)) + 4),
+                         False)
+
+    def _size(self):
+        return (int(math.ceil(self.view.width)), int(math.ceil(self.view.height)))
+
+    def _visiblebox(self):
+        """Return _viewbox() without the part past the edges of the graph."""
+        (x1, y1, x2, y2) = self._viewbox()
+        (width, height) = self._size()
+        return (min(x1, width), min(y1, height), min(x2, width), min(y2, height))
+
+    def _viewbox(self):
+        """Return the (x1, y1, x2, y2) of the visible part of the graph."""
+        x, y = self.CalcUnscrolledPosition(0, 0)
+        w, h = self.GetClientSize()
+        return (x, y, x + w, y + h)
+
+    def _drawnode(self, node, dc, font=None):
+        pos = self.view.pos(node)
+        dc.DrawCircle(pos.real, pos.imag, self.view.radius)
+
+        if font:
+            w, h = self._texts.extent(node.id, font)
+            dc.DrawBitmap(self._texts.label(node.id, font),
+                          pos.real - w/2.0, pos.imag - h/2.0, True)
+
+    def _measure(self, text, font):
+        return self.GetFullTextExtent(text, font)[:2]
+
+    def _render(self, text, font):
+        # White is masked out, so the label can be blitted over anything
+        w, h = self._texts.extent(text, font)
+        bitmap = wx.EmptyBitmap(max(w, 1), max(h, 1))
+        dc = wx.MemoryDC(bitmap)
+        dc.SetBackground(wx.WHITE_BRUSH)
+        dc.Clear()
+        dc.SetFont(font)
+        dc.DrawText(text, 0, 0)
+        dc.SelectObject(wx.NullBitmap)
 
-        w, h = dc.GetTextExtent(node.id)
-        dc.DrawText(node.id, pos.real - w/2.0, pos.imag - h/2.0)
+        bitmap.SetMask(wx.Mask(bitmap, wx.WHITE))
+        return bitmap
 
     def OnMouseClick(self, event):
         dc = wx.ClientDC(self)
         self.DoPrepareDC(dc)
         click = tuple(event.GetLogicalPosition(dc))
 
-        for node in self.graph:
-            pos = self.graph.pos(node)
-            if (pos.real - self.graph.radius) <= click[0] <= (pos.real + self.graph.radius) and \
-               (pos.imag - self.graph.radius) <= click[1] <= (pos.imag + self.graph.radius):
-                wx.PostEvent(self, GraphSelectedEvent(target=node))
-                return
+        node = self.index.nodeat(*click)
+        if node is not None:
+            wx.PostEvent(self, GraphSelectedEvent(target=node))
+
+    def OnMouseMotion(self, event):
+        if self._drawtimer.IsRunning():
+            return
+        x, y = self.CalcUnscrolledPosition(event.GetPosition())
+        node = self.index.nodeat(x, y)
+        if node is not self.hovered:
+            self.hovered = node
+
+    def OnMouseLeave(self, event):
+        self.hovered = None
+
+    def OnMouseWheel(self, event):
+        if event.ControlDown():
+            if event.GetWheelRotation() > 0:
+                self.zoom *= ZOOMSTEP
+            else:
+                self.zoom /= ZOOMSTEP
+        else:
+            event.Skip()
+
+
+def _coords(pos):
+    return (pos.real, pos.imag)
+
+
+def _contains(outer, inner):
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and \
+           inner[2] <= outer[2] and inner[3] <= outer[3]
 
 
 TreeChangedEvent, TREE_CHANGED_EVENT = wx.lib.newevent.NewEvent()
 
+def _itemkey(item):
+    # Every lookup may get a different TreeItemId wrapper for the same item
+    return int(item.GetID())
+
+
 class Tree(wx.Panel):
     def __init__(self, root, options, *args, **kwargs):
         wx.Panel.__init__(self, *args, **kwargs)
@@ -356,6 +671,7 @@ class Tree(wx.Panel):
         self._tree.Bind(wx.EVT_TREE_END_LABEL_EDIT, self.OnRename)
         self._tree.Bind(wx.EVT_TREE_BEGIN_DRAG, self.OnBeginDrag)
         self._tree.Bind(wx.EVT_TREE_END_DRAG, self.OnEndDrag)
+        self._tree.Bind(wx.EVT_TREE_ITEM_EXPANDING, self.OnExpanding)
         sizer.Add(self._tree, 1, wx.EXPAND)
 
         self.SetSizer(sizer)
@@ -370,7 +686,7 @@ class Tree(wx.Panel):
     def getselected(self):
         return self.nodes[self._tree.GetSelection()]
     def setselected(self, value):
-        item = self.nodes.getkey(value)
+        item = self._item(value)
         self._tree.SelectItem(item)
     selected = property(getselected, setselected)
 
@@ -378,6 +694,7 @@ class Tree(wx.Panel):
         nodeid = 'New'
 
         parent = self._tree.GetSelection()
+        self._populatechildren(parent)
         node = pyggdrasil.model.Node(str(nodeid), None, self.nodes[parent])
 
         item = self._tree.AppendItem(parent, nodeid)
@@ -386,7 +703,7 @@ class Tree(wx.Panel):
         self._tree.Expand(parent)
         self._tree.EditLabel(item)
 
-        wx.PostEvent(self, TreeChangedEvent())
+        wx.PostEvent(self, TreeChangedEvent(changes=[incremental.Added(node)]))
 
     def RemoveSelected(self):
         #TODO: Deal with children somehow
@@ -395,19 +712,21 @@ class Tree(wx.Panel):
             return
 
         node = self.nodes[item]
-        node.parent.children.remove(node)
-        del self.nodes[item]
+        parent = node.parent
+        node.parent = None
+        self._forget(item)
         self._tree.Delete(item)
 
-        wx.PostEvent(self, TreeChangedEvent())
+        wx.PostEvent(self, TreeChangedEvent(changes=[incremental.Removed(node, parent)]))
 
     def RenameSelected(self):
         self._tree.EditLabel(self._tree.GetSelection())
 
     def ReloadNodes(self):
         self._tree.DeleteAllItems()
-        self.nodes = pyggdrasil.model.EqualsDict()
-        self._populatenode(self.root)
+        self.nodes = pyggdrasil.model.ItemDict(keyfunc=_itemkey)
+        self._populated = set()
+        self._populatechildren(self._populatenode(self.root))
 
     def ReloadOptions(self):
         if self.options['tree']['sort']:
@@ -420,32 +739,78 @@ class Tree(wx.Panel):
             treeitem = self._tree.AddRoot(node.id)
         self.nodes[treeitem] = node
 
-        for child in node.children:
-            self._populatenode(child, treeitem)
+        # Children get items when first expanded
+        self._tree.SetItemHasChildren(treeitem, bool(node.children))
 
         return treeitem
 
+    def _populatechildren(self, item):
+        if _itemkey(item) in self._populated:
+            return
+        self._populated.add(_itemkey(item))
+
+        for child in self.nodes[item].children:
+            self._populatenode(child, item)
+
+    def _item(self, node):
+        """Return node's item, creating the items of its collapsed ancestors."""
+        missing = []
+        while True:
+            try:
+                item = self.nodes.getkey(node)
+                break
+            except KeyError:
+                missing.append(node)
+                node = node.parent
+
+        for node in reversed(missing):
+            self._populatechildren(item)
+            item = self.nodes.getkey(node)
+        return item
+
+    def _forget(self, item):
+        # wx reuses the ids of deleted items
+        stack = [item]
+        while stack:
+            item = stack.pop()
+            stack.extend(self._children(item))
+            del self.nodes[item]
+            self._populated.discard(_itemkey(item))
+
     def _moveitem(self, item, newparent):
         # TODO: Push down to wxTreeCtrl (as a patch maybe)
         newitem = self._tree.AppendItem(newparent, self._tree.GetItemText(item))
         self.nodes[newitem] = self.nodes[item]
 
-        for child in self._children(item):
-            self._moveitem(child, newitem)
+        if _itemkey(item) in self._populated:
+            self._populated.add(_itemkey(newitem))
+            for child in self._children(item):
+                self._moveitem(child, newitem)
+        else:
+            self._tree.SetItemHasChildren(newitem, self._tree.ItemHasChildren(item))
 
         if self._tree.IsExpanded(item):
             self._tree.Expand(newitem)
 
         self._tree.Delete(item)
         del self.nodes[item]
+        self._populated.discard(_itemkey(item))
         return newitem
 
     def _sorttree(self, item):
-        self._tree.SortChildren(item)
-        self.nodes[item].sort()
+        # Nodes without items yet are sorted too, so the graph agrees
+        stack = [self.nodes[item]]
+        while stack:
+            node = stack.pop()
+            node.sort()
+            stack.extend(node.children)
 
+        self._sortitems(item)
+
+    def _sortitems(self, item):
+        self._tree.SortChildren(item)
         for child in self._children(item):
-            self._sorttree(child)
+            self._sortitems(child)
 
     def _children(self, item):
         # Not an iterator because deleting items confuses GetNextSibling
@@ -463,14 +828,21 @@ class Tree(wx.Panel):
             return
 
         item = event.GetItem()
-        self.nodes[item].id = str(nodeid)
+        node = self.nodes[item]
+        changes = [incremental.Renamed(node, node.id)]
+        node.id = str(nodeid)
 
         if self.options['tree']['sort']:
             # Triggered version has not renamed before sort
             self._tree.SetItemText(item, nodeid)
-            self._sorttree(self._tree.GetItemParent(item))
+            parent = self._tree.GetItemParent(item)
+            self._sorttree(parent)
+            changes.append(incremental.Sorted(self.nodes[parent]))
+
+        wx.PostEvent(self, TreeChangedEvent(changes=changes))
 
-        wx.PostEvent(self, TreeChangedEvent())
+    def OnExpanding(self, event):
+        self._populatechildren(event.GetItem())
 
     def OnBeginDrag(self, event):
         self._dragitem = event.GetItem()
@@ -487,8 +859,12 @@ class Tree(wx.Panel):
             event.Veto()
             return
 
+        # Otherwise populating it later would add the moved node twice
+        self._populatechildren(parent)
+
         try:
             node = self.nodes[olditem]
+            oldparent = node.parent
             node.parent = self.nodes[parent]
         except pyggdrasil.model.CircularTreeException:
             event.Veto()
@@ -497,10 +873,12 @@ class Tree(wx.Panel):
             newitem = self._moveitem(olditem, parent)
             self._tree.SelectItem(newitem)
 
+            changes = [incremental.Moved(node, oldparent)]
             if self.options['tree']['sort']:
                 self._sorttree(parent)
+                changes.append(incremental.Sorted(node.parent))
 
-            wx.PostEvent(self, TreeChangedEvent())
+            wx.PostEvent(self, TreeChangedEvent(changes=changes))
 
 
 ConfigChangedEvent, CONFIG_CHANGED_EVENT = wx.lib.newevent.NewEvent()
@@ -565,6 +943,7 @@ class Config(wx.Panel):
 class App(wx.App):
     def OnInit(self):
         self.SetAppName('Pyggdrasil')
+        pyggdrasil.trace.fromenvironment()
         frame = Main(parent=None, id=wx.ID_ANY)
         frame.Bind(wx.EVT_MENU, self.OnMenuExit, id=wx.ID_EXIT)
         frame.Show(True)
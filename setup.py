@@ -6,7 +6,7 @@ args = dict(
     version='0.0.4',
     description='Pyggdrasil',
     packages=['pyggdrasil', 'pyggdrasil.graph', 'pyggdrasil.export'],
-    scripts=['pygg'],
+    scripts=['pygg', 'pygg-batch'],
 )
 
 
@@ -0,0 +1,117 @@
+import os
+import shutil
+import StringIO
+import tempfile
+import time
+
+import py
+import pyggdrasil
+from pyggdrasil import batch
+
+
+class TestBatch(object):
+    def setup_method(self, method):
+        self.directory = tempfile.mkdtemp()
+        self.inputs = []
+        for name in ['first', 'second']:
+            root = pyggdrasil.model.Node(name, None)
+            pyggdrasil.model.Node('child', None, root)
+            filename = os.path.join(self.directory, name + '.pyg')
+            with open(filename, 'w') as file:
+                pyggdrasil.serialize.dump(file, root, pyggdrasil.model.Options())
+            self.inputs.append(filename)
+
+        filename = os.path.join(self.directory, 'third.pygb')
+        with open(filename, 'wb') as file:
+            pyggdrasil.serialize.dumpbinary(file, root, pyggdrasil.model.Options())
+        self.inputs.append(filename)
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.directory)
+
+    def run(self, *args):
+        out = StringIO.StringIO()
+        status = batch.main(list(args) + [os.path.join(self.directory, '*.pyg*')], out)
+        return (status, out.getvalue().splitlines())
+
+    def test_render(self):
+        (status, report) = self.run('-j', '1')
+
+        assert status == 0
+        assert len(report) == 4
+        assert report[-1].startswith('3 rendered, 0 skipped, 0 failed')
+        for name in ['first', 'second', 'third']:
+            assert os.path.exists(os.path.join(self.directory, name + '.svg'))
+
+    def test_pool(self):
+        outputdir = os.path.join(self.directory, 'out')
+        (status, report) = self.run('-j', '2', '-o', outputdir)
+
+        assert status == 0
+        assert sorted(os.listdir(outputdir)) == ['first.svg', 'second.svg', 'third.svg']
+
+    def test_skip_by_mtime(self):
+        self.run('-j', '1')
+        (status, report) = self.run('-j', '1')
+        assert report[-1].startswith('0 rendered, 3 skipped')
+
+        later = time.time() + 10
+        os.utime(self.inputs[0], (later, later))
+        (status, report) = self.run('-j', '1')
+        assert report[-1].startswith('1 rendered, 2 skipped')
+
+    def test_skip_by_hash(self):
+        self.run('-j', '1', '-c', 'hash')
+        later = time.time() + 10
+        os.utime(self.inputs[0], (later, later))
+        (status, report) = self.run('-j', '1', '-c', 'hash')
+        assert report[-1].startswith('0 rendered, 3 skipped')
+
+        with open(self.inputs[1], 'a') as file:
+            file.write('\n')
+        (status, report) = self.run('-j', '1', '-c', 'hash')
+        assert report[-1].startswith('1 rendered, 2 skipped')
+
+    def test_failure(self):
+        with open(os.path.join(self.directory, 'broken.pyg'), 'w') as file:
+            file.write('structure: [')
+
+        (status, report) = self.run('-j', '1')
+        assert status == 1
+        assert [line for line in report if line.startswith('failed')]
+        assert report[-1].startswith('3 rendered, 0 skipped, 1 failed')
+
+    def test_failed_export_removed(self):
+        def export(module, graph, filename):
+            with open(filename, 'w') as file:
+                file.write('<svg')
+            raise IOError('disk full')
+
+        run = pyggdrasil.export.run
+        pyggdrasil.export.run = export
+        try:
+            (status, report) = self.run('-j', '1')
+        finally:
+            pyggdrasil.export.run = run
+        assert report[-1].startswith('0 rendered, 0 skipped, 3 failed')
+        assert not os.path.exists(os.path.join(self.directory, 'first.svg'))
+
+        (status, report) = self.run('-j', '1')
+        assert report[-1].startswith('3 rendered, 0 skipped, 0 failed')
+
+    def test_same_output_rejected(self):
+        subdirectory = os.path.join(self.directory, 'sub')
+        os.mkdir(subdirectory)
+        shutil.copy(self.inputs[0], subdirectory)
+
+        outputdir = os.path.join(self.directory, 'out')
+        py.test.raises(SystemExit, self.run, '-o', outputdir,
+                       os.path.join(subdirectory, '*.pyg'))
+        assert os.listdir(outputdir) == []
+
+        # Next to their inputs they don't collide
+        (status, report) = self.run('-j', '1', os.path.join(subdirectory, '*.pyg'))
+        assert report[-1].startswith('4 rendered')
+
+    def test_unknown_format(self):
+        py.test.raises(SystemExit, self.run, '-f', 'nope')
@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pyggdrasil
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'bench'))
+import run
+
+
+class TestBench(object):
+    def test_exporters(self):
+        # Large enough that raster exports have to be scaled down
+        for (module, available) in pyggdrasil.export.ALL:
+            if available:
+                name = 'export-' + pyggdrasil.export.key(module)
+                result = run.measure(name, 'random', 200, 1, 0, maxpixels=10**5)
+                assert 'error' not in result, result['error']
+                assert result['time'] > 0
+
+    def test_compare(self):
+        baseline = dict(results=[dict(name='unroll', shape='wide', size=10, time=1.0)])
+        results = [dict(name='unroll', shape='wide', size=10, time=1.5)]
+        assert run.compare(results, baseline, 0.2) == [(results[0], baseline['results'][0])]
+        assert run.compare(results, baseline, 0.6) == []
+
+    def test_measureprocess(self):
+        result = run.measureprocess(('unroll', 'wide', 100, 1, 0))
+        assert 'error' not in result
+        assert result['time'] > 0
+        assert result['rss'] > 0
@@ -0,0 +1,184 @@
+import os
+import tempfile
+import threading
+import xml.etree.ElementTree as et
+
+import py
+import pyggdrasil
+from pyggdrasil.export import svg
+
+
+class TestSvg(object):
+    def setup_method(self, method):
+        self.root = pyggdrasil.model.Node('the root', None)
+        self.child1 = pyggdrasil.model.Node('child <uno>', None, self.root)
+        self.child2 = pyggdrasil.model.Node('child & duo', None, self.root)
+        self.graph = pyggdrasil.graph.generate(self.root, radius=40, padding=5,
+                                               arrow_length=5, arrow_width=5)
+
+        (handle, self.filename) = tempfile.mkstemp(suffix='.svg')
+        os.close(handle)
+
+    def teardown_method(self, method):
+        os.remove(self.filename)
+
+    def test_export(self):
+        progress = []
+        svg.export(self.graph, self.filename, progress.append)
+
+        root = et.parse(self.filename).getroot()
+        namespace = '{http://www.w3.org/2000/svg}'
+        assert len(root.findall(namespace + 'line')) == 2
+        assert sorted(text.text for text in root.iter(namespace + 'text')) == \
+               sorted(node.id for node in self.graph)
+
+        assert progress == sorted(progress)
+        assert progress[-1] == 1.0
+
+
+class TestRegistry(object):
+    def test_png_exporters_told_apart(self):
+        modules = [module for (module, available) in pyggdrasil.export.ALL
+                   if available and pyggdrasil.export.extension(module) == 'png']
+        keys = [pyggdrasil.export.key(module) for module in modules]
+        wildcards = [pyggdrasil.export.wildcard(module) for module in modules]
+        assert len(set(keys)) == len(modules)
+        assert len(set(wildcards)) == len(modules)
+
+    def test_wildcard(self):
+        assert pyggdrasil.export.wildcard(svg) == 'SVG (*.svg)|*.svg'
+
+
+class PngFixture(object):
+    """A small tree and two PNG files to compare."""
+    def setup_method(self, method):
+        self.root = pyggdrasil.model.Node('the root', None)
+        for num in range(5):
+            child = pyggdrasil.model.Node('child %d' % num, None, self.root)
+            pyggdrasil.model.Node('grandchild %d' % num, None, child)
+        self.graph = pyggdrasil.graph.generate(self.root, radius=10, padding=5,
+                                               arrow_length=5, arrow_width=5)
+
+        self.filenames = []
+        for num in range(2):
+            (handle, filename) = tempfile.mkstemp(suffix='.png')
+            os.close(handle)
+            self.filenames.append(filename)
+
+    def teardown_method(self, method):
+        for filename in self.filenames:
+            os.remove(filename)
+
+
+class TestPngTiled(PngFixture):
+    def setup_method(self, method):
+        self.image = py.test.importorskip('PIL.Image')
+        from pyggdrasil.export import png, pngtiled
+        self.png = png
+        self.pngtiled = pngtiled
+
+        PngFixture.setup_method(self, method)
+
+    def test_same_as_png(self):
+        progress = []
+        self.png.export(self.graph, self.filenames[0], lambda value: None)
+        self.pngtiled.export(self.graph, self.filenames[1], progress.append,
+                             tilesize=32, processes=2)
+
+        expected = self.image.open(self.filenames[0])
+        tiled = self.image.open(self.filenames[1])
+        assert tiled.size == expected.size
+        for (first, second) in zip(expected.getdata(), tiled.getdata()):
+            assert abs(first - second) <= 8
+
+        assert progress == sorted(progress)
+        assert progress[-1] == 1.0
+
+    def export_in_thread(self):
+        # As the GUI does
+        thread = threading.Thread(target=self.pngtiled.export, args=(
+            self.graph, self.filenames[1], lambda value: None, 32))
+        thread.start()
+        thread.join()
+        self.png.export(self.graph, self.filenames[0], lambda value: None)
+
+        expected = self.image.open(self.filenames[0])
+        tiled = self.image.open(self.filenames[1])
+        for (first, second) in zip(expected.getdata(), tiled.getdata()):
+            assert abs(first - second) <= 8
+
+    def test_prepared_pool(self):
+        pyggdrasil.export.prepare(self.pngtiled)
+        try:
+            pool = self.pngtiled._pool
+            assert pool is not None
+            self.export_in_thread()
+            self.export_in_thread()
+            assert self.pngtiled._pool is pool
+        finally:
+            self.pngtiled._pool.terminate()
+            self.pngtiled._pool = None
+
+    def test_threads_without_pool(self):
+        self.export_in_thread()
+
+
+class TestPngAntialiased(PngFixture):
+    def setup_method(self, method):
+        py.test.importorskip('numpy')
+        self.image = py.test.importorskip('PIL.Image')
+        self.imagedraw = py.test.importorskip('PIL.ImageDraw')
+        from pyggdrasil.export import png, pngaa
+        self.png = png
+        self.pngaa = pngaa
+
+        PngFixture.setup_method(self, method)
+
+    def test_close_to_png(self):
+        progress = []
+        self.png.export(self.graph, self.filenames[0], lambda value: None)
+        self.pngaa.export(self.graph, self.filenames[1], progress.append)
+
+        expected = self.image.open(self.filenames[0])
+        antialiased = self.image.open(self.filenames[1])
+        assert antialiased.size == expected.size
+
+        differences = [abs(first - second) for (first, second)
+                       in zip(expected.getdata(), antialiased.getdata())]
+        assert sum(differences) / float(len(differences)) < 4
+        assert sum(1 for value in differences if value > 64) < len(differences) / 100.0
+
+        assert progress == sorted(progress)
+        assert progress[-1] == 1.0
+
+    def test_labels_measured_once(self):
+        measured = []
+        texts = self.png.texts
+        measure = texts._measure
+        def counting(text, font):
+            measured.append(text)
+            return measure(text, font)
+        texts._measure = counting
+        try:
+            for num in range(2):
+                self.png.export(self.graph, self.filenames[0], lambda value: None)
+                self.pngaa.export(self.graph, self.filenames[1], lambda value: None)
+        finally:
+            texts._measure = measure
+
+        assert len(measured) == len(set(measured))
+        draw = self.imagedraw.Draw(self.image.new('L', (1, 1)))
+        assert texts.extent('the root') == draw.textsize('the root')
+
+    def test_batches_same_as_one_pass(self):
+        self.pngaa.export(self.graph, self.filenames[0], lambda value: None)
+        (linebatch, circlebatch) = (self.pngaa.LINEBATCH, self.pngaa.CIRCLEBATCH)
+        try:
+            self.pngaa.LINEBATCH = 16
+            self.pngaa.CIRCLEBATCH = 1
+            self.pngaa.export(self.graph, self.filenames[1], lambda value: None)
+        finally:
+            (self.pngaa.LINEBATCH, self.pngaa.CIRCLEBATCH) = (linebatch, circlebatch)
+
+        assert list(self.image.open(self.filenames[0]).getdata()) == \
+               list(self.image.open(self.filenames[1]).getdata())
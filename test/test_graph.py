@@ -1,4 +1,9 @@
-from pyggdrasil import graph
+import sys
+from random import Random
+
+import py
+from pyggdrasil import graph, model
+from pyggdrasil.graph import topdown, iterative, tidy, incremental, lod, spatial
 
 
 THRESHOLD = 1e-8
@@ -52,3 +57,460 @@ class TestGraph(object):
         for node in scaled:
             assert_floats(scaled.pos(node), self.graph.pos(node) * value)
 
+
+
+class TestIterative(object):
+    def setup_method(self, method):
+        self.root = model.Node('root', None)
+        self.child1 = model.Node('child1', None, self.root)
+        self.child2 = model.Node('child2', None, self.root)
+        self.child3 = model.Node('child3', None, self.root)
+        for num in range(3):
+            model.Node('grandchild1-%d' % num, None, self.child1)
+        model.Node('grandchild3', None, self.child3)
+
+    def test_same_as_topdown(self):
+        assert iterative.generate(self.root) == list(topdown.generate(self.root))
+
+    def test_deep_chain(self):
+        depth = sys.getrecursionlimit() * 2
+
+        # Built leaf first so that constructing the chain does not recurse
+        leaf = node = model.Node('leaf', None)
+        for num in range(depth):
+            parent = model.Node(str(num), None)
+            node.parent = parent
+            node = parent
+
+        rawgraph = dict(iterative.generate(node))
+        assert rawgraph[leaf] == complex(0.5, depth)
+
+    def test_generate_positional_options(self):
+        unnormalized = graph.generate(self.root, iterative, False, 1.0)
+        assert not unnormalized.normalized
+        assert unnormalized.radius == 1.0
+        assert type(unnormalized) is graph.Graph
+
+
+class TestTidy(object):
+    def setup_method(self, method):
+        # Unbalanced: a wide subtree next to a deep, narrow one
+        self.root = model.Node('root', None)
+        self.wide = model.Node('wide', None, self.root)
+        for num in range(6):
+            model.Node('leaf%d' % num, None, self.wide)
+        self.narrow = model.Node('narrow', None, self.root)
+        node = self.narrow
+        for num in range(4):
+            node = model.Node('chain%d' % num, None, node)
+            model.Node('side%d' % num, None, node)
+
+        random = Random(0)
+        self.randomroot = model.Node('root', None)
+        nodes = [self.randomroot]
+        for num in range(500):
+            nodes.append(model.Node(str(num), None, random.choice(nodes)))
+
+    def width(self, rawgraph):
+        xs = [pos.real for (node, pos) in rawgraph]
+        return max(xs) - min(xs) + 1
+
+    def test_same_order_as_iterative(self):
+        for root in [self.root, self.randomroot]:
+            assert [node for (node, pos) in tidy.generate(root)] == \
+                   [node for (node, pos) in iterative.generate(root)]
+
+    def test_no_overlaps(self):
+        for root in [self.root, self.randomroot]:
+            rawgraph = dict(tidy.generate(root))
+            levels = {}
+            for node in root.preorder():
+                assert rawgraph[node].imag == node.depth
+                levels.setdefault(node.depth, []).append(rawgraph[node].real)
+            for xs in levels.values():
+                for (left, right) in zip(xs, xs[1:]):
+                    assert right - left >= 1 - THRESHOLD
+
+    def test_parents_centred(self):
+        rawgraph = dict(tidy.generate(self.randomroot))
+        for node in self.randomroot.preorder():
+            if node.children:
+                first = rawgraph[node.children[0]]
+                last = rawgraph[node.children[-1]]
+                assert_floats(rawgraph[node].real, (first.real + last.real) / 2)
+
+    def test_narrower_than_iterative(self):
+        for root in [self.root, self.randomroot]:
+            assert self.width(tidy.generate(root)) < self.width(iterative.generate(root))
+
+    def test_generate(self):
+        result = graph.generate(self.root, module=tidy)
+        assert len(result) == self.root.size
+
+    def test_deep_chain(self):
+        depth = sys.getrecursionlimit() * 2
+
+        root = leaf = model.Node('root', None)
+        for num in range(depth):
+            leaf = model.Node(str(num), None, leaf)
+
+        rawgraph = dict(tidy.generate(root))
+        assert rawgraph[leaf] == complex(0, depth)
+
+
+class TestVectorGraph(object):
+    def setup_method(self, method):
+        vector = py.test.importorskip('pyggdrasil.graph.vector')
+
+        self.root = model.Node('root', None)
+        self.child1 = model.Node('child1', None, self.root)
+        self.child2 = model.Node('child2', None, self.root)
+        self.grandchild1 = model.Node('grandchild1', None, self.child1)
+        self.grandchild2 = model.Node('grandchild2', None, self.child1)
+
+        options = dict(radius=40, padding=5, arrow_length=5, arrow_width=4)
+        self.graph = graph.generate(self.root, **options)
+        self.vector = vector.VectorGraph(iterative.generate(self.root), **options)
+
+    def test_same_as_graph(self):
+        assert_floats(self.vector.width, self.graph.width)
+        assert_floats(self.vector.height, self.graph.height)
+        for node in self.graph:
+            assert_floats(self.vector.pos(node), self.graph.pos(node))
+            assert self.vector.hasline(node) == self.graph.hasline(node)
+            if self.graph.hasline(node):
+                assert_floats(self.vector.linedir(node), self.graph.linedir(node))
+                assert_floats(self.vector.linestart(node), self.graph.linestart(node))
+                assert_floats(self.vector.lineend(node), self.graph.lineend(node))
+                for (first, second) in zip(self.vector.arrow_points(node),
+                                           self.graph.arrow_points(node)):
+                    assert_floats(first, second)
+
+    def test_bulk_accessors(self):
+        lines = dict((tuple(line), None) for line in self.graph.lines())
+        assert self.vector.lines().shape == (len(lines), 4)
+        assert self.vector.arrows().shape == (len(lines), 3, 2)
+        for line in self.vector.lines():
+            assert min(sum(abs(a - b) for (a, b) in zip(line, other))
+                       for other in lines) < THRESHOLD
+
+    def test_scale(self):
+        scaled = self.vector.scale(2.5)
+        assert isinstance(scaled, type(self.vector))
+        assert_floats(scaled.width, self.vector.width * 2.5)
+        for node in scaled:
+            assert_floats(scaled.pos(node), self.vector.pos(node) * 2.5)
+
+
+class TestTransition(object):
+    graphclass = graph.Graph
+
+    def setup_method(self, method):
+        self.root = model.Node('root', None)
+        self.child1 = model.Node('child1', None, self.root)
+        self.child2 = model.Node('child2', None, self.root)
+        self.grandchild1 = model.Node('grandchild1', None, self.child1)
+
+        options = dict(radius=40, padding=5)
+        self.start = graph.generate(self.root, graphclass=self.graphclass, **options)
+        self.basestart = graph.generate(self.root, **options)
+        self.child1.parent = None
+        self.added = model.Node('added', None, self.child2)
+        self.end = graph.generate(self.root, graphclass=self.graphclass, **options)
+        self.baseend = graph.generate(self.root, **options)
+
+        self.transition = self.transition_class(self.start, self.end)
+
+    def transition_class(self, startgraph, endgraph):
+        return graph.Transition(startgraph, endgraph)
+
+    def test_ends(self):
+        first = self.transition.frame(0)
+        last = self.transition.frame(1)
+
+        assert_floats(first.width, self.start.width)
+        assert_floats(first.height, self.start.height)
+        for node in self.start:
+            assert_floats(first.pos(node), self.start.pos(node))
+        assert_floats(first.pos(self.added), self.start.pos(self.child2))
+
+        assert_floats(last.width, self.end.width)
+        assert_floats(last.height, self.end.height)
+        for node in self.end:
+            assert_floats(last.pos(node), self.end.pos(node))
+
+    def test_keeps_removed_nodes(self):
+        frame = self.transition.frame(0.5)
+        assert set(frame) == set(self.start) | set(self.end)
+        assert frame.hasline(self.added)
+
+    def test_removed_nodes_follow_old_parent(self):
+        last = self.transition.frame(1)
+        assert_floats(last.pos(self.child1), last.pos(self.root))
+        assert_floats(last.pos(self.grandchild1), last.pos(self.root))
+        assert last.hasline(self.child1)
+
+    def test_same_as_function(self):
+        frame = self.transition.frame(0.25)
+        expected = graph.transition(self.start, self.end, 0.25)
+        for node in self.end:
+            assert_floats(frame.pos(node) - frame.pos(self.root),
+                          expected.pos(node) - expected.pos(self.root))
+
+
+class TestTransitionVector(TestTransition):
+    def setup_method(self, method):
+        self.vector = py.test.importorskip('pyggdrasil.graph.vector')
+        self.graphclass = self.vector.VectorGraph
+        TestTransition.setup_method(self, method)
+
+    def transition_class(self, startgraph, endgraph):
+        return self.vector.Transition(startgraph, endgraph)
+
+    def test_same_as_graph(self):
+        # The same change through the reference Transition
+        expected = graph.Transition(self.basestart, self.baseend)
+        for weight in (0, 0.5, 1):
+            frame = self.transition.frame(weight)
+            expectedframe = expected.frame(weight)
+            assert set(frame) == set(expectedframe)
+            for node in frame:
+                assert_floats(frame.pos(node) - frame.pos(self.root),
+                              expectedframe.pos(node) - expectedframe.pos(self.root))
+                assert frame.hasline(node) == expectedframe.hasline(node)
+
+
+class TestIncremental(object):
+    graphclass = graph.Graph
+
+    def setup_method(self, method):
+        self.root = model.Node('root', None)
+        self.child1 = model.Node('child1', None, self.root)
+        self.child2 = model.Node('child2', None, self.root)
+        self.child3 = model.Node('child3', None, self.root)
+        self.grandchild1 = model.Node('grandchild1', None, self.child1)
+        self.grandchild2 = model.Node('grandchild2', None, self.child1)
+        self.grandchild3 = model.Node('grandchild3', None, self.child3)
+
+        self.graph = graph.generate(self.root, graphclass=self.graphclass,
+                                    radius=40, padding=5)
+
+    def assert_relayout(self, changes):
+        relayout = incremental.relayout(self.graph, changes)
+        expected = graph.generate(self.root, radius=40, padding=5)
+
+        assert isinstance(relayout, self.graphclass)
+        assert_floats(relayout.width, expected.width)
+        assert_floats(relayout.height, expected.height)
+        assert set(relayout) == set(expected)
+        for node in expected:
+            assert_floats(relayout.pos(node), expected.pos(node))
+
+    def test_add_leaf_to_leaf(self):
+        node = model.Node('new', None, self.child2)
+        self.assert_relayout([incremental.Added(node)])
+
+    def test_add_leaf_to_parent(self):
+        node = model.Node('new', None, self.child1)
+        self.assert_relayout([incremental.Added(node)])
+
+    def test_add_first_child(self):
+        node = model.Node('new', None, self.root)
+        self.root.children.remove(node)
+        self.root.children.insert(0, node)
+        self.assert_relayout([incremental.Added(node)])
+
+    def test_remove(self):
+        self.child1.parent = None
+        self.assert_relayout([incremental.Removed(self.child1, self.root)])
+
+    def test_remove_only_child(self):
+        self.grandchild3.parent = None
+        self.assert_relayout([incremental.Removed(self.grandchild3, self.child3)])
+
+    def test_move(self):
+        self.child1.parent = self.child2
+        self.assert_relayout([incremental.Moved(self.child1, self.root)])
+
+    def test_sort(self):
+        self.root.children.reverse()
+        self.child1.children.reverse()
+        self.assert_relayout([incremental.Sorted(self.root)])
+
+    def test_move_and_sort(self):
+        self.grandchild3.parent = self.child1
+        self.child1.children.reverse()
+        self.assert_relayout([incremental.Moved(self.grandchild3, self.child3),
+                              incremental.Sorted(self.child1)])
+
+
+class TestIncrementalVector(TestIncremental):
+    def setup_method(self, method):
+        vector = py.test.importorskip('pyggdrasil.graph.vector')
+        self.graphclass = vector.VectorGraph
+        TestIncremental.setup_method(self, method)
+
+
+class TestSpatialIndex(object):
+    def setup_method(self, method):
+        random = Random(4)
+        nodes = [model.Node('root', None)]
+        for num in range(300):
+            nodes.append(model.Node(str(num), None, random.choice(nodes)))
+
+        self.graph = graph.generate(nodes[0], radius=40, padding=5,
+                                    arrow_length=5, arrow_width=5)
+        self.index = spatial.SpatialIndex(self.graph)
+        self.box = (self.graph.width / 3.0, 100, self.graph.width / 2.0, 400)
+
+    def test_nodeat(self):
+        for node in self.graph:
+            pos = self.graph.pos(node)
+            assert self.index.nodeat(pos.real + 30, pos.imag - 30) is node
+        assert self.index.nodeat(-1, -1) is None
+
+    def test_nodes(self):
+        (x1, y1, x2, y2) = self.box
+        radius = self.graph.radius
+        expected = set(node for node in self.graph
+                       if x1 - radius <= self.graph.pos(node).real <= x2 + radius and
+                          y1 - radius <= self.graph.pos(node).imag <= y2 + radius)
+        assert expected
+        assert set(self.index.nodes(self.box)) == expected
+
+    def test_edges(self):
+        (x1, y1, x2, y2) = self.box
+        edges = dict((node, line) for (node, line, arrow) in self.index.edges(self.box))
+        for (node, line) in zip([node for node in self.graph if self.graph.hasline(node)],
+                                self.graph.lines()):
+            inside = min(line[0], line[2]) <= x2 and x1 <= max(line[0], line[2]) and \
+                     min(line[1], line[3]) <= y2 and y1 <= max(line[1], line[3])
+            if inside:
+                assert edges[node] == tuple(line)
+
+
+class TestSpatialIndexUpdate(object):
+    graphclass = graph.Graph
+
+    def setup_method(self, method):
+        random = Random(4)
+        self.nodes = [model.Node('root', None)]
+        for num in range(300):
+            self.nodes.append(model.Node(str(num), None, random.choice(self.nodes)))
+
+        self.options = dict(radius=40, padding=5, arrow_length=5, arrow_width=5)
+        self.graph = graph.generate(self.nodes[0], graphclass=self.graphclass,
+                                    **self.options)
+        self.index = spatial.SpatialIndex(self.graph)
+        self.everything = (-1, -1, self.graph.width * 2, self.graph.height * 2)
+
+    def assert_same(self, index, expected):
+        assert set(index.nodes(self.everything)) == set(expected.nodes(self.everything))
+        assert sorted(index.edges(self.everything)) == \
+               sorted(expected.edges(self.everything))
+        for node in index.graph:
+            pos = index.graph.pos(node)
+            assert index.nodeat(pos.real, pos.imag) is node
+
+    def test_update_few_moved(self):
+        list(self.index.nodes(self.everything))
+        list(self.index.edges(self.everything))
+
+        leaf = self.nodes[-1]
+        parent = leaf.parent
+        leaf.parent = None
+        changed = incremental.relayout(self.graph, [incremental.Removed(leaf, parent)])
+        index = self.index.update(changed)
+        self.assert_same(index, spatial.SpatialIndex(changed))
+
+        # Shares the R-trees, with only the moved nodes indexed again
+        assert index._base is self.index._base
+        assert 0 < len(index._moved[0]) < len(changed)
+
+    def test_update_everything_moved(self):
+        list(self.index.nodes(self.everything))
+        scaled = self.graph.scale(2)
+        index = self.index.update(scaled)
+        self.assert_same(index, spatial.SpatialIndex(scaled))
+        assert index._base is not self.index._base
+
+    def test_update_unbuilt(self):
+        index = self.index.update(self.graph.scale(2)).update(self.graph)
+        self.assert_same(index, self.index)
+
+
+class TestSpatialIndexUpdateVector(TestSpatialIndexUpdate):
+    def setup_method(self, method):
+        vector = py.test.importorskip('pyggdrasil.graph.vector')
+        self.graphclass = vector.VectorGraph
+        TestSpatialIndexUpdate.setup_method(self, method)
+
+
+class TestDetail(object):
+    def setup_method(self, method):
+        self.root = model.Node('root', None)
+        self.child1 = model.Node('child1', None, self.root)
+        self.child2 = model.Node('child2', None, self.root)
+        for num in range(50):
+            model.Node('grandchild%d' % num, None, self.child1)
+
+        self.graph = graph.generate(self.root, radius=40, padding=5, arrow_length=5)
+
+    def test_full_detail(self):
+        detail = lod.Detail(self.graph)
+        assert detail.labels and detail.arrows and not detail.clustered
+        (nodes, clusters) = detail.visible((0, 0, self.graph.width, self.graph.height))
+        assert set(nodes) == set(self.graph)
+        assert clusters == []
+
+    def test_thresholds(self):
+        detail = lod.Detail(self.graph.scale(0.05))
+        assert not detail.labels
+        assert detail.arrows is False
+        assert not detail.clustered
+
+    def test_tree_as_laid_out(self):
+        self.child1.children[0].parent = self.child2
+        detail = lod.Detail(self.graph.scale(0.01))
+        assert detail._counts[self.child1] == 51
+        assert detail._counts[self.child2] == 1
+        assert detail._roots == [self.root]
+
+    def test_collapse_dense_subtree(self):
+        small = self.graph.scale(0.01)
+        detail = lod.Detail(small)
+        assert detail.clustered
+        assert detail.collapsed(self.root)
+
+        (nodes, clusters) = detail.visible((0, 0, small.width, small.height))
+        assert nodes == []
+        (node, (x1, y1, x2, y2)) = clusters[0]
+        assert node is self.root
+        assert x2 - x1 <= small.width and y2 - y1 <= small.height
+
+    def test_collapse_only_dense_parts(self):
+        root = model.Node('root', None)
+        chain = node = model.Node('chain', None, root)
+        for num in range(20):
+            node = model.Node(str(num), None, node)
+        bush = model.Node('bush', None, root)
+        for num in range(500):
+            model.Node(str(num), None, bush)
+
+        scaled = graph.generate(root, radius=40, padding=5).scale(0.01)
+        detail = lod.Detail(scaled)
+        (nodes, clusters) = detail.visible((0, 0, scaled.width, scaled.height))
+
+        assert nodes == [root]
+        assert set(node for (node, box) in clusters) == set([chain, bush])
+
+    def test_visible_box(self):
+        small = self.graph.scale(0.03)
+        detail = lod.Detail(small)
+        pos = small.pos(self.child2)
+        box = (pos.real - 0.1, pos.imag - 0.1, pos.real + 0.1, pos.imag + 0.1)
+
+        (nodes, clusters) = detail.visible(box)
+        assert self.child2 in nodes
+        assert self.child1 not in nodes
+        assert [node for (node, box) in clusters] == []
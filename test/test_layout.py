@@ -0,0 +1,96 @@
+import threading
+
+import py
+from pyggdrasil import graph, layout, model
+
+
+class TestLayout(object):
+    def setup_method(self, method):
+        self.root = model.Node('root', None)
+        self.child1 = model.Node('child1', None, self.root)
+        self.child2 = model.Node('child2', None, self.root)
+        self.grandchild = model.Node('grandchild', None, self.child1)
+
+        self.options = dict(radius=40, padding=5)
+        self.results = []
+        self.done = threading.Event()
+
+    def callback(self, graph, generation):
+        self.results.append((graph, generation))
+        self.done.set()
+
+    def test_snapshot(self):
+        tree = layout.snapshot(self.root)
+        assert [node.id for node in tree.unroll()] == \
+               [node.id for node in self.root.unroll()]
+        assert [node.node for node in tree.unroll()] == list(self.root.unroll())
+
+        self.grandchild.parent = self.child2
+        assert tree.children[0].children[0].node is self.grandchild
+        assert tree.children[1].children == ()
+
+    def test_layout_same_as_generate(self):
+        expected = graph.generate(self.root, **self.options)
+        result = layout.layout(layout.snapshot(self.root), **self.options)
+        assert sorted(result, key=id) == sorted(expected, key=id)
+        for node in expected:
+            assert result.pos(node) == expected.pos(node)
+            assert result.hasline(node) == expected.hasline(node)
+
+    def test_layout_vector(self):
+        vector = py.test.importorskip('pyggdrasil.graph.vector')
+        expected = graph.generate(self.root, graphclass=vector.VectorGraph, **self.options)
+        result = layout.layout(layout.snapshot(self.root), graphclass=vector.VectorGraph,
+                               **self.options)
+        assert result.nodes == expected.nodes
+        assert list(result.parents) == list(expected.parents)
+        assert self.grandchild in result
+
+    def test_detach(self):
+        expected = graph.generate(self.root, **self.options)
+        detached = layout.detach(expected)
+        assert self.root not in detached
+        for node in detached:
+            assert detached.pos(node) == expected.pos(node.data)
+            assert detached.hasline(node) == expected.hasline(node.data)
+
+        self.grandchild.parent = self.child2
+        for node in detached:
+            if node.data is self.grandchild:
+                assert node.parent.data is self.child1
+
+    def test_request(self):
+        service = layout.LayoutService(self.callback)
+        try:
+            generation = service.request(self.root, **self.options)
+            assert self.done.wait(5)
+        finally:
+            service.close()
+
+        [(result, resultgeneration)] = self.results
+        assert resultgeneration == generation
+        assert self.grandchild in result
+
+    def test_stale_requests_dropped(self):
+        service = layout.LayoutService(self.callback)
+        try:
+            # Hold the worker until every request is in
+            with service._condition:
+                for i in range(3):
+                    generation = service.request(self.root, **self.options)
+            assert self.done.wait(5)
+        finally:
+            service.close()
+
+        assert [result[1] for result in self.results] == [generation]
+
+    def test_cancel(self):
+        service = layout.LayoutService(self.callback)
+        try:
+            with service._condition:
+                service.request(self.root, **self.options)
+                service.cancel()
+            assert not self.done.wait(0.2)
+        finally:
+            service.close()
+        assert self.results == []
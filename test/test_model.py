@@ -1,3 +1,5 @@
+import sys
+
 import py
 import pyggdrasil
 
@@ -30,6 +32,78 @@ class TestNode(object):
         assert nodes[3] == self.grandchild1
         assert len(nodes) == 4
 
+    def test_unroll_deeper_tree(self):
+        grandchild2 = pyggdrasil.model.Node('grandchild duo', None, self.child2)
+        greatgrandchild1 = pyggdrasil.model.Node('great', None, self.grandchild1)
+        greatgrandchild2 = pyggdrasil.model.Node('great', None, grandchild2)
+
+        assert list(self.root.unroll()) == [
+            self.root, self.child1, self.child2,
+            self.grandchild1, greatgrandchild1,
+            grandchild2, greatgrandchild2,
+        ]
+
+    def test_unroll_deep_chain(self):
+        node = self.grandchild1
+        for num in range(sys.getrecursionlimit() * 2):
+            node = pyggdrasil.model.Node(str(num), None, node)
+
+        nodes = list(self.root.unroll())
+        assert len(nodes) == sys.getrecursionlimit() * 2 + 4
+        assert nodes[-1] is node
+
+    def test_traversals(self):
+        grandchild2 = pyggdrasil.model.Node('grandchild duo', None, self.child2)
+        greatgrandchild1 = pyggdrasil.model.Node('great', None, self.grandchild1)
+
+        assert list(self.root.breadthfirst()) == [
+            self.root, self.child1, self.child2,
+            self.grandchild1, grandchild2, greatgrandchild1,
+        ]
+        assert list(self.root.preorder()) == [
+            self.root, self.child1, self.grandchild1, greatgrandchild1,
+            self.child2, grandchild2,
+        ]
+        assert list(self.root.postorder()) == [
+            greatgrandchild1, self.grandchild1, self.child1,
+            grandchild2, self.child2, self.root,
+        ]
+
+    def test_stats(self):
+        assert (self.root.size, self.root.leaves, self.root.height) == (4, 2, 2)
+        assert (self.child1.size, self.child1.leaves, self.child1.height) == (2, 1, 1)
+        assert (self.child2.size, self.child2.leaves, self.child2.height) == (1, 1, 0)
+
+    def test_stats_after_changes(self):
+        assert self.root.size == 4
+
+        pyggdrasil.model.Node('grandchild duo', None, self.child2)
+        assert (self.root.size, self.root.leaves) == (5, 2)
+
+        self.grandchild1.parent = self.child2
+        assert (self.root.size, self.root.leaves, self.root.height) == (5, 3, 2)
+        assert (self.child1.size, self.child1.leaves, self.child1.height) == (1, 1, 0)
+        assert (self.child2.size, self.child2.leaves) == (3, 2)
+
+        self.child2.parent = None
+        assert (self.root.size, self.root.leaves, self.root.height) == (2, 1, 1)
+        assert self.child2.size == 3
+
+    def test_stats_invalidate(self):
+        assert self.root.size == 4
+
+        self.child1.children.remove(self.grandchild1)
+        self.child1.invalidate()
+        assert (self.root.size, self.root.height) == (3, 1)
+
+    def test_stats_deep_chain(self):
+        node = self.child2
+        for num in range(sys.getrecursionlimit() * 2):
+            node = pyggdrasil.model.Node(str(num), None, node)
+
+        assert self.root.height == sys.getrecursionlimit() * 2 + 1
+        assert self.root.leaves == 2
+
     def test_hasancestor(self):
         assert self.grandchild1.hasancestor(self.child1)
         assert self.grandchild1.hasancestor(self.root)
@@ -39,3 +113,196 @@ class TestNode(object):
         py.test.raises(pyggdrasil.model.CircularTreeException,
                        'self.root.parent = self.grandchild1')
 
+
+    def test_reject_self_as_parent(self):
+        py.test.raises(pyggdrasil.model.CircularTreeException,
+                       setattr, self.child1, 'parent', self.child1)
+
+    def test_depth(self):
+        assert self.root.depth == 0
+        assert self.child2.depth == 1
+        assert self.grandchild1.depth == 2
+
+    def test_reparent_updates_ancestry(self):
+        self.child1.parent = self.child2
+
+        assert self.grandchild1.depth == 3
+        assert self.grandchild1.hasancestor(self.child2)
+        py.test.raises(pyggdrasil.model.CircularTreeException,
+                       setattr, self.child2, 'parent', self.grandchild1)
+
+    def test_hasancestor_deep_chain(self):
+        nodes = [self.root]
+        for num in range(sys.getrecursionlimit() * 2):
+            nodes.append(pyggdrasil.model.Node(str(num), None, nodes[-1]))
+
+        for (num, node) in enumerate(nodes):
+            assert nodes[-1].hasancestor(node) == (node is not nodes[-1])
+            assert not node.hasancestor(self.child2)
+        assert nodes[1].hasancestor(self.root)
+        assert not nodes[1].hasancestor(nodes[2])
+
+    def test_reparent_walks_subtree(self):
+        # Attaching a new node is constant work, reparenting revisits every
+        # node below it to refresh depths and jump pointers.
+        Node = pyggdrasil.model.Node
+        updated = []
+        setancestry = Node._setancestry
+        def record(node):
+            updated.append(node)
+            setancestry(node)
+        Node._setancestry = record
+        try:
+            leaf = Node('leaf', None, self.grandchild1)
+            assert updated == [leaf]
+
+            del updated[:]
+            self.child1.parent = self.child2
+            assert updated == [self.child1, self.grandchild1, leaf]
+        finally:
+            Node._setancestry = setancestry
+        assert leaf.depth == 4
+
+
+class TestFrozen(object):
+    def setup_method(self, method):
+        self.root = pyggdrasil.model.Node('root', 'data')
+        self.child1 = pyggdrasil.model.Node('child1', None, self.root)
+        self.child2 = pyggdrasil.model.Node('child2', None, self.root)
+        self.grandchild1 = pyggdrasil.model.Node('grandchild1', None, self.child1)
+        self.grandchild2 = pyggdrasil.model.Node('grandchild2', None, self.child2)
+
+    def test_freeze(self):
+        frozen = self.root.freeze()
+        assert [node.id for node in frozen.unroll()] == \
+               [node.id for node in self.root.unroll()]
+        assert [node.node for node in frozen.preorder()] == list(self.root.preorder())
+        assert frozen.data == 'data'
+        assert (frozen.size, frozen.leaves, frozen.height) == (5, 2, 2)
+
+    def test_immutable(self):
+        frozen = self.root.freeze()
+        py.test.raises(AttributeError, setattr, frozen, 'id', 'other')
+        py.test.raises(AttributeError, setattr, frozen, 'size', 1)
+        py.test.raises(AttributeError, delattr, frozen, 'data')
+        py.test.raises(AttributeError, setattr, frozen, 'parent', None)
+        assert (frozen.id, frozen.data, frozen.size) == ('root', 'data', 5)
+
+    def test_unchanged_is_same_version(self):
+        assert self.root.freeze() is self.root.freeze()
+
+    def test_reparent_shares_unchanged_subtrees(self):
+        before = self.root.freeze()
+        self.grandchild1.parent = self.child2
+        after = self.root.freeze()
+
+        assert [node.id for node in before.unroll()] == \
+               ['root', 'child1', 'child2', 'grandchild1', 'grandchild2']
+        assert [node.id for node in after.children[1].children] == \
+               ['grandchild2', 'grandchild1']
+        assert after.children[1].children[1] is before.children[0].children[0]
+        assert after.children[1].children[0] is before.children[1].children[0]
+
+    def test_rename(self):
+        before = self.root.freeze()
+        self.grandchild1.id = 'renamed'
+        after = self.root.freeze()
+        assert before.children[0].children[0].id == 'grandchild1'
+        assert after.children[0].children[0].id == 'renamed'
+        assert after.children[1] is before.children[1]
+
+    def test_sort(self):
+        self.root.sort(key=lambda id: id != 'child2')
+        before = self.root.freeze()
+        self.root.sort(key=lambda id: id != 'child2')
+        assert self.root.freeze() is before
+
+        self.root.sort()
+        after = self.root.freeze()
+        assert [node.id for node in after.children] == ['child1', 'child2']
+        assert after.children[0] is before.children[1]
+
+    def test_thaw(self):
+        frozen = self.root.freeze()
+        thawed = frozen.thaw()
+        assert [node.id for node in thawed.unroll()] == \
+               [node.id for node in self.root.unroll()]
+        assert thawed.children[0].parent is thawed
+        assert thawed.freeze() is not frozen
+        assert thawed.size == 5
+
+
+class TestLazyNode(object):
+    def setup_method(self, method):
+        self.loaded = []
+        self.root = pyggdrasil.model.LazyNode('the root', None, loader=self.load)
+
+    def load(self, node):
+        self.loaded.append(node)
+        if node.id.count(' ') < 3:
+            for num in range(2):
+                pyggdrasil.model.LazyNode('%s %d' % (node.id, num), None, node, self.load)
+
+    def test_load_on_access(self):
+        assert not self.root.loaded
+        assert self.loaded == []
+
+        children = self.root.children
+        assert self.root.loaded
+        assert self.loaded == [self.root]
+        assert [child.id for child in children] == ['the root 0', 'the root 1']
+        assert children[0].parent is self.root
+        assert children[0].depth == 1
+
+        assert self.root.children is children
+        assert self.loaded == [self.root]
+
+    def test_reparent_does_not_load(self):
+        (first, second) = self.root.children
+        first.parent = second
+
+        assert not first.loaded
+        assert first.children[0].depth == 3
+        assert first.children[0].hasancestor(second)
+
+    def test_assign_children(self):
+        self.root.children = []
+
+        assert self.root.loaded
+        assert self.loaded == []
+
+    def test_assign_children_invalidates(self):
+        (first, second) = self.root.children
+        assert self.root.size == 7
+        frozen = self.root.freeze()
+
+        first.children = []
+        assert self.root.size == 5
+        assert self.root.height == 2
+        assert self.root.freeze() is not frozen
+        assert self.root.freeze().size == 5
+
+
+class TestItemDict(object):
+    def setup_method(self, method):
+        self.dict = pyggdrasil.model.ItemDict(keyfunc=tuple)
+        self.node = pyggdrasil.model.Node('node', None)
+        self.dict[[1, 2]] = self.node
+
+    def test_lookup_unhashable_key(self):
+        assert self.dict[[1, 2]] is self.node
+        assert self.dict.getkey(self.node) == [1, 2]
+
+    def test_replace_value(self):
+        other = pyggdrasil.model.Node('other', None)
+        self.dict[[1, 2]] = other
+
+        assert self.dict[[1, 2]] is other
+        py.test.raises(KeyError, self.dict.getkey, self.node)
+
+    def test_same_value_under_two_keys(self):
+        self.dict[[3]] = self.node
+        del self.dict[[1, 2]]
+
+        assert self.dict.getkey(self.node) == [3]
+        py.test.raises(KeyError, self.dict.__getitem__, [1, 2])
@@ -1,3 +1,9 @@
+import StringIO
+import sys
+
+import py
+import yaml
+
 import pyggdrasil
 
 
@@ -32,3 +38,169 @@ class TestNode(object):
 
         assert_equal_nodes(root, self.root)
         assert graphoptions == self.graphoptions
+
+    def test_dump_and_load(self):
+        stream = StringIO.StringIO()
+        pyggdrasil.serialize.dump(stream, self.root, self.graphoptions)
+        stream.seek(0)
+        root, graphoptions = pyggdrasil.serialize.load(stream)
+
+        assert_equal_nodes(root, self.root)
+        assert graphoptions == self.graphoptions
+
+    def test_dump_and_load_python_types(self):
+        data = {'tuple': (1, (2, 3)), 'complex': [2j, 1.5-0.5j, complex(3, 0)],
+                'long': 10**30, 'small long': 5L, 'bytes': '\xff'}
+        pyggdrasil.model.Node('python types', data, self.root)
+        stream = StringIO.StringIO()
+        pyggdrasil.serialize.dump(stream, self.root, self.graphoptions)
+        stream.seek(0)
+        root, graphoptions = pyggdrasil.serialize.load(stream)
+
+        loaded = root.children[2].data
+        assert loaded == data
+        assert type(loaded['tuple']) is tuple
+        assert type(loaded['tuple'][1]) is tuple
+        assert type(loaded['small long']) is long
+
+    def test_load_unicode_tags(self):
+        stream = StringIO.StringIO(
+            "data: {!!python/unicode 'root': null}\n"
+            "options: {}\n"
+            "structure: {!!python/unicode 'root': []}\n")
+        root, graphoptions = pyggdrasil.serialize.load(stream)
+
+        assert root.id == u'root'
+
+    def test_load_old_format(self):
+        # What the default Dumper wrote before the safe Dumper was used
+        self.root.data = (1, 2L**70, u'caf\xe9', 'caf\xc3\xa9', None)
+        self.child1.data = {'nested': [(1.5, 2j), True]}
+        self.child2.id = u'child duo'
+        raw = pyggdrasil.serialize.toraw(self.root, self.graphoptions)
+        text = yaml.dump(raw, Dumper=yaml.Dumper)
+        for tag in ['python/tuple', 'python/str', 'python/unicode', 'python/complex']:
+            assert '!!' + tag in text
+
+        root, graphoptions = pyggdrasil.serialize.load(StringIO.StringIO(text))
+        assert_equal_nodes(root, self.root)
+        assert type(root.data) is tuple
+        assert type(root.data[2]) is unicode
+        assert type(root.data[3]) is str
+
+    def test_load_old_scalar_tags(self):
+        # Older PyYAML versions tagged longs and plain strs too
+        stream = StringIO.StringIO(
+            "data: {!!python/str 'root': !!python/long '12'}\n"
+            "options: {}\n"
+            "structure: {!!python/str 'root': []}\n")
+        root, graphoptions = pyggdrasil.serialize.load(stream)
+
+        assert root.id == 'root'
+        assert root.data == 12L and type(root.data) is long
+
+    def test_reject_python_objects(self):
+        stream = StringIO.StringIO(
+            "data: {root: !!python/object/apply:os.getcwd []}\n"
+            "options: {}\n"
+            "structure: {root: []}\n")
+        with py.test.raises(yaml.constructor.ConstructorError):
+            pyggdrasil.serialize.load(stream)
+
+    def test_dump_same_node_ids(self):
+        self.child2.id = self.root.id
+        self.grandchild1.id = self.root.id
+
+        stream = StringIO.StringIO()
+        pyggdrasil.serialize.dump(stream, self.root, self.graphoptions)
+        stream.seek(0)
+        root, graphoptions = pyggdrasil.serialize.load(stream)
+
+        assert_equal_nodes(root, self.root)
+
+    def test_dump_deep_tree(self):
+        node = self.child2
+        for num in range(sys.getrecursionlimit() * 2):
+            node = pyggdrasil.model.Node('node %d' % num, None, node)
+
+        stream = StringIO.StringIO()
+        pyggdrasil.serialize.dump(stream, self.root, self.graphoptions)
+        stream.seek(0)
+        root, graphoptions = pyggdrasil.serialize.load(stream)
+
+        node = root.children[1]
+        while node.children:
+            node = node.children[0]
+        assert node.id == 'node %d' % (sys.getrecursionlimit() * 2 - 1)
+
+
+class TestBinary(object):
+    def setup_method(self, method):
+        self.root = pyggdrasil.model.Node('the root', 'test data')
+        self.child1 = pyggdrasil.model.Node('child uno', {'some': ['test']}, self.root)
+        self.child2 = pyggdrasil.model.Node(u'child d\xfco', None, self.root)
+        self.grandchild1 = pyggdrasil.model.Node('the root', 'test data', self.child1)
+        self.graphoptions = pyggdrasil.model.Options()
+
+    def roundtrip(self, root):
+        stream = StringIO.StringIO()
+        pyggdrasil.serialize.dumpbinary(stream, root, self.graphoptions)
+        stream.seek(0)
+        return pyggdrasil.serialize.loadbinary(stream)
+
+    def test_dump_and_load(self):
+        root, graphoptions = self.roundtrip(self.root)
+
+        assert_equal_nodes(root, self.root)
+        assert len(list(root.unroll())) == 4
+        assert graphoptions == self.graphoptions
+
+    def test_data_is_not_shared(self):
+        pyggdrasil.model.Node('child tres', {'some': ['test']}, self.root)
+        root, graphoptions = self.roundtrip(self.root)
+
+        assert root.children[0].data == root.children[2].data
+        assert root.children[0].data is not root.children[2].data
+
+    def test_reject_data_json_changes(self):
+        for data in [(1, 2), [2j], '\xff', {1: 'one'}]:
+            self.child2.data = data
+            stream = StringIO.StringIO()
+            py.test.raises(ValueError, pyggdrasil.serialize.dumpbinary,
+                           stream, self.root, self.graphoptions)
+            assert stream.getvalue() == ''
+
+    def test_deep_tree(self):
+        node = self.child2
+        for num in range(sys.getrecursionlimit() * 2):
+            node = pyggdrasil.model.Node('node %d' % num, None, node)
+        root, graphoptions = self.roundtrip(self.root)
+
+        node = root.children[1]
+        while node.children:
+            node = node.children[0]
+        assert node.id == 'node %d' % (sys.getrecursionlimit() * 2 - 1)
+        assert node.depth == sys.getrecursionlimit() * 2 + 1
+
+    def test_load_lazy(self):
+        stream = StringIO.StringIO()
+        pyggdrasil.serialize.dumpbinary(stream, self.root, self.graphoptions)
+        stream.seek(0)
+        root, graphoptions = pyggdrasil.serialize.loadlazy(stream, depth=1)
+
+        assert root.loaded
+        assert not root.children[0].loaded
+        assert graphoptions == self.graphoptions
+
+        assert_equal_nodes(root, self.root)
+        assert root.children[0].children[0].parent is root.children[0]
+
+    def test_bad_magic(self):
+        stream = StringIO.StringIO('PYGX' + '\0' * 32)
+        py.test.raises(pyggdrasil.serialize.NodeParseException,
+                       pyggdrasil.serialize.loadbinary, stream)
+
+    def test_isbinary(self):
+        assert pyggdrasil.serialize.isbinary('tree.pygb')
+        assert pyggdrasil.serialize.isbinary('TREE.PYGB')
+        assert not pyggdrasil.serialize.isbinary('tree.pyg')
@@ -0,0 +1,180 @@
+import StringIO
+import operator
+
+import py
+import pyggdrasil
+from pyggdrasil.export import svg
+
+
+class TestStoreNode(object):
+    def setup_method(self, method):
+        self.store = pyggdrasil.store.TreeStore()
+        self.root = self.store.add('the root', 'test data')
+        self.child1 = self.store.add('child uno', 'some test', self.root)
+        self.child2 = self.store.add('child duo', 'uber test', self.root)
+        self.grandchild1 = self.store.add('child fool', 'uber test', self.child1)
+
+    def test_same_proxy(self):
+        assert self.root.children[0] is self.child1
+        assert self.grandchild1.parent is self.child1
+        assert self.store.node(0) is self.root
+        assert len(self.store) == 4
+
+    def test_attributes(self):
+        self.child1.id = 'child one'
+        self.child1.data = 'other test'
+
+        assert self.child1.id == 'child one'
+        assert self.child1.data == 'other test'
+        assert self.child2.id == 'child duo'
+
+    def test_unroll_in_order_of_node_then_children_then_descendents(self):
+        assert list(self.root.unroll()) == [self.root, self.child1, self.child2,
+                                            self.grandchild1]
+
+    def test_reparent(self):
+        self.child1.parent = self.child2
+
+        assert self.root.children == (self.child2,)
+        assert self.child2.children == (self.child1,)
+        assert self.grandchild1.depth == 3
+        assert self.grandchild1.hasancestor(self.child2)
+
+    def test_children_read_only(self):
+        py.test.raises(AttributeError, getattr, self.root.children, 'append')
+        py.test.raises(TypeError, operator.delitem, self.root.children, 0)
+        assert self.root.children == (self.child1, self.child2)
+
+    def test_detach(self):
+        self.child1.parent = None
+
+        assert self.root.children == (self.child2,)
+        assert self.child1.parent is None
+        assert self.grandchild1.depth == 1
+        assert not self.grandchild1.hasancestor(self.root)
+
+    def test_stats(self):
+        assert (self.root.size, self.root.leaves, self.root.height) == (4, 2, 2)
+
+        self.grandchild1.parent = self.child2
+        assert (self.root.size, self.root.leaves, self.root.height) == (4, 2, 2)
+        assert (self.child1.size, self.child1.leaves, self.child1.height) == (1, 1, 0)
+
+        self.child2.parent = None
+        assert (self.root.size, self.root.leaves, self.root.height) == (2, 1, 1)
+        assert (self.child2.size, self.child2.leaves) == (2, 1)
+
+    def test_hasancestor_deep(self):
+        chain = [self.grandchild1]
+        for num in range(100):
+            chain.append(self.store.add('node %d' % num, None, chain[-1]))
+
+        for (depth, node) in enumerate(chain):
+            assert node.depth == depth + 2
+            assert node.hasancestor(self.root)
+            assert node.hasancestor(self.child1)
+            assert not node.hasancestor(self.child2)
+        assert chain[-1].hasancestor(chain[37])
+        assert not chain[37].hasancestor(chain[-1])
+
+        chain[50].parent = self.child2
+        assert chain[-1].depth == 52
+        assert chain[-1].hasancestor(self.child2)
+        assert chain[-1].hasancestor(chain[50])
+        assert not chain[-1].hasancestor(chain[49])
+        assert not chain[-1].hasancestor(self.child1)
+
+        chain[50].parent = None
+        assert chain[-1].depth == 50
+        assert chain[-1].hasancestor(chain[50])
+        assert not chain[-1].hasancestor(self.root)
+
+    def test_rename_releases_ids(self):
+        for num in range(100):
+            self.child1.id = 'name %d' % num
+        assert self.child1.id == 'name 99'
+        assert len(self.store._stringindex) == 4
+
+        self.child2.id = 'the root'
+        self.root.id = 'child duo'
+        assert (self.root.id, self.child2.id) == ('child duo', 'the root')
+        assert len(self.store._strings) <= 5
+
+    def test_reject_circular_tree(self):
+        py.test.raises(pyggdrasil.model.CircularTreeException,
+                       setattr, self.root, 'parent', self.grandchild1)
+        py.test.raises(pyggdrasil.model.CircularTreeException,
+                       setattr, self.root, 'parent', self.root)
+
+    def test_sort(self):
+        self.root.sort()
+        assert self.root.children == (self.child2, self.child1)
+
+        child3 = self.store.add('child tres', None, self.root)
+        self.root.sort(key=len)
+        assert self.root.children == (self.child2, self.child1, child3)
+
+    def test_freeze(self):
+        frozen = self.root.freeze()
+        assert [(node.id, node.data) for node in frozen.unroll()] == \
+               [(node.id, node.data) for node in self.root.unroll()]
+        assert [node.node for node in frozen.unroll()] == list(self.root.unroll())
+        assert (frozen.size, frozen.leaves, frozen.height) == (4, 2, 2)
+        assert isinstance(frozen.children, tuple)
+
+    def test_freeze_unchanged_by_edits(self):
+        frozen = self.root.freeze()
+        self.grandchild1.parent = self.child2
+        self.child1.id = 'renamed'
+
+        assert [node.id for node in frozen.unroll()] == \
+               ['the root', 'child uno', 'child duo', 'child fool']
+        assert frozen.size == 4
+        assert [node.id for node in self.root.freeze().children[1].children] == \
+               ['child fool']
+
+    def test_fromnode(self):
+        root = pyggdrasil.model.Node('the root', 'test data')
+        child = pyggdrasil.model.Node('child uno', 'some test', root)
+        pyggdrasil.model.Node('child fool', 'uber test', child)
+        pyggdrasil.model.Node('child duo', 'uber test', root)
+
+        storeroot = pyggdrasil.store.fromnode(root)
+        assert [(node.id, node.data) for node in storeroot.unroll()] == \
+               [(node.id, node.data) for node in root.unroll()]
+
+    def test_layout(self):
+        root = pyggdrasil.model.Node('the root', 'test data')
+        child = pyggdrasil.model.Node('child uno', 'some test', root)
+        pyggdrasil.model.Node('child fool', 'uber test', child)
+        pyggdrasil.model.Node('child duo', 'uber test', root)
+
+        graph = pyggdrasil.graph.generate(root)
+        storegraph = pyggdrasil.graph.generate(self.root)
+        assert [graph.pos(node) for node in root.unroll()] == \
+               [storegraph.pos(node) for node in self.root.unroll()]
+
+    def test_serialize(self):
+        stream = StringIO.StringIO()
+        pyggdrasil.serialize.dumpbinary(stream, self.root, pyggdrasil.model.Options())
+        stream.seek(0)
+        store = pyggdrasil.store.TreeStore()
+        root, options = pyggdrasil.serialize.loadbinary(stream, store)
+
+        assert root is store.node(0)
+        assert [(node.id, node.data) for node in root.unroll()] == \
+               [(node.id, node.data) for node in self.root.unroll()]
+
+        stream = StringIO.StringIO()
+        pyggdrasil.serialize.dump(stream, self.root, pyggdrasil.model.Options())
+        stream.seek(0)
+        root, options = pyggdrasil.serialize.load(stream)
+        assert [node.id for node in root.unroll()] == \
+               [node.id for node in self.root.unroll()]
+
+    def test_export(self):
+        graph = pyggdrasil.graph.generate(self.root)
+        stream = StringIO.StringIO()
+        svg.write(stream, graph, lambda value: None)
+
+        assert stream.getvalue().count('<circle') == 4
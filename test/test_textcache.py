@@ -0,0 +1,71 @@
+import pyggdrasil
+
+
+class TestLRUCache(object):
+    def setup_method(self, method):
+        self.cache = pyggdrasil.textcache.LRUCache(2)
+        self.cache['a'] = 1
+        self.cache['b'] = 2
+
+    def test_evict_least_recently_used(self):
+        self.cache['a']
+        self.cache['c'] = 3
+
+        assert 'a' in self.cache
+        assert 'b' not in self.cache
+        assert len(self.cache) == 2
+
+    def test_replace(self):
+        self.cache['a'] = 3
+        self.cache['c'] = 4
+
+        assert self.cache['a'] == 3
+        assert 'b' not in self.cache
+
+
+class TestTextCache(object):
+    def setup_method(self, method):
+        self.measured = []
+        self.rendered = []
+        self.cache = pyggdrasil.textcache.TextCache(self.measure, self.render)
+
+    def measure(self, text, font):
+        self.measured.append((text, font))
+        return (len(text) * font, font)
+
+    def render(self, text, font):
+        self.rendered.append((text, font))
+        return '%s@%d' % (text, font)
+
+    def test_extent(self):
+        assert self.cache.extent('node', 10) == (40, 10)
+        assert self.cache.extent('node', 10) == (40, 10)
+        assert self.cache.extent('node', 12) == (48, 12)
+        assert self.measured == [('node', 10), ('node', 12)]
+
+    def test_label(self):
+        assert self.cache.label('node', 10) == 'node@10'
+        assert self.cache.label('node', 10) == 'node@10'
+        assert self.rendered == [('node', 10)]
+
+    def test_no_render(self):
+        cache = pyggdrasil.textcache.TextCache(self.measure)
+        assert cache.label('node', 10) is None
+
+    def test_discard(self):
+        self.cache.extent('node', 10)
+        self.cache.label('node', 12)
+        self.cache.extent('other', 10)
+        self.cache.discard('node')
+
+        self.cache.extent('node', 10)
+        self.cache.label('node', 12)
+        self.cache.extent('other', 10)
+        assert self.measured == [('node', 10), ('other', 10), ('node', 10)]
+        assert self.rendered == [('node', 12), ('node', 12)]
+
+    def test_fontkey(self):
+        cache = pyggdrasil.textcache.TextCache(lambda text, font: font[0],
+                                               fontkey=tuple)
+        assert cache.extent('node', [10]) == 10
+        assert cache.extent('node', [10]) == 10
@@ -0,0 +1,98 @@
+import json
+import os
+import StringIO
+import tempfile
+
+import py
+import pyggdrasil
+from pyggdrasil import trace
+
+
+class TestTrace(object):
+    def setup_method(self, method):
+        self.collector = trace.Collector()
+        trace.enable(self.collector)
+
+    def teardown_method(self, method):
+        trace.disable()
+
+    def test_span(self):
+        with trace.span('phase', nodes=3) as current:
+            current.set(extra='value')
+
+        (record,) = self.collector.records
+        assert record['name'] == 'phase'
+        assert record['nodes'] == 3
+        assert record['extra'] == 'value'
+        assert record['duration'] >= 0
+
+    def test_span_error(self):
+        def fail():
+            with trace.span('phase'):
+                raise ValueError
+        py.test.raises(ValueError, fail)
+
+        assert self.collector.records[0]['error'] == 'ValueError'
+
+    def test_traced(self):
+        @trace.traced('double', nodes=len)
+        def double(values):
+            return values * 2
+
+        assert double([1, 2]) == [1, 2, 1, 2]
+        assert double.__name__ == 'double'
+        assert [(record['name'], record['nodes']) for record in self.collector.records] == \
+               [('double', 4)]
+
+    def test_disabled(self):
+        trace.disable()
+        assert not trace.enabled()
+        assert trace.span('phase') is trace.span('other')
+
+        with trace.span('phase') as current:
+            current.set(nodes=1)
+        assert self.collector.records == []
+
+    def test_json_sink(self):
+        stream = StringIO.StringIO()
+        trace.enable(trace.JsonSink(stream))
+        with trace.span('phase', nodes=2):
+            pass
+
+        record = json.loads(stream.getvalue())
+        assert (record['name'], record['nodes']) == ('phase', 2)
+
+    def test_fromenvironment(self):
+        assert trace.fromenvironment({}) is None
+
+        (handle, filename) = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            sink = trace.fromenvironment({'PYGG_TRACE': filename})
+            with trace.span('phase'):
+                pass
+            sink.stream.close()
+
+            with open(filename) as file:
+                assert json.loads(file.read())['name'] == 'phase'
+        finally:
+            os.remove(filename)
+
+    def test_pipeline(self):
+        root = pyggdrasil.model.Node('root', None)
+        pyggdrasil.model.Node('child', None, root)
+        stream = StringIO.StringIO()
+        pyggdrasil.serialize.dump(stream, root, pyggdrasil.model.Options())
+        stream.seek(0)
+
+        (root, options) = pyggdrasil.serialize.load(stream)
+        graph = pyggdrasil.graph.generate(root)
+        pyggdrasil.graph.transition(graph, graph, 0.5)
+
+        names = [record['name'] for record in self.collector.records]
+        assert names == ['serialize.fromstructure', 'serialize.load',
+                         'graph.normalize', 'graph.generate',
+                         'graph.transition.setup', 'graph.normalize',
+                         'graph.transition.frame']
+        assert self.collector.records[1]['nodes'] == 2
+        assert self.collector.durations('graph.generate')